@@ -41,6 +41,10 @@ from PyQt5.QtCore import (
 )
 from SerumWriter.Components.Splashscreen import SplashScreen
 from SerumWriter.Plugins.Manager import create_plugin_folder
+from SerumWriter.Lib.Journal import create_journal_folder
+from SerumWriter.Lib.State import create_state_folder
+from SerumWriter.Lib.Workspace import create_index_folder
+from SerumWriter.Lib.Engines import run_benchmark
 
 #: bypass module error (pyinstaller)
 
@@ -98,13 +102,26 @@ def show_window(w, s):
 def main(args):
     
     create_plugin_folder()
+    create_journal_folder()
+    create_state_folder()
+    create_index_folder()
     load_module_path()
     args = args[1:]
     
     parser = argparse.ArgumentParser()
     parser.add_argument('file', nargs='?')
     parser.add_argument('-md', '--markdown', action='store_true')
+    #: Times the render engines on Markdown files or folders, by default
+    #: the workspace, and makes the fastest the `render_engine` setting
+    parser.add_argument('--benchmark-engines', nargs='*', metavar='PATH')
     args = parser.parse_args(args)
+
+    if args.benchmark_engines is not None:
+        paths = args.benchmark_engines or [Properties.Settings().workspace]
+        if not all(paths):
+            parser.error('no workspace set, give the files or folders to benchmark on')
+        run_benchmark(paths)
+        return
     
     app = app_context()
     app.setStyle('Fusion')
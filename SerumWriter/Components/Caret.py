@@ -0,0 +1,121 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from PyQt5.QtCore import (
+    QObject,
+    QEvent,
+    QRect,
+    QTimer
+)
+from PyQt5.QtGui import (
+    QColor,
+    QPainter,
+    QPaintEvent
+)
+from SerumWriter.Globals import palette
+
+import typing as t
+if t.TYPE_CHECKING:
+    from PyQt5.QtWidgets import QAbstractScrollArea
+
+
+class Caret(QObject):
+    """
+    Blinking caret painted over an editor viewport.
+
+    Only the old and new cursor rectangles are invalidated, and the blink
+    timer only runs while the editor has focus inside an active window.
+    """
+
+    def __init__(self, editor: 'QAbstractScrollArea', interval: int = 600):
+        super().__init__(editor)
+        self._editor = editor
+        self._visible = True
+        self._rect = QRect()
+        self._color = QColor()
+        self._background = QColor()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.__blink)
+
+        self.updateColors()
+        editor.cursorPositionChanged.connect(self.__moved)
+        editor.installEventFilter(self)
+
+    def isVisible(self) -> bool:
+        return self._visible
+
+    def updateColors(self):
+        self._color = QColor(palette.COLOR_ACCENT_4)
+        self._background = QColor(palette.COLOR_BACKGROUND_1)
+        self.__invalidate()
+
+    def start(self):
+        self._visible = True
+        self._timer.start()
+        self.__invalidate()
+
+    def stop(self):
+        self._timer.stop()
+        self.__invalidate()
+
+    def eventFilter(self, obj: QObject, e: QEvent) -> bool:
+        if e.type() == QEvent.Type.FocusIn:
+            self.start()
+        elif e.type() in (QEvent.Type.FocusOut, QEvent.Type.Hide):
+            self.stop()
+        return False
+
+    def paint(self, event: QPaintEvent):
+        if not self._editor.hasFocus():
+            return
+
+        rect = self._editor.cursorRect()
+        self._rect = rect
+        if not rect.intersects(event.rect()):
+            return
+
+        painter = QPainter(self._editor.viewport())
+        painter.fillRect(rect, self._color if self._visible else self._background)
+        painter.end()
+
+    def __blink(self):
+        #: Minimized or deactivated windows don't need a caret
+        if not self._editor.isActiveWindow() or self._editor.window().isMinimized():
+            return self.stop()
+
+        self._visible = not self._visible
+        self.__invalidate()
+
+    def __moved(self):
+        #: Keep the caret solid while it moves, like native carets do
+        self._visible = True
+        if self._timer.isActive():
+            self._timer.start()
+        self.__invalidate()
+
+    def __invalidate(self):
+        viewport = self._editor.viewport()
+        if not self._rect.isNull():
+            viewport.update(self._rect)
+
+        self._rect = self._editor.cursorRect()
+        viewport.update(self._rect)
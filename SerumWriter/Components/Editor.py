@@ -19,8 +19,11 @@
 # SOFTWARE.
 
 import os
+import typing as t
 from PyQt5.QtWidgets import (
+    QApplication,
     QTextEdit,
+    QPlainTextEdit,
     QFileDialog,
     QWidget,
     QHBoxLayout,
@@ -31,15 +34,21 @@ from PyQt5.QtWidgets import (
 
 from PyQt5.QtGui import (
     QTextBlockFormat,
-    QTextFormat,
+    QTextCharFormat,
     QColor,
     QFont,
+    QContextMenuEvent,
+    QDropEvent,
     QKeyEvent,
+    QKeySequence,
     QTextCursor,
-    QPainter
+    QTextDocument
 
 )
 from SerumWriter.Components.Dialog import MaskDialog
+from SerumWriter.Components.Caret import Caret
+from SerumWriter.Components.FocusMode import FocusMode
+from SerumWriter.Components.LineView import LineView
 from PyQt5.QtCore import (
     pyqtSignal as Signal,
     Qt, 
@@ -50,8 +59,48 @@ from PyQt5.QtCore import (
     QMimeData
 )
 from SerumWriter.Globals import palette
-from markdown import markdown
 from SerumWriter.Lib.Highlighter import SpellCheckWrapper, SyntaxHighlighter
+from SerumWriter.Lib.Loader import ChunkedLoader
+from SerumWriter.Lib.Files import (
+    FileFormat,
+    FileReader,
+    SaveService
+)
+from SerumWriter.Lib.Engines import RenderEngine, create_engine
+from SerumWriter.Lib.Journal import Journal
+from SerumWriter.Lib.Outline import DocumentOutline
+from SerumWriter.Lib.Render import (
+    BlockRenderer,
+    Rendering,
+    RenderWorker,
+    SourceMap,
+    patch_document
+)
+from SerumWriter.Lib.Search import (
+    SearchEngine,
+    patterns_supported
+)
+from SerumWriter.Lib.State import EditorState
+from SerumWriter.Lib.PieceTable import PieceTable
+from SerumWriter.Lib.MappedText import MappedText
+from SerumWriter.Lib.Undo import (
+    UNDO_BUDGET,
+    DocumentHistory,
+    UndoHistory
+)
+from SerumWriter.Lib.Document import (
+    DocumentDelta,
+    content_hash
+)
+from SerumWriter.Utils.Statistics import (
+    DocumentStatistics,
+    LineStatistics
+)
+from SerumWriter.Utils.Constants import (
+    HUGE_FILE_THRESHOLD,
+    LARGE_FILE_THRESHOLD,
+    MAPPED_FILE_THRESHOLD
+)
 import SerumWriter.Properties as Properties
 import pathlib
 
@@ -64,11 +113,29 @@ class Find(QWidget):
     """
     A Widget used for finding strings (CTRL + F)
     The parent widget should be the `Main` instannce
+
+    Every match is found up front by a `SearchEngine`, Enter and
+    Shift+Enter step through them and only the visible ones are
+    highlighted. Huge documents are searched by the view itself.
+
+    With `.*` toggled the query is a regular expression, Escape cancels
+    a search still running. Replacing everything is a single edit, one
+    undo step, made with the highlighter suspended.
     """
+    #: Matches highlighted at most, more never fit on a screen
+    highlight_limit = 1000
 
     def __init__(self, editor: 'Editor', parent=None):
         super().__init__(parent=parent)
-        self.editor = editor
+        self._editor = None
+        #: Move to the nearest match once the typed query is searched
+        self._jump = False
+        self.engine = SearchEngine(lambda: self._editor.toPlainText(), self)
+        self.engine.changed.connect(self.__matches_changed)
+        self._highlight = QTimer(self)
+        self._highlight.setSingleShot(True)
+        self._highlight.setInterval(0)
+        self._highlight.timeout.connect(self.__highlight_visible)
 
         self.setObjectName('Find')
         self._layout = QHBoxLayout()
@@ -76,6 +143,21 @@ class Find(QWidget):
         
         self.setLayout(self._layout)
         self.init_widgets()
+        self.editor = editor
+
+    @property
+    def editor(self) -> 'Editor':
+        return self._editor
+
+    @editor.setter
+    def editor(self, editor: 'Editor'):
+        self._editor = editor
+        if isinstance(editor, EditorMixin):
+            editor.documentDelta.connect(self.__document_changed)
+            editor.verticalScrollBar().valueChanged.connect(
+                lambda: self._highlight.start()
+            )
+        self.engine.invalidate()
 
     def init_widgets(self):
         
@@ -86,15 +168,50 @@ class Find(QWidget):
 
         self.find_edit = QLineEdit()
         self.find_edit.textChanged.connect(self.textChanged)
+        self.find_edit.returnPressed.connect(self.__step)
         self.find_edit.setPlaceholderText('Find')
         self.find_edit.setFixedWidth(160)
        
+        self.regex_button = QPushButton('.*')
+        self.regex_button.setCheckable(True)
+        self.regex_button.setToolTip('Regular expression')
+        self.regex_button.toggled.connect(self.__regex_toggled)
+        if not patterns_supported():
+            self.regex_button.setEnabled(False)
+            self.regex_button.setToolTip('Regular expressions need the regex module')
+
+        self.replace_edit = QLineEdit()
+        self.replace_edit.setPlaceholderText('Replace')
+        self.replace_edit.setFixedWidth(160)
+        self.replace_edit.returnPressed.connect(self.replace)
+
+        self.replace_button = QPushButton('Replace')
+        self.replace_button.clicked.connect(self.replace)
+        self.replace_all_button = QPushButton('All')
+        self.replace_all_button.clicked.connect(self.replaceAll)
+
+        self.count_label = QLabel()
+        self.count_label.setObjectName('statusLabel')
 
         self._layout.addWidget(self.find_edit) 
+        self._layout.addWidget(self.regex_button)
+        self._layout.addWidget(self.replace_edit)
+        self._layout.addWidget(self.replace_button)
+        self._layout.addWidget(self.replace_all_button)
+        self._layout.addWidget(self.count_label)
 
 
     def textChanged(self):
         words = self.find_edit.text()
+        if not isinstance(self.editor, EditorMixin):
+            self.__find_in_view(words)
+            return
+
+        self._jump = True
+        self.engine.search(words)
+        self.__update_count()
+
+    def __find_in_view(self, words: str):
         if not self.editor.find(words):
             # no match found, move the cursor to the beginning of the
             # document and start the search once again
@@ -103,39 +220,318 @@ class Find(QWidget):
             self.editor.setTextCursor(cursor)
             self.editor.find(words)
 
+    def __step(self):
+        if not isinstance(self.editor, EditorMixin):
+            self.__find_in_view(self.find_edit.text())
+            return
+
+        if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier:
+            self.engine.previous()
+        else:
+            self.engine.next()
+        self.__show_current()
+        self.__update_count()
+
+    def __regex_toggled(self, v: bool):
+        self._jump = bool(self.find_edit.text())
+        self.engine.setRegex(v)
+        self.__update_count()
+
+    def replace(self):
+        """Replaces the current match and goes to the next one."""
+        editor = self.editor
+        match = self.engine.match()
+        if not isinstance(editor, EditorMixin) or match is None:
+            return
+
+        cursor = editor.textCursor()
+        if (cursor.selectionStart(), cursor.selectionEnd()) != match:
+            #: Only a match that is shown gets replaced
+            self.__show_current()
+            return
+
+        cursor.insertText(self.engine.replacement(self.engine.current(), self.replace_edit.text()))
+        editor.setTextCursor(cursor)
+        self._jump = True
+        self.engine.search(self.engine.query())
+        self.__update_count()
+
+    def replaceAll(self):
+        editor = self.editor
+        engine = self.engine
+        if not isinstance(editor, EditorMixin) or engine.isBusy() or not engine.count():
+            return
+
+        template = self.replace_edit.text()
+        count = engine.count()
+        #: One edit for the undo history and one change for every
+        #: listener, the blocks are highlighted again afterwards
+        editor.highlighter.suspend()
+        editor.history.snapshot(engine.match(0)[0], engine.match(count - 1)[1])
+        cursor = QTextCursor(editor.document())
+        cursor.beginEditBlock()
+        for index in range(count - 1, -1, -1):
+            start, end = engine.match(index)
+            replacement = engine.replacement(index, template)
+            cursor.setPosition(start)
+            cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertText(replacement)
+        cursor.endEditBlock()
+        editor.highlighter.resume(editor.cursorForPosition(QPoint(0, 0)).block())
+
+        editor._show_status.emit('Replaced %d matches' % (count))
+        self.engine.search(self.engine.query())
+        self.__update_count()
+
+    def keyPressEvent(self, e: QKeyEvent):
+        if e.key() == Qt.Key.Key_Escape and self.engine.isBusy():
+            self.engine.cancel()
+            self.__update_count()
+            return
+        return super().keyPressEvent(e)
+
+    def __document_changed(self, delta: DocumentDelta):
+        if self.engine.query():
+            self.engine.invalidate()
+
+    def __matches_changed(self):
+        if self._jump and not self.engine.isBusy():
+            #: Typing in the box goes to the match nearest to the cursor
+            self._jump = False
+            self.engine.select(self.editor.textCursor().selectionStart())
+            self.__show_current()
+
+        self.__update_count()
+        self._highlight.start()
+
+    def __show_current(self):
+        match = self.engine.match()
+        if match is None:
+            return
+
+        cursor = self.editor.textCursor()
+        cursor.setPosition(match[0])
+        cursor.setPosition(match[1], QTextCursor.MoveMode.KeepAnchor)
+        self.editor.setTextCursor(cursor)
+        self.editor.ensureCursorVisible()
+
+    def __update_count(self):
+        count = self.engine.count()
+        error = self.engine.error()
+        if not self.engine.query() or not isinstance(self.editor, EditorMixin):
+            text = ''
+        elif self.engine.isBusy():
+            text = 'Searching, {} found'.format(count) if count else 'Searching'
+        elif error and count:
+            text = '{} found, {}'.format(count, error.lower())
+        elif error:
+            text = error
+        elif not count:
+            text = 'No results'
+        else:
+            text = '{} of {}{}'.format(
+                self.engine.current() + 1,
+                count,
+                '+' if self.engine.isTruncated() else ''
+            )
+        self.count_label.setText(text)
+        self.adjustSize()
+
+    def __highlight_visible(self):
+        editor = self.editor
+        if not isinstance(editor, EditorMixin):
+            return
+
+        selections = []
+        if self.isVisible() and self.engine.count():
+            charFormat = QTextCharFormat()
+            color = QColor(palette.COLOR_ACCENT_1)
+            color.setAlpha(90)
+            charFormat.setBackground(color)
+
+            viewport = editor.viewport()
+            first = editor.cursorForPosition(QPoint(0, 0)).position()
+            last = editor.cursorForPosition(QPoint(viewport.width(), viewport.height())).position()
+            for index in self.engine.visible(first, last + 1)[:self.highlight_limit]:
+                start, end = self.engine.match(index)
+                selection = QTextEdit.ExtraSelection()
+                selection.format = charFormat
+                selection.cursor = QTextCursor(editor.document())
+                selection.cursor.setPosition(start)
+                selection.cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+                selections.append(selection)
+        editor.setSelections('find', selections)
+
+    def showEvent(self, e):
+        if self.find_edit.text():
+            self.textChanged()
+        return super().showEvent(e)
+
+    def hideEvent(self, e):
+        #: Matches aren't kept up to date while nobody looks at them
+        self._jump = False
+        self.engine.clear()
+        return super().hideEvent(e)
+
 class Preview(QTextEdit):
+    """
+    Rendered Markdown of the editor document. Rendering leaves a
+    `SourceMap` of where every top-level block of the source landed,
+    scrolling along with the editor only looks it up.
+
+    Markdown is rendered on a `RenderWorker` and only the rendering of
+    the latest text requested is ever shown. The blocks that changed are
+    patched into the document shown, a document is only built whole, on
+    the worker too, when that can't be done.
+    """
+    #: The rendering of newer text is shown
+    rendered = Signal()
+    #: The view scrolled, but not by showing another rendering
+    scrolled = Signal()
+    _worker: RenderWorker = None
+    #: Text to render once the running worker is done
+    _pending: str = None
+    _generation: int = 0
+    #: What the document shows, None until a rendering is
+    _shown: Rendering = None
+    __updating: bool = False
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setFont(QFont('Segoe UI'))
         self.setViewportMargins(40,40,40,40)
-        self._cursor = self.textCursor()
         self.setReadOnly(True)
         self.setObjectName('Preview')
+        self.sourceMap = SourceMap()
+        #: Keeps the HTML of every block, an edit only converts its own
+        self.renderer = BlockRenderer()
+        self.verticalScrollBar().valueChanged.connect(self.__scrolled)
    
         
     def setMarkdownOnMargin(self, md: str):
-        self.clear()
-        self._cursor.insertHtml(markdown(md))
+        self._generation += 1
+        if self._worker is not None:
+            #: Workers share the block cache, so one runs at a time
+            self._worker.requestInterruption()
+            self._pending = md
+            return
+
+        self.__start(md)
+
+    def __start(self, md: str, build: bool = False):
+        worker = self._worker = RenderWorker(
+            self._generation,
+            md,
+            self.renderer,
+            self.document().defaultFont(),
+            build or self._shown is None,
+            self
+        )
+        worker.finished.connect(lambda: self.__finished(worker))
+        worker.start()
+
+    def __finished(self, worker: RenderWorker):
+        worker.deleteLater()
+        self._worker = None
+        if self._pending is not None:
+            md, self._pending = self._pending, None
+            self.__start(md)
+
+        if worker.generation != self._generation or worker.rendering is None:
+            return
+
+        self.__updating = True
+        try:
+            if worker.document is not None:
+                self.__swap(worker.document)
+                source_map = worker.sourceMap
+                worker.document = None
+            else:
+                source_map = patch_document(self.document(), self.sourceMap, self._shown, worker.rendering)
+        finally:
+            self.__updating = False
+
+        if source_map is None:
+            self.__start(worker.text, build=True)
+            return
+
+        self.sourceMap, self._shown = source_map, worker.rendering
+        self.rendered.emit()
+
+    def __swap(self, document: QTextDocument):
+        previous = self.document()
+        #: Qt only deletes the document it created itself, not the ones set
+        if previous.parent() is self:
+            previous.deleteLater()
+        document.setParent(self)
+        self.setDocument(document)
+
+    def __scrolled(self):
+        if not self.__updating:
+            self.scrolled.emit()
+
+    def firstVisibleLine(self, line_count: int) -> float:
+        """The source line rendered at the top of the view, `line_count` lines in all."""
+        position = self.cursorForPosition(QPoint(0, 0)).position()
+        start, end, top, bottom = self.__span(self.sourceMap.blockAt(position), line_count)
+        past = (self.verticalScrollBar().value() - top) / (bottom - top) if bottom > top else 0
+        return start + min(max(past, 0), 1) * (end - start)
+
+    def scrollToLine(self, line: float, line_count: int):
+        """Scrolls the rendering of source `line` to the top, `line_count` lines in all."""
+        start, end, top, bottom = self.__span(self.sourceMap.blockOfLine(line), line_count)
+        past = (line - start) / (end - start) if end > start else 0
+        self.verticalScrollBar().setValue(int(top + min(max(past, 0), 1) * (bottom - top)))
+
+    def __span(self, index: int, line_count: int) -> t.Tuple[int, int, float, float]:
+        """Source lines and preview heights between rendered block `index` and the next."""
+        source = self.sourceMap
+        if index < 0:
+            start, top = 0, 0.0
+        else:
+            start, top = source.lines[index], self.__top(source.positions[index])
+
+        if index + 1 < len(source):
+            end, bottom = source.lines[index + 1], self.__top(source.positions[index + 1])
+        else:
+            end, bottom = max(line_count, start + 1), self.document().size().height()
+        return start, end, top, bottom
+
+    def __top(self, position: int) -> float:
+        block = self.document().findBlock(position)
+        return self.document().documentLayout().blockBoundingRect(block).top()
         
 
-class Editor(QTextEdit):
-    cursor_visible: bool = True
-    textChangedEvent = Signal(str)
-    fileNameChanged = Signal(str)
-    
+class EditorMixin:
+    """
+    Everything the editor does on top of the Qt text widget. It is shared
+    by `Editor` (QTextEdit) and `LargeEditor` (QPlainTextEdit), the
+    concrete classes only add the Qt base and the signals.
+    """
     surround_keys = [
         Qt.Key.Key_Underscore,
 		Qt.Key.Key_Asterisk,
     ]
+    #: Extra selections are set by layer, later layers are drawn on top
+    selection_layers = ('focus', 'find')
     __placeholder = None
     __filename: str = None
     _saved: bool = False
-    _show_status = Signal(str)
-    _current_text: str = None
+    _saved_hash: bytes = None
+    _loader: ChunkedLoader = None
+    _reader: FileReader = None
+    _read_digest: bytes = None
+    _format: FileFormat = FileFormat()
     __extension = ''
     __name = None
     __word_list_path = "wordlist"
+    _revision: int = 0
+    _backend_requested: bool = False
+    _replaying: bool = False
+    #: Saved state of the file being loaded, applied once it is in
+    _state: EditorState = None
+    #: Renders `toRawHtml`, created on first use
+    _engine: RenderEngine = None
 
     def __init__(self, parent=None, **options):
         super().__init__(parent=parent)
@@ -171,21 +567,45 @@ class Editor(QTextEdit):
         self._parent.changed_style.connect(self.init_kwargs)
 
         self.setFont(QFont('Fira Mono'))
-        self.setAcceptRichText(False)   
         self.setViewportMargins(40,40,40,40)
         self.setLineHeight()
     
+        self._selections = {}
+        self._focus = FocusMode(self, self._focus_mode)
         self.init_kwargs()
-        self.textChanged.connect(lambda: self.textChangedEvent.emit(self.toPlainText()))
-        self.textChangedEvent.connect(self.text_changed)
+        self.statistics = DocumentStatistics(self.document(), self)
+        self.outline = DocumentOutline(self.document(), self)
+        #: Replaces the document's own undo stack
+        self.history = DocumentHistory(self.document(), undo_budget(self._properties), self)
+        self.saver = SaveService(self)
+        self.saver.saving.connect(
+            lambda path: self._show_status.emit('Saving %s' % (pathlib.Path(path).name))
+        )
+        self.saver.saved.connect(self.__saved)
+        self.saver.failed.connect(self.__save_failed)
+        self.journal = Journal(
+            self.toPlainText,
+            fsync=self._properties.fsync_on_save is not False,
+            parent=self
+        )
+        self.document().contentsChange.connect(self.__contents_change)
+        self.documentDelta.connect(self.__journal_delta)
+        self.documentDelta.connect(self.__record_undo)
+        self.cursorPositionChanged.connect(self.__follow_cursor)
+        #: e.g. select all with the cursor already at the end
+        self.selectionChanged.connect(self.__follow_cursor)
+        self.documentDelta.connect(self.statistics.update)
+        self.documentDelta.connect(self.outline.update)
+        self.textChanged.connect(self.__text_changed)
+        self.documentDelta.connect(self.text_changed)
+        self.document().modificationChanged.connect(self.__modification_changed)
         self.__init_formats()
         #: force set focus
         QTimer.singleShot(0, self.setFocus)
 
         #: Cursor animation
-        timer = QTimer(self)
-        timer.timeout.connect(self.cursorTime)
-        timer.start(600)
+        self.caret = Caret(self)
+        self._parent.changed_style.connect(self.caret.updateColors)
         
         
         self.continue_dialog = MaskDialog(
@@ -206,23 +626,174 @@ class Editor(QTextEdit):
         self.exit_dialog.hide()
         
 
-        if self._properties.filename != None \
+        if not options.get('restore', True):
+            #: The window puts the document in itself
+            self.clear()
+        elif self._properties.filename != None \
             and pathlib.Path(self._properties.filename).exists():
 
             self._open(self._properties.filename)
         else:
             self.clear()
+            self.__recover()
+
+    def __contents_change(self, position: int, removed: int, added: int):
+        if not removed and not added:
+            return
+
+        self._revision += 1
+        self.documentDelta.emit(
+            DocumentDelta.from_document(
+                self.document(),
+                position,
+                removed,
+                added,
+                self._revision
+            )
+        )
 
-    def run_plugins(self):
+    def __journal_delta(self, delta: DocumentDelta):
+        if self._loader is not None or self._replaying or self._properties.journal is False:
+            return
+
+        if self.journal.isActive():
+            self.journal.record(delta.position, delta.removed, delta.text(self.document()))
+        elif self.fileName() and self._saved_hash is not None:
+            #: Up to this edit the document was the file on disk
+            self.journal.begin(
+                self.fileName(),
+                self._saved_hash,
+                self.document().characterCount()
+            )
+            self.journal.record(delta.position, delta.removed, delta.text(self.document()))
+        elif not self.document().isEmpty():
+            self.journal.begin(self.fileName())
+
+    def __record_undo(self, delta: DocumentDelta):
+        #: The history starts over from the loaded text
+        if self._loader is None:
+            self.history.update(delta)
+
+    def __follow_cursor(self):
+        #: What the next edit may remove is copied before it is made
+        cursor = self.textCursor()
+        self.history.follow(cursor.position())
+        self.history.snapshot(cursor.selectionStart(), cursor.selectionEnd())
+
+    def contextMenuEvent(self, e: QContextMenuEvent):
+        menu = self.createStandardContextMenu(e.pos())
+        #: The document's own undo stack is off, its actions would stay disabled
+        for action in menu.actions():
+            if action.objectName() == 'edit-undo':
+                action.triggered.disconnect()
+                action.triggered.connect(self.undo)
+                action.setEnabled(self.history.canUndo())
+            elif action.objectName() == 'edit-redo':
+                action.triggered.disconnect()
+                action.triggered.connect(self.redo)
+                action.setEnabled(self.history.canRedo())
+        menu.exec_(e.globalPos())
+        menu.deleteLater()
+
+    def dropEvent(self, e: QDropEvent):
+        #: Moving text removes it and inserts it elsewhere in one edit
+        cursor = self.textCursor()
+        position = self.cursorForPosition(e.pos()).position()
+        self.history.snapshot(
+            min(cursor.selectionStart(), position),
+            max(cursor.selectionEnd(), position)
+        )
+        return super().dropEvent(e)
+
+    def undo(self):
+        self.__move_to(self.history.undo())
+
+    def redo(self):
+        self.__move_to(self.history.redo())
+
+    def __move_to(self, position: int):
+        if position is None:
+            return
+
+        cursor = self.textCursor()
+        cursor.setPosition(min(position, self.document().characterCount() - 1))
+        self.setTextCursor(cursor)
+        self.ensureCursorVisible()
+
+    def __recover(self):
+        """Replays the journal a crash left behind for this document."""
+        if self._properties.journal is False:
+            return
+
+        text = Journal.replay(self.fileName(), self._saved_hash, self.toPlainText, self.journal.key())
+        if text is None or text == self.toPlainText():
+            return
+
+        digest = self._saved_hash
+        self._replaying = True
+        self.setPlainText(text)
+        self._replaying = False
+        self.history.reset()
+        self._saved_hash = digest
+        self.document().setModified(True)
+        self.journal.resume(self.fileName())
+        self._show_status.emit(
+            'Recovered unsaved changes to %s' % (self.__name or 'Untitled')
+        )
+
+    def __text_changed(self):
+        #: The full text is only copied when someone still listens to it.
+        if self.receivers(self.textChangedEvent) > 0:
+            self.textChangedEvent.emit(self.toPlainText())
+
+    def revision(self) -> int:
+        return self._revision
+
+    def markSaved(self, text: str = None, digest: bytes = None):
+        #: `text` is what was just written or read, hashing it lets
+        #: `isDirty(exact=True)` notice edits that were typed back.
+        if digest is None and text is not None:
+            digest = content_hash(text)
+        self._saved_hash = digest
+        self.document().setModified(False)
+
+    def isDirty(self, exact: bool = False) -> bool:
+        if not self.document().isModified():
+            return False
+
+        if self.fileName() is None and self.document().isEmpty():
+            return False
+
+        if exact and self._saved_hash is not None:
+            return content_hash(self.toPlainText()) != self._saved_hash
+
+        return True
+
+    def __modification_changed(self, modified: bool):
+        if self.fileName() is None or self._loader is not None:
+            return
+
+        if modified:
+            self._show_status.emit('*  %s' % (self.__name))
+        else:
+            self._show_status.emit('%s' % (self.__name))
+
+    def run_plugins(self, run: bool = True):
 
         for plugin in self.plugin_manager.getAllPlugins():
             po = plugin.plugin_object
             
+            if hasattr(po, 'document_changed'):
+                self.documentDelta.connect(po.document_changed)
+
             try:
                 po.init(self, self._parent)
             except AttributeError:
                 pass
             
+            if not run:
+                continue
+
             try:
                 po.run()
             except AttributeError:
@@ -244,17 +815,57 @@ class Editor(QTextEdit):
             f.write('\n'+word)
 
     def clear(self) -> None:
-        QTextEdit.clear(self)
+        super().clear()
         self.setLineHeight()
+        self.markSaved()
+        self.journal.discard()
+        self.history.reset()
 
     def setFileName(self, f: str) -> str:
         self.__filename = f
+        if f is None:
+            #: New documents are written the platform's way
+            self._format = FileFormat()
         return self.__filename
 
     def fileExtension(self):
         return self.__extension
 
 
+    def isEmpty(self) -> bool:
+        return self.document().isEmpty()
+
+    def lineCount(self) -> int:
+        return self.document().blockCount()
+
+    def firstVisibleLine(self) -> float:
+        """Block at the top of the view, plus the part of it scrolled past."""
+        bar = self.verticalScrollBar()
+        if isinstance(self, QPlainTextEdit):
+            #: Scrolled by layout lines
+            block = self.firstVisibleBlock()
+            past = bar.value() - block.firstLineNumber()
+            return block.blockNumber() + past / max(block.lineCount(), 1)
+
+        block = self.cursorForPosition(QPoint(0, 0)).block()
+        rect = self.document().documentLayout().blockBoundingRect(block)
+        past = (bar.value() - rect.top()) / rect.height() if rect.height() else 0
+        return block.blockNumber() + min(max(past, 0), 1)
+
+    def scrollToLine(self, line: float):
+        """Scrolls block `line` to the top, its fraction scrolled past."""
+        block = self.document().findBlockByNumber(int(line))
+        if not block.isValid():
+            return
+
+        bar = self.verticalScrollBar()
+        past = line - int(line)
+        if isinstance(self, QPlainTextEdit):
+            bar.setValue(block.firstLineNumber() + int(past * block.lineCount()))
+        else:
+            rect = self.document().documentLayout().blockBoundingRect(block)
+            bar.setValue(int(rect.top() + past * rect.height()))
+
     def getFileExtension(self):
         _dict = {
             '.md': 'Markdown',
@@ -292,33 +903,38 @@ class Editor(QTextEdit):
     
     def setFocusMode(self, v: bool):
         self._focus_mode = v
+        self._focus.setEnabled(v)
+        self.init_kwargs()
         return self._focus_mode
 
-    def text_changed(self, text: str):
+    def text_changed(self, delta: DocumentDelta):
         self._saved = False
-        
-
-        if self.fileName() != None and self._current_text != text:
-            self._show_status.emit('*  %s' % (self.__name)) 
     
 
 
 
     def highlightCurrentLine(self, color):
-        if self._focus_mode:
-            selection = QTextEdit.ExtraSelection()
-            selection.format.setForeground(QColor(color))
-            selection.format.setProperty(QTextFormat.Property.FullWidthSelection, True)
-            selection.cursor = self.textCursor()
-            selection.cursor.clearSelection()
-            selections = [selection]
-            self.setExtraSelections(selections)
-        else:
-            self.setStyleSheet('color: {}'.format(palette.COLOR_TEXT_2))
+        self._focus.setColor(color)
+
+    def setSelections(self, layer: str, selections: list):
+        """Replaces the extra selections of `layer`, leaving the other layers alone."""
+        self._selections[layer] = selections
+        self.setExtraSelections([
+            selection
+            for name in self.selection_layers
+            for selection in self._selections.get(name, ())
+        ])
         
     
 
     def keyPressEvent(self, e: QKeyEvent) -> None:
+        if e.matches(QKeySequence.StandardKey.Undo):
+            return self.undo()
+        if e.matches(QKeySequence.StandardKey.Redo):
+            return self.redo()
+
+        #: The cursor may not have moved since the history was reset
+        self.__follow_cursor()
         key = e.key()
         cursor = self.textCursor()
 
@@ -355,8 +971,8 @@ class Editor(QTextEdit):
     def init_kwargs(self):
         
         self.setCursorWidth(2)
+        fg = palette.COLOR_TEXT_2
         if self._focus_mode:
-            fg = palette.COLOR_TEXT_2
             lightness = QColor(fg).lightness()
             if lightness > 150:
                 color = QColor(fg).darker(200).name()
@@ -364,14 +980,17 @@ class Editor(QTextEdit):
                 color = QColor(fg).lighter(300).name()
 
             self.setStyleSheet('color: {};'.format(color))
-            self.cursorPositionChanged.connect(
-                lambda: self.highlightCurrentLine(fg)
-            )
             #E0E1E3
             #707071
 
             #3e3c38 #1f1e1c
             
+        else:
+            self.setStyleSheet('color: {}'.format(fg))
+
+        #: The focus engine is connected once, a theme change only
+        #: swaps its color
+        self.highlightCurrentLine(fg)
 
         if self.__placeholder:
             self.setPlaceholderText(self.__placeholder)
@@ -380,18 +999,8 @@ class Editor(QTextEdit):
 
     def paintEvent(self, event):
         # Change cursor color 
-        QTextEdit.paintEvent(self, event)
-        if self.hasFocus():
-            if self.cursor_visible:
-                
-                rect = self.cursorRect(self.textCursor())
-                painter = QPainter(self.viewport())
-                painter.fillRect(rect, QColor(palette.COLOR_ACCENT_4))
-            elif not self.cursor_visible:
-                
-                rect = self.cursorRect(self.textCursor())
-                painter = QPainter(self.viewport())
-                painter.fillRect(rect, QColor(palette.COLOR_BACKGROUND_1))        
+        super().paintEvent(event)
+        self.caret.paint(event)
 
     def setLineHeight(self, height: int=12):
         bf = self.textCursor().blockFormat()
@@ -405,13 +1014,6 @@ class Editor(QTextEdit):
         self.textCursor().insertText(text)
         return text
         
-    def cursorTime(self): 
-        
-        if self.cursor_visible:
-            self.cursor_visible = False
-        else:
-            self.cursor_visible = True
-    
     def __init_formats(self):
         self.setTabStopWidth(40)
 
@@ -419,23 +1021,15 @@ class Editor(QTextEdit):
         if not self.fileName():
             self.saveAs()
         else:
-            with open(self.fileName(), 'w') as f:
-    
-                f.write(self.toPlainText())
+            self.__write()
 
         
         self._saved = True
         if self.fileName():
             self.__name = pathlib.Path(self.fileName()).name
-        
-        if self.fileName() != None and self._saved:
-            self._show_status.emit('%s' % (self.__name))
 
-        self._current_text = self.toPlainText()
         self.updateProperties()
-        
-        self.highlighter.docType = self.getFileExtension()
-        self.highlighter.rehighlight()
+        self.__update_doc_type()
 
     def saveAs(self):
         file = QFileDialog.getSaveFileName(
@@ -451,17 +1045,48 @@ class Editor(QTextEdit):
             if self.fileName():
                 self.__name = pathlib.Path(self.fileName()).name
         
-            if self.fileName() != None and self._saved:
-                self._show_status.emit('%s' % (self.__name))
-            
-            
-            with open(self.fileName(), 'w') as f:
-                f.write(self.toPlainText())
-
+            self.__write()
             self.updateProperties()
 
-        self.highlighter.docType = self.getFileExtension()
-        self.highlighter.rehighlight()
+        self.__update_doc_type()
+
+    def __write(self):
+        #: The text is snapshotted here and written on the saver's thread
+        self.history.seal()
+        self.saver.save(
+            self.fileName(),
+            self.toPlainText(),
+            self._format,
+            fsync=self._properties.fsync_on_save is not False,
+            revision=self._revision
+        )
+
+    def __saved(self, path: str, digest: bytes, revision: int):
+        if path != self.fileName():
+            return
+
+        if revision == self._revision:
+            self.markSaved(digest=digest)
+            self.journal.discard()
+            self._show_status.emit('%s' % (self.__name))
+        else:
+            #: Edited while it was written, what is on disk is older
+            self._saved_hash = digest
+            if self.journal.isActive():
+                self.journal.compact()
+            self._show_status.emit('*  %s' % (self.__name))
+
+    def __save_failed(self, path: str, error: str):
+        self._show_status.emit('Could not save %s: %s' % (pathlib.Path(path).name, error))
+
+    def __update_doc_type(self):
+        docType = self.getFileExtension()
+        if self.highlighter.docType != docType:
+            #: Only a new document type changes the formats
+            self.highlighter.docType = docType
+            self.highlighter.rehighlightProgressive(
+                self.cursorForPosition(QPoint(0, 0)).block()
+            )
 
     def save_and_clear(self):
         self.save()
@@ -473,33 +1098,24 @@ class Editor(QTextEdit):
 
     def new(self):
         
-        if self._current_text != self.toPlainText():
+        if self.isDirty(exact=True):
             #: Warning
             self.continue_dialog.yesSignal.connect(self.clear)
             self.continue_dialog.exec_()
-            if self.toPlainText() == '':
+            if self.document().isEmpty():
                 self.setFileName(None)
 
-        elif self._current_text == self.toPlainText():
-            self.setFileName(None)
-            self.clear()
-
-        elif self.toPlainText() == '':
-            self.setFileName(None)
-            self.clear()
-
         else:
             self.setFileName(None)
             self.clear()
         
     def close_file(self):
-        text = self.toPlainText()
         def close_and_clear():
             self.setFileName(None)
             self._show_status.emit(' ')
             self.clear()
 
-        if self._current_text != text and text != '':
+        if self.isDirty(exact=True):
             self.continue_dialog.yesSignal.connect(close_and_clear)
             self.continue_dialog.exec_()
         else:
@@ -509,17 +1125,112 @@ class Editor(QTextEdit):
         
 
     def _open(self, file: str):
+        self.__stop_loading()
+        self.journal.discard()
+        if editor_class(file) is not type(self):
+            #: The window swaps in the other backend and opens the file there
+            self._backend_requested = True
+            self.backendRequested.emit(file)
+            return None
+
         self.setFileName(file)
         self.__name = pathlib.Path(self.fileName()).name
         self.fileNameChanged.emit(self.fileName())
-        
+        self._show_status.emit('Loading %s' % (self.__name))
 
-        with open(self.fileName(), 'r') as f:
-            data = f.read()
+        #: The file is read and decoded on a worker thread and streamed
+        #: into the loader, which highlights with the new document type
+        #: once it is done
+        self.highlighter.docType = self.getFileExtension()
+        self._state = load_state(self._properties, file)
+        self.highlighter.restore(self._state)
+        self._loader = ChunkedLoader(self)
+        self._loader.finished.connect(self.__load_finished)
+        self._reader = FileReader(file, self)
+        self._reader.chunkRead.connect(self._loader.append)
+        self._reader.progress.connect(self.loadProgress)
+        self._reader.loaded.connect(self.__file_read)
+        self._reader.failed.connect(self.__read_failed)
+        self._loader.start()
+        self._reader.start()
+
+    def shutdown(self):
+        """Stops loading and finishes every queued save, the editor is about to go."""
+        self.__stop_loading()
+        self.saver.flush()
+
+    def __stop_loading(self):
+        if self._reader is not None:
+            self._reader.discard()
+            self._reader = None
+
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader.deleteLater()
+            self._loader = None
+
+    def __file_read(self, file_format: FileFormat, digest: bytes):
+        if self.sender() is not self._reader:
+            return
+
+        self._format = file_format
+        self._read_digest = digest
+        #: Done reading, only its thread is still returning
+        self._reader.discard()
+        self._reader = None
+        self._loader.close()
+
+    def __read_failed(self, error: str):
+        if self.sender() is not self._reader:
+            return
+
+        name = self.__name
+        self.__stop_loading()
+        self.setFileName(None)
+        self.clear()
+        self._show_status.emit('Could not open %s: %s' % (name, error))
 
-        self._current_text = data
+    def __load_finished(self):
+        self._loader = None
+        self.history.reset()
+        self.__restore_view()
+        self.markSaved(digest=self._read_digest)
         self._show_status.emit('%s' % (self.__name))
-        return self.setPlainText(data)        
+        self.__recover()
+        self.documentLoaded.emit()
+
+    def __restore_view(self):
+        state, self._state = self._state, None
+        if state is None:
+            self.moveCursor(QTextCursor.MoveOperation.Start)
+            return
+
+        length = self.document().characterCount() - 1
+        cursor = self.textCursor()
+        cursor.setPosition(min(state.anchor, length))
+        cursor.setPosition(min(state.position, length), QTextCursor.MoveMode.KeepAnchor)
+        self.setTextCursor(cursor)
+        self.verticalScrollBar().setValue(state.scroll)
+        if self.highlighter.isHighlighting():
+            #: What is on screen now is highlighted first
+            self.highlighter.rehighlightProgressive(
+                self.cursorForPosition(QPoint(0, 0)).block()
+            )
+
+    def saveState(self):
+        """Remembers the cursor, viewport and highlighting of the file for its next open."""
+        if not self.fileName() or self._loader is not None \
+            or self._properties.state_cache is False:
+
+            return
+
+        cursor = self.textCursor()
+        state = EditorState()
+        state.position = cursor.position()
+        state.anchor = cursor.anchor()
+        state.scroll = self.verticalScrollBar().value()
+        self.highlighter.store(state)
+        state.save(self.fileName())
     
     
     def open(self):
@@ -530,21 +1241,21 @@ class Editor(QTextEdit):
             'Markdown (*.md);;Text (*.txt);;Serum Notes (*.snote);;All Files (*)'
         )[0]
         self.__extension = pathlib.Path(file).suffix
-        text = self.toPlainText()
         
         if file:
-            if self._current_text != text and text != '':
+            if self.isDirty(exact=True):
                 self.continue_dialog.yesSignal.connect(lambda: self._open(file))
                 self.continue_dialog.exec_()
-                self.updateProperties()
                 
                 
             else:
                 self._open(file)
-                self.updateProperties()
 
-        self.highlighter.docType = self.getFileExtension()
-        self.highlighter.rehighlight()
+            if self._backend_requested:
+                #: Another editor took over this file
+                return
+
+            self.updateProperties()
 
     def insertHeader(self, level: int=1):
         self.textCursor().insertText('{header} '.format(header='#'*level))
@@ -641,4 +1352,638 @@ class Editor(QTextEdit):
         return super().insertFromMimeData(source)
 
     def toRawHtml(self):
-        return markdown(self.toPlainText())
\ No newline at end of file
+        if self._engine is None:
+            self._engine = create_engine()
+        return self._engine.convert(self.toPlainText())
+
+
+class Editor(EditorMixin, QTextEdit):
+    textChangedEvent = Signal(str)
+    documentDelta = Signal(DocumentDelta)
+    fileNameChanged = Signal(str)
+    backendRequested = Signal(str)
+    loadProgress = Signal(int)
+    documentLoaded = Signal()
+    _show_status = Signal(str)
+
+    def __init__(self, parent=None, **options):
+        super().__init__(parent, **options)
+        self.setAcceptRichText(False)
+
+
+class LargeEditor(EditorMixin, QPlainTextEdit):
+    """
+    Backend for large documents. `QPlainTextEdit` lays the document out
+    block by block and only for the visible part of it, instead of the
+    whole rich text layout `QTextEdit` builds.
+    """
+    textChangedEvent = Signal(str)
+    documentDelta = Signal(DocumentDelta)
+    fileNameChanged = Signal(str)
+    backendRequested = Signal(str)
+    loadProgress = Signal(int)
+    documentLoaded = Signal()
+    _show_status = Signal(str)
+
+    def __init__(self, parent=None, **options):
+        super().__init__(parent, **options)
+        self.setCenterOnScroll(False)
+
+    def setLineHeight(self, height: int=12):
+        #: QPlainTextDocumentLayout ignores line heights, skip the format edit
+        pass
+
+
+class HugeEditor(LineView):
+    """
+    Backend for documents too big for a `QTextDocument`. The text lives in
+    a `PieceTable` and only the visible lines are ever laid out. There is
+    no syntax highlighting or spell checking, and plugins are not run.
+    """
+    textChangedEvent = Signal(str)
+    documentDelta = Signal(DocumentDelta)
+    fileNameChanged = Signal(str)
+    backendRequested = Signal(str)
+    loadProgress = Signal(int)
+    documentLoaded = Signal()
+    _show_status = Signal(str)
+
+    __filename: str = None
+    __extension = ''
+    __name = None
+    _saved_hash: bytes = None
+    _modified: bool = False
+    _reader: FileReader = None
+    _format: FileFormat = FileFormat()
+    _revision: int = 0
+    _backend_requested: bool = False
+    _undoing: bool = False
+    _state: EditorState = None
+    _engine: RenderEngine = None
+    #: Joins the pieces, only ever asked for by an export
+    toRawHtml = EditorMixin.toRawHtml
+
+    def __init__(self, parent=None, **options):
+        super().__init__(parent)
+        self._parent = parent
+        self._properties = Properties.Settings()
+        #: Nothing to highlight or spell check
+        self.highlighter = None
+        #: Headings aren't indexed, the text is never in a document
+        self.outline = None
+
+        self.setFont(QFont('Fira Mono'))
+        self.setViewportMargins(40,40,40,40)
+        self.init_kwargs()
+        self._parent.changed_style.connect(self.init_kwargs)
+
+        self.statistics = LineStatistics(self)
+        self.linesChanged.connect(self.statistics.replace)
+        self.history = UndoHistory(undo_budget(self._properties), self)
+        self.cursorPositionChanged.connect(
+            lambda: self.history.follow(self.textCursor().position())
+        )
+        self.saver = SaveService(self)
+        self.saver.saving.connect(
+            lambda path: self._show_status.emit('Saving %s' % (pathlib.Path(path).name))
+        )
+        self.saver.saved.connect(self.__saved)
+        self.saver.failed.connect(
+            lambda path, error: self._show_status.emit(
+                'Could not save %s: %s' % (pathlib.Path(path).name, error)
+            )
+        )
+        #: Positions here are code points
+        self.journal = Journal(
+            lambda: self.source().chunks(),
+            encoding='utf-32-le',
+            fsync=self._properties.fsync_on_save is not False,
+            parent=self
+        )
+        self.contentsChange.connect(self.__contents_change)
+        self.contentsChange.connect(self.__journal_change)
+
+        self.caret = Caret(self)
+        self._parent.changed_style.connect(self.caret.updateColors)
+        QTimer.singleShot(0, self.setFocus)
+
+        self.continue_dialog = MaskDialog(
+            'Serum Writer', 
+            'Would you like to continue the operation without saving? This may lost all the progress',
+            self._parent
+        )
+        self.continue_dialog.hide()
+
+        self.exit_dialog = MaskDialog(
+            'Serum Writer', 
+            'Would you like to exit the app without saving? This may lost all the progress',
+            self._parent
+        )
+        self.exit_dialog.hide()
+
+        #: Without `restore` the window puts the document in itself
+        if options.get('restore', True) \
+            and self._properties.filename != None \
+            and pathlib.Path(self._properties.filename).exists():
+
+            self._open(self._properties.filename)
+
+    def init_kwargs(self):
+        self.setStyleSheet('color: {}'.format(palette.COLOR_TEXT_2))
+
+    def __contents_change(self, position: int, removed: int, added: int):
+        self._revision += 1
+        line = self.source().lineAt(position)
+        self.documentDelta.emit(
+            DocumentDelta(
+                position,
+                removed,
+                added,
+                line,
+                self.source().lineAt(position + added),
+                self.lineCount(),
+                self._revision
+            )
+        )
+
+        if not self._modified:
+            self._modified = True
+            if self.fileName() is not None:
+                self._show_status.emit('*  %s' % (self.__name))
+
+    def _replace(self, start: tuple, end: tuple, text: str):
+        if self.isReadOnly() or self._undoing:
+            return super()._replace(start, end, text)
+
+        position = self.offset(start)
+        removed = self.textBetween(start, end)
+        #: Recorded first, the cursor moves to the end of the step while replacing
+        if removed or text:
+            self.history.record(position, removed, text)
+        super()._replace(start, end, text)
+
+    def keyPressEvent(self, e: QKeyEvent):
+        if e.matches(QKeySequence.StandardKey.Undo):
+            return self.undo()
+        if e.matches(QKeySequence.StandardKey.Redo):
+            return self.redo()
+        return super().keyPressEvent(e)
+
+    def undo(self):
+        edit = self.history.takeUndo()
+        if edit is not None:
+            self.__apply(edit.position, edit.inserted_length, edit.removed)
+
+    def redo(self):
+        edit = self.history.takeRedo()
+        if edit is not None:
+            self.__apply(edit.position, edit.removed_length, edit.inserted)
+
+    def __apply(self, position: int, length: int, text: str):
+        self._undoing = True
+        try:
+            self._replace(self.position(position), self.position(position + length), text)
+        finally:
+            self._undoing = False
+
+    def __journal_change(self, position: int, removed: int, added: int):
+        if self._properties.journal is False:
+            return
+
+        if not self.journal.isActive():
+            if not self.fileName() or self._saved_hash is None:
+                self.journal.begin(self.fileName())
+                return
+            self.journal.begin(self.fileName(), self._saved_hash, len(self.source()))
+
+        self.journal.record(position, removed, self.source().text(position, position + added))
+
+    def __recover(self):
+        if self._properties.journal is False:
+            return
+
+        text = Journal.replay(self.fileName(), self._saved_hash, self.source().text, self.journal.key())
+        if text is None or text == self.source().text():
+            return
+
+        self.setSource(PieceTable(text))
+        self.statistics.reset(self.source().chunks())
+        self.history.clear()
+        self._modified = True
+        self.journal.resume(self.fileName())
+        self._show_status.emit('Recovered unsaved changes to %s' % (self.__name))
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        self.caret.paint(event)
+
+    def revision(self) -> int:
+        return self._revision
+
+    def isEmpty(self) -> bool:
+        return not len(self.source())
+
+    def toPlainText(self) -> str:
+        return self.source().text()
+
+    def markSaved(self, text: str = None):
+        self._saved_hash = content_hash(self.source().chunks())
+        self._modified = False
+
+    def isDirty(self, exact: bool = False) -> bool:
+        if not self._modified:
+            return False
+
+        if exact and self._saved_hash is not None:
+            return content_hash(self.source().chunks()) != self._saved_hash
+
+        return True
+
+    def run_plugins(self, run: bool = True):
+        #: Plugins work on a `QTextDocument`, there is none here
+        pass
+
+    def get_words(self):
+        return []
+
+    def addToDictionary(self, word):
+        pass
+
+    def setFileName(self, f: str) -> str:
+        self.__filename = f
+        self.__name = pathlib.Path(f).name if f else None
+        if f is None:
+            self._format = FileFormat()
+        return self.__filename
+
+    def fileName(self, name: bool=False):
+        if name:
+            return self.__name
+
+        return self.__filename
+
+    def fileExtension(self):
+        return self.__extension
+
+    def getFileExtension(self):
+        return EditorMixin.getFileExtension(self)
+
+    def updateProperties(self):
+        self._properties.filename = self.fileName()
+
+    def clear(self):
+        self.setSource(PieceTable())
+        self.statistics.reset()
+        self.markSaved()
+        self.journal.discard()
+        self.history.clear()
+
+    def _open(self, file: str):
+        self.journal.discard()
+        if editor_class(file) is not type(self):
+            self._backend_requested = True
+            self.backendRequested.emit(file)
+            return None
+
+        self.setFileName(file)
+        self.fileNameChanged.emit(self.fileName())
+        self.clear()
+        self._state = load_state(self._properties, file) or EditorState()
+        self._show_status.emit('Loading %s' % (self.__name))
+
+        if self._reader is not None:
+            self._reader.discard()
+
+        #: The text is only put together once the whole file is decoded
+        chunks = []
+        reader = self._reader = FileReader(file, self)
+
+        def loaded(file_format: FileFormat, digest: bytes):
+            if reader is self._reader:
+                reader.discard()
+                self._reader = None
+                self.__file_read(chunks, file_format, digest)
+
+        def failed(error: str):
+            if reader is self._reader:
+                reader.discard()
+                self._reader = None
+                self.setReadOnly(False)
+                self._show_status.emit('Could not open %s: %s' % (self.__name, error))
+
+        reader.chunkRead.connect(chunks.append)
+        reader.progress.connect(self.loadProgress)
+        reader.loaded.connect(loaded)
+        reader.failed.connect(failed)
+        self.setReadOnly(True)
+        reader.start()
+
+    def __file_read(self, chunks: list, file_format: FileFormat, digest: bytes):
+        self._format = file_format
+        self.setSource(PieceTable(''.join(chunks)))
+        chunks.clear()
+        self.setReadOnly(False)
+
+        self.statistics.reset(self.source().chunks())
+        self.history.clear()
+        self._saved_hash = digest
+        self._modified = False
+        self._show_status.emit('%s' % (self.__name))
+        self._restore_view()
+        self.__recover()
+        self.documentLoaded.emit()
+
+    def _restore_view(self):
+        state, self._state = self._state, None
+        if state is None:
+            return
+
+        cursor = self.textCursor()
+        cursor.setPosition(state.anchor)
+        cursor.setPosition(state.position, True)
+        self.setTextCursor(cursor)
+        self.verticalScrollBar().setValue(state.scroll)
+
+    def saveState(self):
+        """Remembers the cursor and viewport of the file, there is no highlighting to keep."""
+        #: A state still pending means the file isn't in yet
+        if not self.fileName() or self._state is not None \
+            or self._properties.state_cache is False:
+
+            return
+
+        state = EditorState()
+        state.position = self.textCursor().position()
+        state.anchor = self.offset(self.anchorPosition())
+        state.scroll = self.verticalScrollBar().value()
+        state.save(self.fileName())
+
+    def open(self):
+        file = QFileDialog.getOpenFileName(
+            self,
+            'Open File',
+            os.getcwd(),
+            'Markdown (*.md);;Text (*.txt);;Serum Notes (*.snote);;All Files (*)'
+        )[0]
+        self.__extension = pathlib.Path(file).suffix
+
+        if file:
+            if self.isDirty(exact=True):
+                self.continue_dialog.yesSignal.connect(lambda: self._open(file))
+                self.continue_dialog.exec_()
+            else:
+                self._open(file)
+
+            if self._backend_requested:
+                return
+
+            self.updateProperties()
+
+    def save(self):
+        if not self.fileName():
+            return self.saveAs()
+
+        self.__write()
+
+    def saveAs(self):
+        file = QFileDialog.getSaveFileName(
+            self, 
+            'Save File', 
+            os.getcwd(), 
+            "Markdown (*.md);;Text (*.txt);;All Files (*)"
+        )[0]
+        self.__extension = pathlib.Path(file).suffix
+        if file:
+            self.setFileName(file)
+            self.fileNameChanged.emit(self.fileName())
+            self.__name = pathlib.Path(self.fileName()).name
+            self.__write()
+
+    def __write(self):
+        #: The pieces are streamed out, the text is never joined
+        self.history.seal()
+        self.saver.save(
+            self.fileName(),
+            self.source().chunks(),
+            self._format,
+            fsync=self._properties.fsync_on_save is not False,
+            revision=self._revision
+        )
+        self.updateProperties()
+
+    def __saved(self, path: str, digest: bytes, revision: int):
+        if path != self.fileName():
+            return
+
+        self._saved_hash = digest
+        if revision == self._revision:
+            self._modified = False
+            self.journal.discard()
+            self._show_status.emit('%s' % (self.__name))
+        else:
+            if self.journal.isActive():
+                self.journal.compact()
+            self._show_status.emit('*  %s' % (self.__name))
+
+    def new(self):
+        def clear():
+            self.setFileName(None)
+            self.clear()
+
+        if self.isDirty(exact=True):
+            self.continue_dialog.yesSignal.connect(clear)
+            self.continue_dialog.exec_()
+        else:
+            clear()
+
+    def shutdown(self):
+        """Stops reading and finishes every queued save, the editor is about to go."""
+        if self._reader is not None:
+            self._reader.discard()
+            self._reader = None
+        self.saver.flush()
+
+    def close_file(self):
+        def close_and_clear():
+            self.setFileName(None)
+            self._show_status.emit(' ')
+            self.clear()
+
+        if self.isDirty(exact=True):
+            self.continue_dialog.yesSignal.connect(close_and_clear)
+            self.continue_dialog.exec_()
+        else:
+            close_and_clear()
+
+        self.updateProperties()
+
+    def insertHeader(self, level: int=1):
+        self.insertPlainText('{header} '.format(header='#'*level))
+
+    def insertQuoteBlock(self):
+        self.insertPlainText('> ')
+
+    def insertCodeBlock(self):
+        pass
+
+    def insertList(self, ordered: bool=False):
+        self.insertPlainText('- ')
+
+    def insertBold(self):
+        self.__surround('**')
+
+    def insertItalic(self):
+        self.__surround('*')
+
+    def insertImage(self):
+        self.__insert_selected('![Image Name](', 'Image Url', ')')
+
+    def insertLink(self):
+        self.__insert_selected('[Link Title](', 'Link', ')')
+
+    def __surround(self, key: str):
+        text = self.selectedText()
+        self.insertPlainText(key + text + key)
+        if not text:
+            line, column = self.cursorPosition()
+            self.setCursorPosition(line, column - len(key))
+
+    def __insert_selected(self, before: str, text: str, after: str):
+        self.insertPlainText(before + text + after)
+        line, column = self.cursorPosition()
+        self.setCursorPosition(line, column - len(after) - len(text))
+        self.setCursorPosition(line, column - len(after), keep_anchor=True)
+
+
+class MappedEditor(HugeEditor):
+    """
+    Read-only viewer for files too big to load at all. The file is memory
+    mapped and only the offsets of its lines are kept in memory, see
+    `MappedText`. The line index is built in the background.
+    """
+
+    def __init__(self, parent=None, **options):
+        self._index_timer = QTimer()
+        self._index_timer.setInterval(0)
+        #: (text, byte position) of a match the index hasn't reached yet
+        self._match: t.Optional[t.Tuple[str, int]] = None
+        super().__init__(parent, **options)
+        self._index_timer.setParent(self)
+        self._index_timer.timeout.connect(self.__index_chunk)
+        self.setReadOnly(True)
+
+    def _open(self, file: str):
+        if editor_class(file) is not type(self):
+            self._backend_requested = True
+            self.backendRequested.emit(file)
+            return None
+
+        self.setFileName(file)
+        self.fileNameChanged.emit(self.fileName())
+        self._state = load_state(self._properties, file) or EditorState()
+        self.__unmap(MappedText(file))
+        self.__index_chunk()
+        self._index_timer.start()
+
+    def find(self, text: str) -> bool:
+        """
+        Selects the next `text` after the cursor. The file is searched as
+        a whole, a match past the indexed lines is selected once the index
+        timer gets there.
+        """
+        source = self.source()
+        if not isinstance(source, MappedText):
+            return super().find(text)
+
+        self._match = None
+        found = source.find(text, self.offset(self.selectionRange()[1]))
+        if found == -1:
+            return False
+
+        if found < source.indexed():
+            self.__select(found, text)
+        else:
+            self._match = text, found
+        return True
+
+    def __select(self, found: int, text: str):
+        #: The match is where the view goes, not where the file was left
+        self._state = None
+        self._select_match(self.source().position(found), text)
+
+    def __index_chunk(self):
+        source = self.source()
+        done = source.index()
+        self.sourceChanged()
+        self.loadProgress.emit(source.progress())
+
+        if done:
+            self._index_timer.stop()
+            self._show_status.emit('%s (read-only)' % (self.fileName(name=True)))
+            self._restore_view()
+            self.documentLoaded.emit()
+
+        if self._match is not None and self._match[1] < source.indexed():
+            #: Searched for while the index was behind
+            text, found = self._match
+            self._match = None
+            self.__select(found, text)
+
+    def __unmap(self, source):
+        #: The statistics stop reading the old map before it is closed
+        old = self.source()
+        self._index_timer.stop()
+        self._match = None
+        self.setSource(source)
+        if isinstance(source, MappedText):
+            self.statistics.reset(source.chunks(256 * 1024))
+        else:
+            self.statistics.reset()
+
+        if isinstance(old, MappedText):
+            old.close()
+
+    def clear(self):
+        self.__unmap(PieceTable())
+        self.markSaved()
+
+    def markSaved(self, text: str = None):
+        self._modified = False
+
+    def isDirty(self, exact: bool = False) -> bool:
+        return False
+
+    def save(self):
+        self._show_status.emit('%s (read-only)' % (self.fileName(name=True)))
+
+    def saveAs(self):
+        self.save()
+
+
+def undo_budget(properties: Properties.Settings) -> int:
+    """The undo memory budget in bytes, the `undo_budget` setting is in MB."""
+    try:
+        return int(properties.undo_budget) * 1024 * 1024
+    except (TypeError, ValueError):
+        return UNDO_BUDGET
+
+
+def load_state(properties: Properties.Settings, file: str) -> EditorState:
+    """The saved state of `file`, None without one or with the `state_cache` setting off."""
+    if properties.state_cache is False:
+        return None
+    return EditorState.load(file)
+
+
+def editor_class(file: str = None) -> type:
+    """Picks the editor backend for `file` by its size on disk."""
+    try:
+        size = os.path.getsize(file) if file else 0
+    except OSError:
+        size = 0
+
+    if size >= MAPPED_FILE_THRESHOLD:
+        return MappedEditor
+    if size >= HUGE_FILE_THRESHOLD:
+        return HugeEditor
+    return LargeEditor if size >= LARGE_FILE_THRESHOLD else Editor
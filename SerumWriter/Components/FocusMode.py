@@ -0,0 +1,95 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from PyQt5.QtCore import QObject
+from PyQt5.QtGui import (
+    QColor,
+    QTextCharFormat,
+    QTextCursor
+)
+from PyQt5.QtWidgets import QTextEdit
+
+import typing as t
+if t.TYPE_CHECKING:
+    from PyQt5.QtWidgets import QAbstractScrollArea
+    from SerumWriter.Lib.Document import DocumentDelta
+
+
+class FocusMode(QObject):
+    """
+    Keeps the paragraph under the cursor at full color while the rest of
+    the document is dimmed by the editor stylesheet.
+
+    Work only happens when the cursor enters another block or an edit
+    touches the one it is in, and then only the exited and the entered
+    paragraph are restyled.
+    """
+
+    def __init__(self, editor: 'QAbstractScrollArea', enabled: bool = True):
+        super().__init__(editor)
+        self._editor = editor
+        self._enabled = enabled
+        self._block = -1
+        self._format = QTextCharFormat()
+
+        #: Connected exactly once, theme changes only swap the format
+        editor.cursorPositionChanged.connect(self.__moved)
+        #: The highlight doesn't grow with text typed at the start of the
+        #: block, nor take in a paragraph merged into it
+        editor.documentDelta.connect(self.__edited)
+
+    def isEnabled(self) -> bool:
+        return self._enabled
+
+    def setEnabled(self, v: bool):
+        self._enabled = v
+        self.refresh()
+
+    def setColor(self, color: str):
+        self._format = QTextCharFormat()
+        self._format.setForeground(QColor(color))
+        self.refresh()
+
+    def refresh(self):
+        self._block = -1
+        self.__moved()
+
+    def __edited(self, delta: 'DocumentDelta'):
+        if delta.first_block <= self._block <= delta.last_block:
+            self.refresh()
+
+    def __moved(self):
+        block = self._editor.textCursor().block()
+        if block.blockNumber() == self._block:
+            return
+
+        self._block = block.blockNumber()
+        if not self._enabled:
+            self._editor.setSelections('focus', [])
+            return
+
+        selection = QTextEdit.ExtraSelection()
+        selection.format = self._format
+        selection.cursor = QTextCursor(block)
+        selection.cursor.movePosition(
+            QTextCursor.MoveOperation.EndOfBlock,
+            QTextCursor.MoveMode.KeepAnchor
+        )
+        self._editor.setSelections('focus', [selection])
@@ -0,0 +1,480 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from PyQt5.QtCore import (
+    pyqtSignal as Signal,
+    Qt,
+    QPoint,
+    QPointF,
+    QRect
+)
+from PyQt5.QtGui import (
+    QKeyEvent,
+    QKeySequence,
+    QMouseEvent,
+    QPainter,
+    QPaintEvent,
+    QPalette,
+    QTextLayout,
+    QTextOption
+)
+from PyQt5.QtWidgets import (
+    QAbstractScrollArea,
+    QApplication
+)
+from SerumWriter.Lib.PieceTable import PieceTable
+
+import typing as t
+
+#: (line, column)
+Position = t.Tuple[int, int]
+
+#: Horizontal space left before the text
+PADDING = 4
+
+
+class LineCursor:
+    """
+    Copy of a `LineView` cursor with the parts of the `QTextCursor` API
+    the window uses (selection, block number, moving to a position).
+    Changes only apply once it is passed to `LineView.setTextCursor`.
+    """
+
+    __slots__ = ('_view', 'anchor', 'cursor')
+
+    def __init__(self, view: 'LineView'):
+        self._view = view
+        self.anchor = view.anchorPosition()
+        self.cursor = view.cursorPosition()
+
+    def hasSelection(self) -> bool:
+        return self.anchor != self.cursor
+
+    def selectedText(self) -> str:
+        return self._view.textBetween(*sorted((self.anchor, self.cursor)))
+
+    def blockNumber(self) -> int:
+        return self.cursor[0]
+
+    def position(self) -> int:
+        return self._view.offset(self.cursor)
+
+    def selectionStart(self) -> int:
+        return self._view.offset(min(self.anchor, self.cursor))
+
+    def selectionEnd(self) -> int:
+        return self._view.offset(max(self.anchor, self.cursor))
+
+    def setPosition(self, position: int, keep_anchor: bool = False):
+        self.cursor = self._view.position(position)
+        if not keep_anchor:
+            self.anchor = self.cursor
+
+
+class LineView(QAbstractScrollArea):
+    """
+    Plain text view that only ever touches the lines on screen.
+
+    The text comes from a line source (`PieceTable` or anything with
+    `lineCount`, `lines`, `offset`, `position` and, when editable,
+    `lineStart`, `insert` and `remove`). Offsets are in the
+    units of the source, columns always count characters. Each paint asks the source for the visible window of lines
+    and lays out only those, so the cost of scrolling and typing doesn't
+    depend on the size of the document.
+    """
+    cursorPositionChanged = Signal()
+    selectionChanged = Signal()
+    #: position, removed characters, added characters
+    contentsChange = Signal(int, int, int)
+    #: first line, text of the replaced lines, text of the new lines
+    linesChanged = Signal(int, str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._source = PieceTable()
+        self._cursor: Position = (0, 0)
+        self._anchor: Position = (0, 0)
+        self._read_only = False
+        #: x kept while moving up and down through shorter lines
+        self._goal_x: float = None
+        self._text_width = 0
+
+        self._option = QTextOption()
+        self._option.setWrapMode(QTextOption.WrapMode.NoWrap)
+        self._option.setTabStopDistance(40)
+
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.viewport().setCursor(Qt.CursorShape.IBeamCursor)
+        self.verticalScrollBar().setSingleStep(1)
+
+    def source(self):
+        return self._source
+
+    def setSource(self, source):
+        self._source = source
+        self._cursor = self._anchor = (0, 0)
+        self._goal_x = None
+        self._text_width = 0
+        self.verticalScrollBar().setValue(0)
+        self.horizontalScrollBar().setValue(0)
+        self.sourceChanged()
+        self.cursorPositionChanged.emit()
+
+    def sourceChanged(self):
+        """Call when lines were added to the source outside of the view."""
+        self.__update_scrollbars()
+        self.viewport().update()
+
+    def isReadOnly(self) -> bool:
+        return self._read_only
+
+    def setReadOnly(self, read_only: bool):
+        self._read_only = read_only
+
+    def lineCount(self) -> int:
+        return self._source.lineCount()
+
+    def lineHeight(self) -> int:
+        return self.fontMetrics().lineSpacing()
+
+    def firstVisibleLine(self) -> int:
+        return self.verticalScrollBar().value()
+
+    def scrollToLine(self, line: float):
+        self.verticalScrollBar().setValue(int(line))
+
+    def visibleLineCount(self) -> int:
+        return self.viewport().height() // self.lineHeight() + 1
+
+    def cursorPosition(self) -> Position:
+        return self._cursor
+
+    def anchorPosition(self) -> Position:
+        return self._anchor
+
+    def setCursorPosition(self, line: int, column: int, keep_anchor: bool = False):
+        line = max(0, min(line, self.lineCount() - 1))
+        column = max(0, min(column, len(self._source.line(line))))
+        had_selection = self.hasSelection()
+
+        self._cursor = (line, column)
+        if not keep_anchor:
+            self._anchor = self._cursor
+
+        self.ensureCursorVisible()
+        self.viewport().update()
+        self.cursorPositionChanged.emit()
+        if had_selection or self.hasSelection():
+            self.selectionChanged.emit()
+
+    def hasSelection(self) -> bool:
+        return self._cursor != self._anchor
+
+    def selectionRange(self) -> t.Tuple[Position, Position]:
+        return min(self._cursor, self._anchor), max(self._cursor, self._anchor)
+
+    def selectedText(self) -> str:
+        return self.textBetween(*self.selectionRange())
+
+    def textBetween(self, start: Position, end: Position) -> str:
+        if start >= end:
+            return ''
+
+        (first, start), (last, end) = start, end
+        lines = self._source.lines(first, last - first + 1)
+        lines[-1] = lines[-1][:end]
+        lines[0] = lines[0][start:]
+        return '\n'.join(lines)
+
+    def offset(self, position: Position) -> int:
+        """Offset of a (line, column) position in the source."""
+        return self._source.offset(*position)
+
+    def position(self, offset: int) -> Position:
+        return self._source.position(max(0, min(offset, len(self._source))))
+
+    def textCursor(self) -> LineCursor:
+        return LineCursor(self)
+
+    def setTextCursor(self, cursor: LineCursor):
+        self._anchor = cursor.anchor
+        self.setCursorPosition(*cursor.cursor, keep_anchor=True)
+
+    def find(self, text: str) -> bool:
+        """Selects the next occurrence of `text` after the cursor."""
+        found = self._source.search(text, *self.selectionRange()[1])
+        if found is None:
+            return False
+
+        self._select_match(found, text)
+        return True
+
+    def _select_match(self, found: Position, text: str):
+        """Selects `text`, which starts at `found`."""
+        line, column = found
+        lines = text.split('\n')
+        if len(lines) > 1:
+            end = (line + len(lines) - 1, len(lines[-1]))
+        else:
+            end = (line, column + len(text))
+
+        self._anchor = found
+        self.setCursorPosition(*end, keep_anchor=True)
+
+    def selectAll(self):
+        last = self.lineCount() - 1
+        self._anchor = (0, 0)
+        self.setCursorPosition(last, len(self._source.line(last)), keep_anchor=True)
+
+    def copy(self):
+        if self.hasSelection():
+            QApplication.clipboard().setText(self.selectedText())
+
+    def cut(self):
+        self.copy()
+        self.insertPlainText('')
+
+    def paste(self):
+        self.insertPlainText(QApplication.clipboard().text())
+
+    def insertPlainText(self, text: str):
+        """Replaces the selection (if any) with `text`."""
+        start, end = self.selectionRange()
+        self._replace(start, end, text)
+
+    def cursorRect(self) -> QRect:
+        line, column = self._cursor
+        row = line - self.firstVisibleLine()
+        if row < 0 or row > self.visibleLineCount():
+            return QRect()
+
+        x = self.__offset() + self.__x(self._source.line(line), column)
+        return QRect(int(x), row * self.lineHeight(), 2, self.lineHeight())
+
+    def ensureCursorVisible(self):
+        line, column = self._cursor
+        bar = self.verticalScrollBar()
+        visible = max(self.viewport().height() // self.lineHeight(), 1)
+        if line < bar.value():
+            bar.setValue(line)
+        elif line >= bar.value() + visible:
+            bar.setValue(line - visible + 1)
+
+        x = self.__x(self._source.line(line), column) + PADDING
+        bar = self.horizontalScrollBar()
+        if x < bar.value():
+            bar.setValue(int(x) - PADDING)
+        elif x > bar.value() + self.viewport().width() - PADDING:
+            bar.setMaximum(max(bar.maximum(), int(x)))
+            bar.setValue(int(x) - self.viewport().width() + PADDING * 4)
+
+    def _replace(self, start: Position, end: Position, text: str):
+        """Replaces the text between two positions, the single place edits go through."""
+        if self._read_only or (start == end and not text):
+            return
+
+        source = self._source
+        first, last = start[0], end[0]
+        old = '\n'.join(source.lines(first, last - first + 1))
+
+        position = source.lineStart(first) + start[1]
+        removed = source.lineStart(last) + end[1] - position
+        source.remove(position, removed)
+        source.insert(position, text)
+
+        newlines = text.count('\n')
+        new = '\n'.join(source.lines(first, newlines + 1))
+        if newlines:
+            cursor = (first + newlines, len(text) - text.rfind('\n') - 1)
+        else:
+            cursor = (first, start[1] + len(text))
+
+        self._goal_x = None
+        self.contentsChange.emit(position, removed, len(text))
+        self.linesChanged.emit(first, old, new)
+        self.__update_scrollbars()
+        self.setCursorPosition(*cursor)
+
+    def paintEvent(self, event: QPaintEvent):
+        painter = QPainter(self.viewport())
+        palette = self.palette()
+        painter.setPen(palette.color(QPalette.ColorRole.Text))
+
+        height = self.lineHeight()
+        first = self.firstVisibleLine() + event.rect().top() // height
+        last = self.firstVisibleLine() + event.rect().bottom() // height
+        (start_line, start), (end_line, end) = self.selectionRange()
+        offset = self.__offset()
+
+        selection_format = QTextLayout.FormatRange()
+        selection_format.format.setBackground(palette.highlight())
+        selection_format.format.setForeground(palette.highlightedText())
+
+        width = self._text_width
+        lines = self._source.lines(first, last - first + 1)
+        for number, text in enumerate(lines, first):
+            layout = self.__layout(text)
+
+            selections = []
+            if self.hasSelection() and start_line <= number <= end_line:
+                selection_format.start = start if number == start_line else 0
+                #: Selected line breaks show as one extra character
+                stop = end if number == end_line else len(text) + 1
+                selection_format.length = stop - selection_format.start
+                selections.append(selection_format)
+
+            top = (number - self.firstVisibleLine()) * height
+            layout.draw(painter, QPointF(offset, top), selections)
+            width = max(width, int(layout.maximumWidth()))
+
+        painter.end()
+
+        if width > self._text_width:
+            #: Lines are only measured once they are painted
+            self._text_width = width
+            self.__update_scrollbars()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.__update_scrollbars()
+
+    def scrollContentsBy(self, dx: int, dy: int):
+        self.viewport().update()
+
+    def keyPressEvent(self, e: QKeyEvent):
+        key = e.key()
+        keep_anchor = bool(e.modifiers() & Qt.KeyboardModifier.ShiftModifier)
+        word = bool(e.modifiers() & Qt.KeyboardModifier.ControlModifier)
+        line, column = self._cursor
+
+        if e.matches(QKeySequence.StandardKey.SelectAll):
+            self.selectAll()
+        elif e.matches(QKeySequence.StandardKey.Copy):
+            self.copy()
+        elif e.matches(QKeySequence.StandardKey.Cut):
+            self.cut()
+        elif e.matches(QKeySequence.StandardKey.Paste):
+            self.paste()
+
+        elif key in (Qt.Key.Key_Left, Qt.Key.Key_Right):
+            if self.hasSelection() and not keep_anchor:
+                start, end = self.selectionRange()
+                return self.setCursorPosition(*(start if key == Qt.Key.Key_Left else end))
+            self.__move(self.__step(-1 if key == Qt.Key.Key_Left else 1), keep_anchor)
+        elif key in (Qt.Key.Key_Up, Qt.Key.Key_Down, Qt.Key.Key_PageUp, Qt.Key.Key_PageDown):
+            lines = 1 if key in (Qt.Key.Key_Up, Qt.Key.Key_Down) else self.visibleLineCount() - 1
+            if key in (Qt.Key.Key_Up, Qt.Key.Key_PageUp):
+                lines = -lines
+            self.__move_vertically(lines, keep_anchor)
+        elif key == Qt.Key.Key_Home:
+            self.__move((0, 0) if word else (line, 0), keep_anchor)
+        elif key == Qt.Key.Key_End:
+            last = self.lineCount() - 1 if word else line
+            self.__move((last, len(self._source.line(last))), keep_anchor)
+
+        elif key == Qt.Key.Key_Backspace:
+            if self.hasSelection():
+                self.insertPlainText('')
+            else:
+                self._replace(self.__step(-1), self._cursor, '')
+        elif key == Qt.Key.Key_Delete:
+            if self.hasSelection():
+                self.insertPlainText('')
+            else:
+                self._replace(self._cursor, self.__step(1), '')
+        elif key in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+            self.insertPlainText('\n')
+        elif e.text() and (e.text().isprintable() or e.text() == '\t'):
+            self.insertPlainText(e.text())
+
+        else:
+            super().keyPressEvent(e)
+
+    def mousePressEvent(self, e: QMouseEvent):
+        if e.button() == Qt.MouseButton.LeftButton:
+            keep_anchor = bool(e.modifiers() & Qt.KeyboardModifier.ShiftModifier)
+            self.__move(self.__hit(e.pos()), keep_anchor)
+
+    def mouseMoveEvent(self, e: QMouseEvent):
+        if e.buttons() & Qt.MouseButton.LeftButton:
+            self.__move(self.__hit(e.pos()), True)
+
+    def __layout(self, text: str) -> QTextLayout:
+        layout = QTextLayout(text, self.font())
+        layout.setTextOption(self._option)
+        layout.beginLayout()
+        layout.createLine()
+        layout.endLayout()
+        return layout
+
+    def __x(self, text: str, column: int) -> float:
+        layout = self.__layout(text)
+        return layout.lineAt(0).cursorToX(column)[0]
+
+    def __column(self, text: str, x: float) -> int:
+        #: The layout has to outlive the `QTextLine` it hands out
+        layout = self.__layout(text)
+        return layout.lineAt(0).xToCursor(x)
+
+    def __offset(self) -> int:
+        return PADDING - self.horizontalScrollBar().value()
+
+    def __hit(self, point: QPoint) -> Position:
+        line = self.firstVisibleLine() + max(point.y(), 0) // self.lineHeight()
+        line = min(line, self.lineCount() - 1)
+        return line, self.__column(self._source.line(line), point.x() - self.__offset())
+
+    def __step(self, characters: int) -> Position:
+        """The position one character before or after the cursor."""
+        line, column = self._cursor
+        if characters < 0:
+            if column > 0:
+                return line, column - 1
+            if line > 0:
+                return line - 1, len(self._source.line(line - 1))
+        else:
+            if column < len(self._source.line(line)):
+                return line, column + 1
+            if line < self.lineCount() - 1:
+                return line + 1, 0
+        return self._cursor
+
+    def __move(self, position: Position, keep_anchor: bool):
+        self._goal_x = None
+        self.setCursorPosition(*position, keep_anchor=keep_anchor)
+
+    def __move_vertically(self, lines: int, keep_anchor: bool):
+        line, column = self._cursor
+        if self._goal_x is None:
+            self._goal_x = self.__x(self._source.line(line), column)
+
+        line = max(0, min(line + lines, self.lineCount() - 1))
+        column = self.__column(self._source.line(line), self._goal_x)
+        self.setCursorPosition(line, column, keep_anchor)
+
+    def __update_scrollbars(self):
+        visible = max(self.viewport().height() // self.lineHeight(), 1)
+        bar = self.verticalScrollBar()
+        bar.setRange(0, max(self.lineCount() - visible, 0))
+        bar.setPageStep(visible)
+
+        bar = self.horizontalScrollBar()
+        bar.setRange(0, max(self._text_width + PADDING * 2 - self.viewport().width(), 0))
+        bar.setPageStep(self.viewport().width())
@@ -0,0 +1,131 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Sidebar panel listing the headings of the document.
+
+from PyQt5.QtCore import QModelIndex
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtWidgets import (
+    QAbstractItemView,
+    QLabel,
+    QListView,
+    QTextEdit,
+    QVBoxLayout,
+    QWidget
+)
+from SerumWriter.Lib.Outline import DocumentOutline
+
+
+class OutlinePanel(QWidget):
+    """
+    The headings of the editor document from its `DocumentOutline`, the
+    one whose section holds the cursor selected. Activating a heading
+    scrolls it to the top of the editor.
+    """
+
+    def __init__(self, editor, parent=None):
+        super().__init__(parent)
+        self.setObjectName('Outline')
+        self._editor = None
+
+        self.status_label = QLabel()
+        self.status_label.setObjectName('statusLabel')
+
+        self.view = QListView()
+        self.view.setUniformItemSizes(True)
+        self.view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.view.clicked.connect(self.__jump)
+        self.view.activated.connect(self.__jump)
+
+        self._layout = QVBoxLayout()
+        self._layout.setContentsMargins(8,8,8,8)
+        self._layout.addWidget(self.status_label)
+        self._layout.addWidget(self.view)
+        self.setLayout(self._layout)
+        self.editor = editor
+
+    @property
+    def editor(self):
+        return self._editor
+
+    @editor.setter
+    def editor(self, editor):
+        self._editor = editor
+        outline: DocumentOutline = editor.outline
+        self.view.setModel(outline)
+        if outline is not None:
+            outline.modelReset.connect(self.__update_status)
+            outline.rowsInserted.connect(self.__update_status)
+            outline.rowsRemoved.connect(self.__update_status)
+            editor.cursorPositionChanged.connect(self.__track)
+        self.__update_status()
+        self.__track()
+
+    def setFocus(self):
+        self.view.setFocus()
+
+    def __update_status(self):
+        outline = self._editor.outline
+        if outline is None:
+            text = 'No outline for huge documents'
+        elif not len(outline):
+            text = 'No headings'
+        else:
+            text = '{} headings'.format(len(outline))
+        self.status_label.setText(text)
+
+    def __track(self):
+        outline = self._editor.outline
+        if outline is None or not self.isVisible():
+            return
+
+        row = outline.indexAt(self._editor.textCursor().blockNumber())
+        if row < 0:
+            self.view.clearSelection()
+            return
+
+        index = outline.index(row)
+        if self.view.currentIndex() != index:
+            self.view.setCurrentIndex(index)
+            self.view.scrollTo(index)
+
+    def __jump(self, index: QModelIndex):
+        editor = self._editor
+        number = index.data(DocumentOutline.BlockRole)
+        if number is None:
+            return
+
+        block = editor.document().findBlockByNumber(number)
+        if not block.isValid():
+            return
+
+        cursor = QTextCursor(block)
+        editor.setTextCursor(cursor)
+        bar = editor.verticalScrollBar()
+        #: The heading goes to the top of the view
+        if isinstance(editor, QTextEdit):
+            bar.setValue(bar.value() + editor.cursorRect(cursor).top())
+        else:
+            bar.setValue(block.firstLineNumber())
+        editor.setFocus()
+
+    def showEvent(self, e):
+        self.__track()
+        return super().showEvent(e)
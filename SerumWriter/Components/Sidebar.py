@@ -1,55 +1,62 @@
 
 
+import typing as t
+
 from PyQt5.QtWidgets import (
+    QStackedWidget,
+    QVBoxLayout,
     QWidget
 )
-from PyQt5.QtCore import (
-    QPoint,
-    QPropertyAnimation,
-    QEasingCurve
-)
+
+#: Width of the sidebar, the editor gives it up while it is shown
+SIDEBAR_WIDTH = 280
+
 
 class Sidebar(QWidget):
+    """
+    Panels shown next to the editor, one at a time. Each one is toggled
+    by its own shortcut, see `toggle`.
+    """
+
     def __init__(
         self, 
         parent=None
     ):
         super(Sidebar, self).__init__(parent)
-        self.setMinimumWidth(45)
-        
-        self.setStyleSheet('background-color: red;')
-        self.animIn = QPropertyAnimation(self, b'geometry', duration=500, easingCurve=QEasingCurve.OutCubic)
-        self.animIn.setPropertyName(b'pos')
-        self.animOut = QPropertyAnimation(self, b'geometry', duration=500, easingCurve=QEasingCurve.Type.OutCubic)
-        self.animOut.setPropertyName(b'pos')
-        
-        policy = self.sizePolicy()
-        policy.setRetainSizeWhenHidden(True)
-        self.setSizePolicy(policy)
-
-    def animation(self):
+        self.setObjectName('Sidebar')
+        self.setFixedWidth(SIDEBAR_WIDTH)
+        self._panels: t.Dict[str, QWidget] = {}
+
+        self._stack = QStackedWidget(self)
+        self._layout = QVBoxLayout()
+        self._layout.setContentsMargins(0,0,0,0)
+        self._layout.addWidget(self._stack)
+        self.setLayout(self._layout)
+        self.hide()
+
+    def addPanel(self, name: str, panel: QWidget):
+        self._panels[name] = panel
+        self._stack.addWidget(panel)
+
+    def panel(self, name: str) -> QWidget:
+        return self._panels[name]
+
+    def current(self) -> t.Optional[str]:
+        """Name of the panel shown, None while the sidebar is hidden."""
         if self.isHidden():
-        
-            self.hide()
-            self.setGeometry(
-                0,
-                0,
-                int(self.geometry().width()),
-                int(self.geometry().height())        
-            )
-            
-            self.animIn.setStartValue(QPoint(-self.width(), 0))
-            self.animIn.setEndValue(QPoint(0,0))
-        
-            self.animIn.start()
-            self.show()
-
-        elif not self.isHidden():
-            self.animIn.stop()
-            geometry = self.geometry()
-            self.animOut.setStartValue(geometry.topLeft())
-            self.animOut.setEndValue(QPoint(-self.width(), 0))
-            self.animOut.start()
-            self.animOut.finished.connect(self.hide)
+            return None
+        for name, panel in self._panels.items():
+            if panel is self._stack.currentWidget():
+                return name
+        return None
 
+    def toggle(self, name: str):
+        """Shows the panel `name`, or hides the sidebar if it is shown already."""
+        if self.current() == name:
+            self.hide()
+            return
 
+        panel = self._panels[name]
+        self._stack.setCurrentWidget(panel)
+        self.show()
+        panel.setFocus()
@@ -1,6 +1,143 @@
+# Copyright (c) 2022 Serum
 
-from PyQt5.QtWidgets import QTabWidget
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Tab bar of the open documents, only the active one lives in the editor.
+
+import pathlib
+import typing as t
+import uuid
+
+from PyQt5.QtWidgets import QTabBar
+from SerumWriter.Lib.Undo import (
+    pack,
+    unpack
+)
+
+
+class TabState:
+    """
+    What an inactive tab keeps of its document. Unsaved edits stay in its
+    journal, see `Journal`, an untitled document's is named by `key`.
+    Without a journal the edited text is kept compressed in `text`.
+    """
+
+    __slots__ = (
+        'path',
+        'position',
+        'anchor',
+        'scroll',
+        'dirty',
+        'key',
+        '_text'
+    )
+
+    def __init__(self, path: str = None):
+        self.path = path
+        #: None until the tab is left, the editor restores a file's
+        #: saved state by itself, see `EditorState`
+        self.position: t.Optional[int] = None
+        self.anchor: t.Optional[int] = None
+        self.scroll: t.Optional[int] = None
+        self.dirty = False
+        self.key: t.Optional[str] = None if path else uuid.uuid4().hex[:16]
+        self._text: t.Union[str, bytes, None] = None
+
+    @property
+    def name(self) -> str:
+        return pathlib.Path(self.path).name if self.path else 'Untitled'
+
+    @property
+    def text(self) -> t.Optional[str]:
+        return None if self._text is None else unpack(self._text)
+
+    @text.setter
+    def text(self, text: t.Optional[str]):
+        self._text = None if text is None else pack(text)
+
+    def isEmpty(self) -> bool:
+        return self.path is None and not self.dirty and not self._text
+
+    def __repr__(self) -> str:
+        return '<TabState %s dirty=%s>' % (self.name, self.dirty)
+
+
+class TabView(QTabBar):
+    """
+    One tab per open document. The window keeps a single editor and
+    swaps documents in and out of it when the current tab changes, so
+    highlighter, spell checker and preview are shared by every tab.
+    """
 
-class TabWidget(QTabWidget):
     def __init__(self, parent=None):
-        super().__init__(parent=parent)
\ No newline at end of file
+        super().__init__(parent=parent)
+        self.setObjectName('TabView')
+        self.setDocumentMode(True)
+        self.setTabsClosable(True)
+        self.setMovable(True)
+        self.setExpanding(False)
+        self.setAutoHide(True)
+
+    def addDocument(self, path: str = None, index: int = None) -> int:
+        state = TabState(path)
+        if index is None:
+            index = self.addTab(state.name)
+        else:
+            index = self.insertTab(index, state.name)
+
+        self.setTabData(index, state)
+        self.setTabToolTip(index, path or '')
+        return index
+
+    def state(self, index: int = None) -> t.Optional[TabState]:
+        if index is None:
+            index = self.currentIndex()
+        return self.tabData(index) if 0 <= index < self.count() else None
+
+    def states(self) -> t.List[TabState]:
+        return [self.tabData(index) for index in range(self.count())]
+
+    def indexOf(self, path: str) -> int:
+        for index, state in enumerate(self.states()):
+            if state.path and path and pathlib.Path(state.path) == pathlib.Path(path):
+                return index
+        return -1
+
+    def indexOfState(self, state: TabState) -> int:
+        for index in range(self.count()):
+            if self.tabData(index) is state:
+                return index
+        return -1
+
+    def paths(self) -> t.List[str]:
+        return [state.path for state in self.states() if state.path]
+
+    def setPath(self, index: int, path: str):
+        state = self.state(index)
+        state.path = path
+        self.setTabToolTip(index, path or '')
+        self.setDirty(index, state.dirty)
+
+    def setDirty(self, index: int, dirty: bool):
+        state = self.state(index)
+        if state is None:
+            return
+
+        state.dirty = dirty
+        self.setTabText(index, '*  %s' % (state.name) if dirty else state.name)
@@ -0,0 +1,140 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Sidebar panel searching every note of the workspace folder.
+
+import os
+
+from PyQt5.QtCore import (
+    Qt,
+    pyqtSignal as Signal
+)
+from PyQt5.QtGui import QKeyEvent
+from PyQt5.QtWidgets import (
+    QLabel,
+    QLineEdit,
+    QListWidget,
+    QListWidgetItem,
+    QVBoxLayout,
+    QWidget
+)
+from SerumWriter.Lib.Workspace import Workspace
+
+
+class WorkspaceSearch(QWidget):
+    """
+    Searches the notes of the workspace folder through its index, as
+    the query is typed. Words must all be in a note, "quoted phrases"
+    must be in it as they are. Activating a result opens the note.
+    """
+    #: path of the note, query
+    openRequested = Signal(str, str)
+
+    def __init__(self, workspace: Workspace, parent=None):
+        super().__init__(parent)
+        self.setObjectName('WorkspaceSearch')
+        self.workspace = workspace
+        self.workspace.updated.connect(self.__search)
+        self.workspace.progress.connect(self.__progress)
+        self._percent = 0
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText('Search notes')
+        self.search_edit.textChanged.connect(self.__search)
+        self.search_edit.returnPressed.connect(self.__open_current)
+        self.search_edit.installEventFilter(self)
+
+        self.status_label = QLabel()
+        self.status_label.setObjectName('statusLabel')
+
+        self.results = QListWidget()
+        self.results.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.results.itemActivated.connect(self.__open)
+        self.results.itemClicked.connect(self.__open)
+
+        self._layout = QVBoxLayout()
+        self._layout.setContentsMargins(8,8,8,8)
+        self._layout.addWidget(self.search_edit)
+        self._layout.addWidget(self.status_label)
+        self._layout.addWidget(self.results)
+        self.setLayout(self._layout)
+        self.__update_status()
+
+    def setFocus(self):
+        self.search_edit.setFocus()
+        self.search_edit.selectAll()
+
+    def eventFilter(self, obj, e):
+        #: Up and Down go through the results without leaving the box
+        if obj is self.search_edit and isinstance(e, QKeyEvent) and e.type() == QKeyEvent.Type.KeyPress \
+            and e.key() in (Qt.Key.Key_Up, Qt.Key.Key_Down) and self.results.count():
+
+            step = 1 if e.key() == Qt.Key.Key_Down else -1
+            row = max(0, min(self.results.currentRow() + step, self.results.count() - 1))
+            self.results.setCurrentRow(row)
+            return True
+        return super().eventFilter(obj, e)
+
+    def __search(self):
+        query = self.search_edit.text()
+        hits = self.workspace.search(query) if query.strip() else []
+        root = self.workspace.root()
+
+        self.results.clear()
+        for hit in hits:
+            item = QListWidgetItem('{}  ({})'.format(os.path.relpath(hit.path, root), hit.count))
+            item.setData(Qt.ItemDataRole.UserRole, hit.path)
+            item.setToolTip(hit.path)
+            self.results.addItem(item)
+        if hits:
+            self.results.setCurrentRow(0)
+        self.__update_status()
+
+    def __progress(self, percent: int):
+        self._percent = percent
+        self.__update_status()
+
+    def __update_status(self):
+        workspace = self.workspace
+        if workspace.root() is None:
+            text = 'Open a note to search its folder'
+        elif workspace.isIndexing() and not workspace.count():
+            text = 'Indexing {}%'.format(self._percent)
+        elif self.search_edit.text().strip():
+            text = '{} notes'.format(self.results.count()) if self.results.count() else 'No results'
+        else:
+            text = '{} notes in {}'.format(workspace.count(), os.path.basename(workspace.root()))
+            if workspace.isTruncated():
+                text += ', not all indexed'
+        self.status_label.setText(text)
+
+    def __open(self, item: QListWidgetItem):
+        self.openRequested.emit(item.data(Qt.ItemDataRole.UserRole), self.search_edit.text())
+
+    def __open_current(self):
+        item = self.results.currentItem()
+        if item is not None:
+            self.__open(item)
+
+    def showEvent(self, e):
+        #: Notes changed by other programs are picked up when it's opened
+        self.workspace.refresh()
+        self.__update_status()
+        return super().showEvent(e)
@@ -30,6 +30,7 @@ if t.TYPE_CHECKING:
     from SerumWriter.Lib.Modern.Palette import BasePalette
     from PyQt5.QtWidgets import QApplication
     from SerumWriter.Components.Editor import Editor
+    from SerumWriter.Lib.Scheduler import Scheduler
 
 BASE_DIR = pathlib.Path('.')
 RESOURCES_PATH = str((BASE_DIR / 'Resources').absolute())
@@ -58,6 +59,13 @@ def look_up_editor():
 
     return top
 
+def look_up_scheduler():
+    top = scheduler_ctx.top
+    if not top:
+        raise RuntimeError('Scheduler is used outside the app')
+
+    return top
+
 def look_up_resouce_module():
     top = res_module_ctx.top
 
@@ -71,7 +79,9 @@ editor_ctx = LocalStack()
 res_module_ctx = LocalStack()
 palette_ctx = LocalStack()
 app_ctx = LocalStack()
+scheduler_ctx = LocalStack()
 palette: 'BasePalette' = LocalProxy(look_up_palette)
 app: 'QApplication' = LocalProxy(look_up_app)
 editor: 'Editor' = LocalProxy(look_up_editor)
+scheduler: 'Scheduler' = LocalProxy(look_up_scheduler)
 resource = LocalProxy(look_up_resouce_module)
\ No newline at end of file
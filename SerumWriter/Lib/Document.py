@@ -0,0 +1,173 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Lightweight structures describing edits made to the editor document.
+
+import hashlib
+import typing as t
+from PyQt5.QtGui import (
+    QTextBlock,
+    QTextBlockUserData,
+    QTextCursor,
+    QTextDocument
+)
+
+
+class DocumentDelta:
+    """
+    A single change applied to a `QTextDocument`.
+
+    Built from `QTextDocument.contentsChange(position, removed, added)`
+    so consumers can update themselves from the edited range instead of
+    copying the whole document on every keystroke.
+    """
+
+    __slots__ = (
+        'position',
+        'removed',
+        'added',
+        'first_block',
+        'last_block',
+        'block_count',
+        'revision'
+    )
+
+    def __init__(
+        self,
+        position: int,
+        removed: int,
+        added: int,
+        first_block: int,
+        last_block: int,
+        block_count: int,
+        revision: int
+    ):
+        self.position = position
+        self.removed = removed
+        self.added = added
+        self.first_block = first_block
+        self.last_block = last_block
+        self.block_count = block_count
+        self.revision = revision
+
+    @classmethod
+    def from_document(
+        cls,
+        document: QTextDocument,
+        position: int,
+        removed: int,
+        added: int,
+        revision: int
+    ) -> 'DocumentDelta':
+        #: `setPlainText` and `clear` report a range one character past
+        #: the end of the document, clamp it to the last valid position.
+        end = min(position + added, max(document.characterCount() - 1, 0))
+        first = document.findBlock(position).blockNumber()
+        last = document.findBlock(end).blockNumber()
+
+        return cls(
+            position,
+            removed,
+            added,
+            max(first, 0),
+            max(last, first, 0),
+            document.blockCount(),
+            revision
+        )
+
+    @property
+    def end(self) -> int:
+        return self.position + self.added
+
+    def blocks(self) -> range:
+        return range(self.first_block, self.last_block + 1)
+
+    def text(self, document: QTextDocument) -> str:
+        """Returns only the inserted text of this delta."""
+        cursor = QTextCursor(document)
+        cursor.setPosition(min(self.position, document.characterCount() - 1))
+        cursor.setPosition(
+            min(self.end, document.characterCount() - 1),
+            QTextCursor.MoveMode.KeepAnchor
+        )
+        return cursor.selectedText().replace('\u2029', '\n')
+
+    def __repr__(self) -> str:
+        return '<DocumentDelta rev=%d pos=%d -%d +%d blocks=%d..%d>' % (
+            self.revision,
+            self.position,
+            self.removed,
+            self.added,
+            self.first_block,
+            self.last_block
+        )
+
+
+class BlockData(QTextBlockUserData):
+    """Per-block cache attached to every `QTextBlock` of the editor document."""
+
+    __slots__ = (
+        'words',
+        'chars',
+        'sentences',
+        'heading'
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.words = 0
+        self.chars = 0
+        self.sentences = 0
+        #: Markdown heading level, 0 when the block is not a heading
+        self.heading = 0
+
+    @classmethod
+    def of(cls, block: QTextBlock) -> 'BlockData':
+        data = block.userData()
+        if not isinstance(data, cls):
+            data = cls()
+            block.setUserData(data)
+        return data
+
+
+class ContentHash:
+    """`content_hash` of a document fed to it chunk by chunk, as it streams by."""
+
+    __slots__ = ('_digest',)
+
+    def __init__(self):
+        self._digest = hashlib.blake2b(digest_size=16)
+
+    def update(self, chunk: str):
+        self._digest.update(chunk.encode('utf-8'))
+
+    def digest(self) -> bytes:
+        return self._digest.digest()
+
+
+def content_hash(text: t.Union[str, t.Iterable[str]]) -> bytes:
+    """
+    Digest used to tell whether a document was edited back to its saved
+    state. `text` can also be an iterable of chunks of the document.
+    """
+    digest = ContentHash()
+    for chunk in ((text,) if isinstance(text, str) else text):
+        digest.update(chunk)
+    return digest.digest()
@@ -0,0 +1,232 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Markdown to HTML backends behind one interface, see `RenderEngine`.
+
+import abc
+import os
+import re
+import time
+import typing as t
+
+from markdown import Markdown
+
+import SerumWriter.Properties as Properties
+from SerumWriter.Lib.Files import read_text
+
+try:
+    #: CommonMark, several times faster than python-markdown
+    import markdown_it
+except ImportError:
+    markdown_it = None
+
+try:
+    import mistune
+except ImportError:
+    mistune = None
+
+#: Used when the `render_engine` setting names none that is installed
+DEFAULT_ENGINE = 'python-markdown'
+
+#: Files of a benchmark corpus
+CORPUS_SUFFIXES = ('.md', '.markdown')
+CORPUS_LIMIT = 2000
+#: Best of this many timed passes over the corpus
+BENCHMARK_PASSES = 3
+
+reSpace = re.compile(r'\s+')
+
+
+class RenderEngine(abc.ABC):
+    """
+    Turns Markdown into HTML. An engine is set up once and reused for
+    every document, `convert` resets whatever state the previous one
+    left behind. An instance is used from one thread at a time.
+    """
+    name: str = None
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    @abc.abstractmethod
+    def convert(self, text: str) -> str:
+        pass
+
+
+class PythonMarkdownEngine(RenderEngine):
+    """python-markdown, what the preview has always rendered with."""
+    name = 'python-markdown'
+
+    def __init__(self):
+        #: Setting up the extensions costs more than converting a paragraph
+        self._converter = Markdown()
+
+    def convert(self, text: str) -> str:
+        return self._converter.reset().convert(text)
+
+
+class MarkdownItEngine(RenderEngine):
+    """markdown-it-py, CommonMark with tables and strikethrough."""
+    name = 'markdown-it'
+
+    @classmethod
+    def available(cls) -> bool:
+        return markdown_it is not None
+
+    def __init__(self):
+        self._parser = markdown_it.MarkdownIt('commonmark').enable(['table', 'strikethrough'])
+
+    def convert(self, text: str) -> str:
+        return self._parser.render(text)
+
+
+class MistuneEngine(RenderEngine):
+    """mistune, passing raw HTML through like python-markdown does."""
+    name = 'mistune'
+
+    @classmethod
+    def available(cls) -> bool:
+        return mistune is not None and hasattr(mistune, 'create_markdown')
+
+    def __init__(self):
+        self._parser = mistune.create_markdown(escape=False, plugins=['table', 'strikethrough'])
+
+    def convert(self, text: str) -> str:
+        return self._parser(text)
+
+
+#: Every engine by name, installed or not
+ENGINES: t.Dict[str, t.Type[RenderEngine]] = {
+    engine.name: engine for engine in (PythonMarkdownEngine, MarkdownItEngine, MistuneEngine)
+}
+
+
+def available_engines() -> t.List[str]:
+    return [name for name, engine in ENGINES.items() if engine.available()]
+
+
+def create_engine(name: str = None) -> RenderEngine:
+    """
+    A new engine called `name`, by default the one of the `render_engine`
+    setting, `DEFAULT_ENGINE` when that isn't installed.
+    """
+    name = name or Properties.Settings().render_engine
+    engine = ENGINES.get(name)
+    if engine is None or not engine.available():
+        engine = ENGINES[DEFAULT_ENGINE]
+    return engine()
+
+
+class BenchmarkResult(t.NamedTuple):
+    engine: str
+    #: Best time for one pass over the corpus, in seconds
+    seconds: float
+    #: Documents rendered the same as python-markdown, whitespace aside
+    matching: int
+    documents: int
+
+    def throughput(self, size: int) -> float:
+        """MB rendered per second, the corpus being `size` characters long."""
+        return size / self.seconds / (1024 * 1024) if self.seconds else 0.0
+
+
+def collect_corpus(paths: t.Iterable[str]) -> t.List[str]:
+    """The Markdown files at `paths`, folders searched through."""
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+
+        for folder, folders, names in os.walk(path):
+            folders[:] = sorted(name for name in folders if not name.startswith('.'))
+            files.extend(
+                os.path.join(folder, name) for name in sorted(names)
+                if name.lower().endswith(CORPUS_SUFFIXES)
+            )
+    return files[:CORPUS_LIMIT]
+
+
+def benchmark(
+    documents: t.Sequence[str],
+    engines: t.Iterable[str] = None,
+    passes: int = BENCHMARK_PASSES
+) -> t.List[BenchmarkResult]:
+    """
+    Times every engine rendering `documents`, by default every one
+    installed, fastest first. Each gets a pass to warm up first. Engines
+    not installed are skipped, `create_engine` would stand in another.
+    """
+    reference = [reSpace.sub('', html) for html in map(PythonMarkdownEngine().convert, documents)]
+    installed = available_engines()
+    results = []
+    for name in engines or installed:
+        if name not in installed:
+            continue
+        engine = ENGINES[name]()
+        rendered = [engine.convert(document) for document in documents]
+        best = None
+        for _ in range(passes):
+            start = time.perf_counter()
+            for document in documents:
+                engine.convert(document)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        matching = sum(
+            reSpace.sub('', html) == expected for html, expected in zip(rendered, reference)
+        )
+        results.append(BenchmarkResult(name, best, matching, len(documents)))
+    return sorted(results, key=lambda result: result.seconds)
+
+
+def run_benchmark(paths: t.Iterable[str]) -> t.Optional[str]:
+    """
+    Benchmarks the engines on the Markdown files at `paths` and prints
+    how they did. The fastest becomes the `render_engine` setting, its
+    name is returned, None when there was nothing to render.
+    """
+    documents = []
+    for path in collect_corpus(paths):
+        try:
+            documents.append(read_text(path))
+        except OSError:
+            continue
+    if not documents:
+        print('No Markdown files to benchmark on')
+        return None
+
+    size = sum(map(len, documents))
+    print('%d documents, %.1f MB' % (len(documents), size / (1024 * 1024)))
+    results = benchmark(documents)
+    for result in results:
+        print('%-16s %8.3f s %8.2f MB/s  %d/%d as python-markdown' % (
+            result.engine,
+            result.seconds,
+            result.throughput(size),
+            result.matching,
+            result.documents
+        ))
+
+    fastest = results[0].engine
+    Properties.Settings().render_engine = fastest
+    print('render_engine set to %s' % fastest)
+    return fastest
@@ -0,0 +1,362 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Reading and writing documents off the GUI thread.
+
+import codecs
+import locale
+import os
+import stat
+import tempfile
+import typing as t
+
+from PyQt5.QtCore import (
+    QCoreApplication,
+    QObject,
+    QThread,
+    pyqtSignal as Signal
+)
+from SerumWriter.Lib.Document import ContentHash
+
+#: Bytes read and decoded at a time
+READ_CHUNK_SIZE = 1024 * 1024
+#: Bytes looked at to guess the encoding
+SNIFF_SIZE = 64 * 1024
+
+#: New files get the permissions `open` would give them
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+#: Longest first, the UTF-32 LE mark starts with the UTF-16 LE one
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+
+class FileFormat(t.NamedTuple):
+    """How a document is stored on disk, kept so that saving round-trips it."""
+    encoding: str = 'utf-8'
+    #: Written in place of every '\n'
+    newline: str = os.linesep
+    bom: bool = False
+
+
+def sniff_encoding(head: bytes) -> t.Tuple[str, int]:
+    """
+    Guesses the encoding of a file from its first bytes. Returns the
+    encoding and the length of the byte order mark to skip.
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    #: Text without a BOM but with NULs every other byte is UTF-16
+    sample = head[:4096]
+    if len(sample) >= 2 and sample.count(0) * 4 >= len(sample):
+        even, odd = sample[0::2].count(0), sample[1::2].count(0)
+        if odd > even * 4:
+            return 'utf-16-le', 0
+        if even > odd * 4:
+            return 'utf-16-be', 0
+
+    candidates = ('utf-8', locale.getpreferredencoding(False), 'cp1252')
+    for encoding in candidates:
+        try:
+            #: The head may end in the middle of a character
+            codecs.getincrementaldecoder(encoding)().decode(head, final=False)
+        except (UnicodeDecodeError, LookupError):
+            continue
+        return codecs.lookup(encoding).name, 0
+
+    #: Every byte is valid latin-1, it round-trips whatever this is
+    return 'latin-1', 0
+
+
+def detect_newline(text: str) -> t.Optional[str]:
+    """The style of the first line break in `text`, None if there is none."""
+    cr, lf = text.find('\r'), text.find('\n')
+    if cr == -1 and lf == -1:
+        return None
+    if cr == -1:
+        return '\n'
+    if lf == cr + 1:
+        return '\r\n'
+    if lf == -1 or cr < lf:
+        return '\r'
+    return '\n'
+
+
+def open_for_writing(path: str, file_format: FileFormat) -> t.TextIO:
+    """Opens `path` for writing text in `file_format`, BOM included."""
+    f = open(path, 'w', encoding=file_format.encoding, newline=file_format.newline)
+    if file_format.bom:
+        f.write('\ufeff')
+    return f
+
+
+class TextDecoder:
+    """
+    Incremental decoder that also turns every line break into '\\n' and
+    remembers the style of the first one in `newline`.
+    """
+
+    def __init__(self, encoding: str):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        #: A '\r' ending a chunk may be the first half of '\r\n'
+        self._carry = ''
+        self.newline: t.Optional[str] = None
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        text = self._carry + self._decoder.decode(data, final)
+        self._carry = ''
+        if not final and text.endswith('\r'):
+            text, self._carry = text[:-1], '\r'
+
+        if self.newline is None:
+            self.newline = detect_newline(text)
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+
+def read_text(path: str, limit: int = -1) -> str:
+    """
+    Reads and decodes a file in one go, or only its first `limit` bytes,
+    the encoding sniffed as `FileReader` does.
+    """
+    with open(path, 'rb') as f:
+        data = f.read(limit)
+    encoding, skip = sniff_encoding(data[:SNIFF_SIZE])
+    return TextDecoder(encoding).decode(data[skip:], final=True)
+
+
+class FileReader(QThread):
+    """
+    Reads and decodes a text file on a worker thread.
+
+    The encoding is sniffed from the first chunk (see `sniff_encoding`),
+    the text is then decoded incrementally and streamed out with
+    `chunkRead`, with every line break turned into '\\n'. `loaded` carries
+    the detected `FileFormat` and the `content_hash` of the text.
+    """
+    chunkRead = Signal(str)
+    progress = Signal(int)
+    loaded = Signal(object, bytes)
+    failed = Signal(str)
+
+    def __init__(self, path: str, parent=None, chunk_size: int = READ_CHUNK_SIZE):
+        super().__init__(parent)
+        self.path = path
+        self.chunk_size = chunk_size
+        #: Qt aborts when a running thread is destroyed
+        QCoreApplication.instance().aboutToQuit.connect(self.stop)
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+    def discard(self):
+        """Stops reading, unheard, and deletes the reader once it is done."""
+        self.blockSignals(True)
+        self.stop()
+        self.deleteLater()
+
+    def run(self):
+        try:
+            self.__read()
+        except OSError as e:
+            self.failed.emit(e.strerror or str(e))
+
+    def __read(self):
+        size = os.path.getsize(self.path)
+        #: Hashed as it streams by, the text is only kept by the receiver
+        digest = ContentHash()
+
+        with open(self.path, 'rb') as f:
+            block = f.read(self.chunk_size)
+            encoding, skip = sniff_encoding(block)
+            decoder = TextDecoder(encoding)
+            block = block[skip:]
+            read = skip
+
+            while True:
+                if self.isInterruptionRequested():
+                    return
+
+                read += len(block)
+                text = decoder.decode(block, final=not block)
+                if text:
+                    digest.update(text)
+                    self.chunkRead.emit(text)
+                self.progress.emit(int(read * 100 / max(size, 1)))
+
+                if not block:
+                    break
+                block = f.read(self.chunk_size)
+
+        self.loaded.emit(
+            FileFormat(encoding, decoder.newline or FileFormat().newline, skip > 0),
+            digest.digest()
+        )
+
+
+class FileWriter(QThread):
+    """
+    Writes a document on a worker thread. The text goes to a temporary
+    file next to the target, which then replaces the target in one
+    rename, so a crash never leaves a half written document behind.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        text: t.Union[str, t.Iterable[str]],
+        file_format: FileFormat,
+        fsync: bool = True,
+        revision: int = 0,
+        parent=None
+    ):
+        super().__init__(parent)
+        self.path = path
+        self.text = text
+        self.file_format = file_format
+        self.fsync = fsync
+        self.revision = revision
+        self.digest: bytes = None
+        self.error: str = None
+
+    def run(self):
+        try:
+            self.__write()
+        except OSError as e:
+            self.error = e.strerror or str(e)
+        finally:
+            self.text = None
+
+    def __write(self):
+        #: Write through symlinks instead of replacing them
+        path = os.path.realpath(self.path)
+        directory, name = os.path.split(path)
+        fd, temp = tempfile.mkstemp(prefix='.%s.' % name, suffix='.tmp', dir=directory)
+        os.close(fd)
+
+        try:
+            chunks = (self.text,) if isinstance(self.text, str) else self.text
+            #: Hashed as it is written, a streamed text is never held whole
+            digest = ContentHash()
+            with open_for_writing(temp, self.file_format) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    digest.update(chunk)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+            self.digest = digest.digest()
+
+            mode = os.stat(path).st_mode if os.path.exists(path) else 0o666 & ~UMASK
+            os.chmod(temp, stat.S_IMODE(mode))
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+        if self.fsync and hasattr(os, 'O_DIRECTORY'):
+            #: Make the rename itself durable
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+class SaveService(QObject):
+    """
+    Runs `FileWriter`s one at a time. Saving a file that is already queued
+    replaces the queued snapshot, so repeated saves while a write is in
+    flight coalesce into at most one more write.
+
+    `revision` is handed back with `saved`, it tells the caller which
+    state of the document ended up on disk.
+    """
+    saving = Signal(str)
+    saved = Signal(str, bytes, int)
+    failed = Signal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._writer: FileWriter = None
+        #: path -> (text, file_format, fsync, revision), oldest first
+        self._pending: t.Dict[str, tuple] = {}
+        QCoreApplication.instance().aboutToQuit.connect(self.flush)
+
+    def isBusy(self) -> bool:
+        return self._writer is not None
+
+    def save(
+        self,
+        path: str,
+        text: t.Union[str, t.Iterable[str]],
+        file_format: FileFormat,
+        fsync: bool = True,
+        revision: int = 0
+    ):
+        """Queues a write of `text`, a snapshot of the document, to `path`."""
+        self._pending.pop(path, None)
+        self._pending[path] = (text, file_format, fsync, revision)
+        if self._writer is None:
+            self.__start_next()
+
+    def flush(self):
+        """Blocks until every queued write is done."""
+        while self._writer is not None:
+            writer = self._writer
+            writer.wait()
+            self.__finished(writer)
+
+    def __start_next(self):
+        if not self._pending:
+            return
+
+        path = next(iter(self._pending))
+        text, file_format, fsync, revision = self._pending.pop(path)
+        writer = self._writer = FileWriter(path, text, file_format, fsync, revision, self)
+        writer.finished.connect(lambda: self.__finished(writer))
+        self.saving.emit(path)
+        writer.start()
+
+    def __finished(self, writer: FileWriter):
+        if writer is not self._writer:
+            return
+
+        self._writer = None
+        #: A flush finishes it before its queued `finished` arrives
+        writer.finished.disconnect()
+        writer.deleteLater()
+        if writer.error is None:
+            self.saved.emit(writer.path, writer.digest, writer.revision)
+        else:
+            self.failed.emit(writer.path, writer.error)
+        self.__start_next()
@@ -21,18 +21,26 @@
 
 from enum import IntFlag, auto
 import re
+import time
 from PyQt5.QtCore import (
 	Qt,
-	QTemporaryFile
+	QTemporaryFile,
+	QTimer
 )
 from PyQt5.QtGui import (
 	QFont, 
 	QSyntaxHighlighter, 
+	QTextBlock,
 	QTextCharFormat, 
 	QColor
 )
 from typing import Callable
 from enchant import DictWithPWL
+from SerumWriter.Lib.State import (
+	STATE_BLOCK_LIMIT,
+	EditorState,
+	block_key
+)
 
 class SpellCheckWrapper:
     def __init__(
@@ -209,6 +217,16 @@ class SyntaxHighlighter(QSyntaxHighlighter):
 		self.docType = docType
 		self.speller = spell_checker
 
+		#: Deferred highlighting, see `suspend` and `rehighlightProgressive`
+		self._suspended = False
+		self._pending: QTextBlock = None
+		self._remaining = 0
+		self._progressive = QTimer(self)
+		self._progressive.setInterval(0)
+		self._progressive.timeout.connect(self.__highlight_batch)
+		#: Formats saved with the document, see `restore`
+		self._restored: EditorState = None
+
 		darker = QColor(self.palette.COLOR_TEXT_2).darker(200).name()
 		self.patterns = (
 			# regex,         color,                                markups
@@ -255,8 +273,134 @@ class SyntaxHighlighter(QSyntaxHighlighter):
 				)
 
 
+	def suspend(self):
+		"""Leaves new and changed blocks unformatted until `resume`."""
+		self._suspended = True
+		self._progressive.stop()
+
+	def isSuspended(self) -> bool:
+		return self._suspended
+
+	def resume(self, start: QTextBlock = None):
+		self._suspended = False
+		self.rehighlightProgressive(start)
+
+	def isHighlighting(self) -> bool:
+		return self._suspended or self._progressive.isActive()
+
+	def signature(self) -> str:
+		"""What the formats depend on besides the text and the document type."""
+		words = len(self.speller.getNewWords()) if self.speller else -1
+		return 'spelling=%d;dictionaries=%d' % (words, len(self.dictionaries or ()))
+
+	def restore(self, state: EditorState = None):
+		"""
+		Formats the blocks whose text hasn't changed since `state` was
+		stored from there instead of highlighting them again, until the
+		next progressive pass is done. A state stored for another document
+		type or dictionary is ignored.
+		"""
+		if state is not None and (state.docType != (self.docType or '') \
+			or state.signature != self.signature()):
+
+			state = None
+		self._restored = state
+
+	def store(self, state: EditorState):
+		"""Keeps the formats of every block in `state`, see `restore`."""
+		state.docType = self.docType or ''
+		state.signature = self.signature()
+		state.formats, state.blocks = [], {}
+
+		document = self.document()
+		if self.isHighlighting():
+			#: Blocks not highlighted yet look like plain ones, only keep
+			#: what was restored
+			restored = self._restored
+			if restored is not None and restored.docType == state.docType:
+				state.formats, state.blocks = restored.formats, restored.blocks
+			return
+
+		if document is None or document.blockCount() > STATE_BLOCK_LIMIT:
+			return
+
+		block = document.firstBlock()
+		while block.isValid():
+			ranges = []
+			for formatRange in block.layout().formats():
+				ranges += (
+					formatRange.start,
+					formatRange.length,
+					self.__format_index(state.formats, formatRange.format)
+				)
+			state.blocks[block_key(block.text())] = tuple(ranges)
+			block = block.next()
+
+	@staticmethod
+	def __format_index(formats: list, charFormat: QTextCharFormat) -> int:
+		#: A handful of distinct formats, compared from the newest
+		for index in range(len(formats) - 1, -1, -1):
+			if formats[index] == charFormat:
+				return index
+
+		formats.append(charFormat)
+		return len(formats) - 1
+
+	def rehighlightProgressive(self, start: QTextBlock = None):
+		"""
+		Rehighlights the document in small time slices across event loop
+		turns, starting at `start` (usually the first visible block) and
+		wrapping around to the beginning of the document.
+		"""
+		document = self.document()
+		if document is None:
+			return
+
+		if start is None or not start.isValid():
+			start = document.firstBlock()
+
+		self._pending = start
+		self._remaining = document.blockCount()
+		self._progressive.start()
+
+	def __highlight_batch(self, budget: float = 0.008):
+		deadline = time.monotonic() + budget
+		block = self._pending
+		document = self.document()
+		#: Formatting isn't an edit, keep the document unmodified and
+		#: don't tell its listeners, of that nor of the modified flag
+		modified = document.isModified()
+		blocked = document.blockSignals(True)
+
+		while self._remaining > 0 and time.monotonic() < deadline:
+			if not block.isValid():
+				#: Wrap around for the blocks above the starting point
+				block = document.firstBlock()
+			self.rehighlightBlock(block)
+			block = block.next()
+			self._remaining -= 1
+
+		document.setModified(modified)
+		document.blockSignals(blocked)
+		self._pending = block
+		if self._remaining <= 0:
+			self._progressive.stop()
+			#: Every block has its own formats now
+			self._restored = None
+
 	def highlightBlock(self, text):
 		# Syntax highlighter
+		if self._suspended:
+			return
+
+		restored = self._restored
+		if restored is not None and restored.docType == (self.docType or ''):
+			ranges = restored.blocks.get(block_key(text))
+			if ranges is not None:
+				formats = restored.formats
+				for i in range(0, len(ranges), 3):
+					self.setFormat(ranges[i], ranges[i + 1], formats[ranges[i + 2]])
+				return
 	
 		codeSpans = set()
 
@@ -0,0 +1,344 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Append-only journal of document edits, replayed after a crash.
+
+import hashlib
+import os
+import pathlib
+import struct
+import tempfile
+import typing as t
+import zlib
+from enum import IntEnum
+
+from PyQt5.QtCore import (
+    QCoreApplication,
+    QObject,
+    QTimer
+)
+
+JOURNAL_DIR = pathlib.Path().home() / '.serum' / 'Journal'
+
+#: Buffered edits are written out at most this often (ms)
+JOURNAL_FLUSH_INTERVAL = 2000
+
+#: Edits appended before the journal is compacted, at least
+JOURNAL_COMPACT_SIZE = 1024 * 1024
+
+MAGIC = b'SRMJ'
+VERSION = 1
+HEADER = struct.Struct('<4sBB')
+#: kind, position, removed, payload length
+RECORD = struct.Struct('<BIII')
+CRC = struct.Struct('<I')
+
+
+class Record(IntEnum):
+    #: The document the journal belongs to, utf-8
+    PATH = 0
+    #: Edits apply to the file whose `content_hash` is the payload
+    BASE = 1
+    #: Edits apply to the text in the payload
+    SNAPSHOT = 2
+    #: Replaces `removed` units at `position` with the payload
+    DELTA = 3
+
+
+def create_journal_folder():
+    if not JOURNAL_DIR.exists():
+        os.makedirs(JOURNAL_DIR.absolute())
+    elif JOURNAL_DIR.is_file():
+        os.remove(JOURNAL_DIR.absolute())
+        os.mkdir(JOURNAL_DIR.absolute())
+
+    return JOURNAL_DIR.absolute()
+
+
+def journal_file(path: t.Optional[str], key: str = None) -> pathlib.Path:
+    """Where the journal of the document at `path` lives, untitled ones go by `key`."""
+    if not path:
+        return JOURNAL_DIR / ('untitled-%s.journal' % key if key else 'untitled.journal')
+
+    key = hashlib.sha1(os.path.realpath(path).encode('utf-8')).hexdigest()[:16]
+    return JOURNAL_DIR / ('%s.journal' % key)
+
+
+def encode_record(kind: Record, payload: bytes = b'', position: int = 0, removed: int = 0) -> bytes:
+    head = RECORD.pack(kind, position, removed, len(payload))
+    return head + payload + CRC.pack(zlib.crc32(payload, zlib.crc32(head)))
+
+
+def read_records(data: bytes) -> t.Iterator[t.Tuple[Record, int, int, bytes]]:
+    """
+    Yields the records after the header. A record cut short or failing its
+    checksum ends the journal, it is what a crash mid-write leaves behind.
+    """
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        head = data[offset:offset + RECORD.size]
+        kind, position, removed, length = RECORD.unpack(head)
+        start = offset + RECORD.size
+        end = start + length
+        if end + CRC.size > len(data):
+            return
+
+        payload = data[start:end]
+        crc, = CRC.unpack_from(data, end)
+        if crc != zlib.crc32(payload, zlib.crc32(head)):
+            return
+
+        yield Record(kind), position, removed, payload
+        offset = end + CRC.size
+
+
+class Journal(QObject):
+    """
+    Records the edits made to a document so unsaved work survives a crash.
+
+    Edits are appended as small binary `DELTA` records on top of a `BASE`
+    (the saved file, referenced by its hash) or a `SNAPSHOT` of the text,
+    so the cost of keeping the journal follows what was typed rather than
+    the size of the document. Once the deltas outgrow the document the
+    journal is compacted into a fresh snapshot.
+
+    Positions are counted in code units of `encoding`, 'utf-16-le' for
+    `QTextDocument` positions and 'utf-32-le' for code points.
+    """
+
+    def __init__(
+        self,
+        text: t.Callable[[], t.Union[str, t.Iterable[str]]],
+        encoding: str = 'utf-16-le',
+        fsync: bool = True,
+        parent=None
+    ):
+        super().__init__(parent)
+        #: Returns the current text, used when compacting
+        self._text = text
+        self._encoding = encoding
+        self._width = len('a'.encode(encoding))
+        self._fsync = fsync
+        self._path: t.Optional[str] = None
+        #: Tells apart the journals of untitled documents
+        self._key: t.Optional[str] = None
+        self._file: t.Optional[pathlib.Path] = None
+        self._stream = None
+        self._buffer = bytearray()
+        #: Delta bytes since the last base or snapshot
+        self._appended = 0
+        self._limit = JOURNAL_COMPACT_SIZE
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(JOURNAL_FLUSH_INTERVAL)
+        self._timer.timeout.connect(self.flush)
+        QCoreApplication.instance().aboutToQuit.connect(self.flush)
+
+    def isActive(self) -> bool:
+        return self._file is not None
+
+    def fileName(self) -> t.Optional[pathlib.Path]:
+        return self._file
+
+    def key(self) -> t.Optional[str]:
+        return self._key
+
+    def setKey(self, key: t.Optional[str]):
+        """Names the journal of an untitled document, each untitled tab keeps its own."""
+        self._key = key
+
+    def begin(self, path: t.Optional[str], digest: bytes = None, size: int = 0):
+        """
+        Starts journaling the document at `path`. With `digest` the edits
+        apply to the saved file and nothing else is written, `size` is its
+        length, otherwise the current text is written as a snapshot.
+        """
+        self.discard()
+        self._path = path
+        if digest is not None:
+            self.__rewrite(encode_record(Record.BASE, digest))
+            self._limit = max(JOURNAL_COMPACT_SIZE, size * self._width)
+        else:
+            self.compact()
+
+    def resume(self, path: t.Optional[str]) -> bool:
+        """Keeps appending to an existing journal of `path`, e.g. after recovering it."""
+        self.discard()
+        file = journal_file(path, self._key)
+        try:
+            with open(file, 'rb') as f:
+                magic, _, width = HEADER.unpack(f.read(HEADER.size))
+            size = file.stat().st_size
+        except (OSError, struct.error):
+            return False
+
+        self._path = path
+        if magic != MAGIC or width != self._width:
+            #: Written by the other kind of editor, start over in our units
+            self.compact()
+            return True
+
+        self._file = file
+        self._stream = open(file, 'ab')
+        self._limit = max(JOURNAL_COMPACT_SIZE, size)
+        return True
+
+    def record(self, position: int, removed: int, text: str):
+        """Appends an edit, written out with the next flush."""
+        if self._file is None:
+            return
+
+        payload = text.encode(self._encoding, 'surrogatepass')
+        self._buffer += encode_record(Record.DELTA, payload, position, removed)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        self._timer.stop()
+        if self._stream is None or not self._buffer:
+            return
+
+        self._appended += len(self._buffer)
+        if self._appended > self._limit:
+            self.compact()
+            return
+
+        try:
+            self._stream.write(self._buffer)
+            self._stream.flush()
+            if self._fsync:
+                os.fsync(self._stream.fileno())
+        except OSError as e:
+            print(e)
+        self._buffer.clear()
+
+    def compact(self):
+        """Replaces the journal with a snapshot of the current text."""
+        text = self._text()
+        if isinstance(text, str):
+            text = (text,)
+
+        payload = b''.join(chunk.encode(self._encoding, 'surrogatepass') for chunk in text)
+        self.__rewrite(encode_record(Record.SNAPSHOT, payload))
+        self._limit = max(JOURNAL_COMPACT_SIZE, len(payload))
+
+    def close(self):
+        """Stops journaling but keeps the journal, its edits are picked up again on the next open."""
+        self.flush()
+        self.__close()
+        self._file = None
+
+    @staticmethod
+    def remove(path: t.Optional[str], key: str = None):
+        """Deletes the journal of `path`, or of the untitled document `key`, if any."""
+        try:
+            os.remove(journal_file(path, key))
+        except OSError:
+            pass
+
+    def discard(self):
+        """Ends the journal, the document was saved or its edits dropped."""
+        self.__close()
+        if self._file is not None:
+            try:
+                os.remove(self._file)
+            except OSError:
+                pass
+        self._file = None
+
+    def __close(self):
+        self._timer.stop()
+        self._buffer.clear()
+        self._appended = 0
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def __rewrite(self, base: bytes):
+        self.__close()
+        create_journal_folder()
+        file = journal_file(self._path, self._key)
+        path = (self._path or '').encode('utf-8')
+        fd, temp = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=JOURNAL_DIR)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self._width))
+                f.write(encode_record(Record.PATH, path))
+                f.write(base)
+                f.flush()
+                if self._fsync:
+                    os.fsync(f.fileno())
+            os.replace(temp, file)
+        except OSError as e:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            print(e)
+            self._file = None
+            return
+
+        self._file = file
+        self._stream = open(file, 'ab')
+
+    @staticmethod
+    def replay(
+        path: t.Optional[str],
+        digest: bytes = None,
+        text: t.Callable[[], str] = None,
+        key: str = None
+    ) -> t.Optional[str]:
+        """
+        Rebuilds the text from the journal of `path`. `digest` and `text`
+        describe the file on disk, a journal based on another version of it
+        is stale and gives None, as does a missing or unreadable one.
+        """
+        try:
+            with open(journal_file(path, key), 'rb') as f:
+                data = f.read()
+            magic, version, width = HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+
+        if magic != MAGIC or version != VERSION or width not in (2, 4):
+            return None
+
+        encoding = 'utf-16-le' if width == 2 else 'utf-32-le'
+        buffer = None
+        for kind, position, removed, payload in read_records(data):
+            if kind == Record.BASE:
+                if digest is None or payload != digest or text is None:
+                    return None
+                buffer = bytearray(text().encode(encoding, 'surrogatepass'))
+
+            elif kind == Record.SNAPSHOT:
+                buffer = bytearray(payload)
+
+            elif kind == Record.DELTA and buffer is not None:
+                #: Whole-document changes report one unit past the end
+                start = min(position * width, len(buffer))
+                end = min(start + removed * width, len(buffer))
+                buffer[start:end] = payload
+
+        if buffer is None:
+            return None
+
+        return buffer.decode(encoding, 'replace')
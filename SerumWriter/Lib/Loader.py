@@ -0,0 +1,184 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Progressive document loading
+
+import typing as t
+from collections import deque
+
+from PyQt5.QtCore import (
+    QObject,
+    QPoint,
+    QTimer,
+    pyqtSignal as Signal
+)
+from PyQt5.QtGui import QTextCursor
+
+if t.TYPE_CHECKING:
+    from SerumWriter.Components.Editor import EditorMixin
+
+#: Characters inserted before control goes back to the event loop
+FIRST_CHUNK_SIZE = 64 * 1024
+CHUNK_SIZE = 256 * 1024
+
+
+class ChunkedLoader(QObject):
+    """
+    Inserts a document into an editor a chunk per event loop turn.
+
+    The text is either given whole or streamed in with `append`, `close`
+    then marks its end, `start` may come before any of it. A document no
+    longer than the first chunk is inserted and highlighted in one go once
+    it is complete. Otherwise the first chunk is inserted as soon as it is
+    there so the first screen shows up immediately, and the highlighter
+    stays suspended while the rest streams in and highlights the document
+    in the background afterwards.
+    """
+    progress = Signal(int)
+    finished = Signal()
+
+    def __init__(
+        self,
+        editor: 'EditorMixin',
+        text: str = None,
+        chunk_size: int = CHUNK_SIZE
+    ):
+        super().__init__(editor)
+        self._editor = editor
+        self._pending: t.Deque[str] = deque()
+        #: Offset into the first pending string
+        self._offset = 0
+        self._received = 0
+        self._inserted = 0
+        self._chunk_size = chunk_size
+        self._running = False
+        #: Inserting chunk by chunk with the highlighter suspended
+        self._streaming = False
+        self._closed = False
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self.__next_chunk)
+
+        if text is not None:
+            self.append(text)
+            self.close()
+
+    def isRunning(self) -> bool:
+        return self._running
+
+    def start(self):
+        editor = self._editor
+        editor.clear()
+        editor.setReadOnly(True)
+
+        self._running = True
+        self.__stream()
+
+    def append(self, text: str):
+        if text:
+            self._pending.append(text)
+            self._received += len(text)
+
+        if self._running:
+            self.__stream()
+
+    def close(self):
+        """No more text will be appended."""
+        self._closed = True
+        if self._running:
+            self.__stream()
+
+    def cancel(self):
+        if not self._running:
+            return
+
+        self._timer.stop()
+        self._running = False
+        self._streaming = False
+        self._pending.clear()
+        self.__restore()
+
+    def __stream(self):
+        if not self._streaming:
+            if self._closed and self._received <= FIRST_CHUNK_SIZE:
+                #: Small documents are inserted and highlighted in one go
+                self.__insert(FIRST_CHUNK_SIZE)
+                self.__finish()
+                return
+
+            if self._received < FIRST_CHUNK_SIZE:
+                #: Not a screen yet, nor known to be all there is
+                return
+
+            self._streaming = True
+            self._editor.highlighter.suspend()
+            self.__insert(FIRST_CHUNK_SIZE)
+
+        self.__schedule()
+
+    def __schedule(self):
+        if self._pending or self._closed:
+            self._timer.start()
+
+    def __insert(self, size: int):
+        parts = []
+        while self._pending and size > 0:
+            text = self._pending[0]
+            part = text[self._offset:self._offset + size]
+            parts.append(part)
+            size -= len(part)
+            self._offset += len(part)
+            if self._offset >= len(text):
+                self._pending.popleft()
+                self._offset = 0
+
+        if not parts:
+            return
+
+        cursor = QTextCursor(self._editor.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(''.join(parts))
+        self._inserted += sum(map(len, parts))
+        if self._closed:
+            self.progress.emit(int(self._inserted * 100 / max(self._received, 1)))
+
+    def __next_chunk(self):
+        self.__insert(self._chunk_size)
+        if not self._pending:
+            self._timer.stop()
+            if self._closed:
+                self.__finish()
+
+    def __restore(self):
+        editor = self._editor
+        editor.setReadOnly(False)
+        if editor.highlighter.isSuspended():
+            editor.highlighter.resume(
+                editor.cursorForPosition(QPoint(0, 0)).block()
+            )
+
+    def __finish(self):
+        self._running = False
+        self._streaming = False
+        self.__restore()
+        self._pending.clear()
+        self.progress.emit(100)
+        self.finished.emit()
@@ -0,0 +1,176 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Read-only line source over a memory-mapped file.
+
+import mmap
+import re
+import typing as t
+from array import array
+from bisect import bisect_right
+
+from SerumWriter.Lib.Files import (
+    TextDecoder,
+    sniff_encoding
+)
+
+#: Bytes indexed per `index` call
+INDEX_CHUNK_SIZE = 8 * 1024 * 1024
+#: Bytes decoded per chunk when streaming the text
+STREAM_CHUNK_SIZE = 1024 * 1024
+#: Bytes looked at to guess the encoding
+SNIFF_SIZE = 64 * 1024
+
+
+class MappedText:
+    """
+    Lines of a file read straight from a memory map.
+
+    Only an array with the byte offset of every line start is kept in
+    memory, lines are decoded when they are asked for. The index is built
+    a chunk at a time (see `index`), lines past the indexed part are not
+    visible yet. Positions (`lineStart`, `lineAt`, `find`, `len`) are in
+    bytes, `offset` and `position` convert them from and to the character
+    columns of a line.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        size = self.__size()
+        #: Empty files can't be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._size = size
+
+        self.encoding, skip = sniff_encoding(self._map[:SNIFF_SIZE])
+        #: UTF-16 and UTF-32 line breaks are several bytes wide and only
+        #: count when they are aligned to a character
+        self._newline = '\n'.encode(self.encoding)
+        self._width = len(self._newline)
+        self._reNewline = re.compile(re.escape(self._newline))
+        self._offsets = array('Q', [skip])
+        self._indexed = skip
+
+    def __len__(self) -> int:
+        return self._size
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def isIndexed(self) -> bool:
+        return self._indexed >= self._size
+
+    def indexed(self) -> int:
+        """Bytes indexed so far, the lines of positions before it are known."""
+        return self._indexed
+
+    def progress(self) -> int:
+        return 100 if not self._size else int(self._indexed * 100 / self._size)
+
+    def index(self, size: int = INDEX_CHUNK_SIZE) -> bool:
+        """Indexes the next `size` bytes, returns whether the whole file is indexed."""
+        start = self._indexed
+        end = min(start + size - size % self._width, self._size)
+        self._offsets.extend(
+            match.end()
+            for match in self._reNewline.finditer(self._map, start, end)
+            if self.__aligned(match.start())
+        )
+        self._indexed = end
+        return self.isIndexed()
+
+    def lineCount(self) -> int:
+        return len(self._offsets)
+
+    def lineStart(self, line: int) -> int:
+        if line >= len(self._offsets):
+            return self._size
+        return self._offsets[max(line, 0)]
+
+    def lineAt(self, position: int) -> int:
+        return bisect_right(self._offsets, position) - 1
+
+    def offset(self, line: int, column: int) -> int:
+        """Byte position of the character at `column` of `line`."""
+        if line >= self.lineCount():
+            return self._size
+        return self._offsets[max(line, 0)] + len(self.line(line)[:column].encode(self.encoding))
+
+    def position(self, offset: int) -> t.Tuple[int, int]:
+        """(line, column) of the byte at `offset`, within the indexed part."""
+        line = self.lineAt(offset)
+        prefix = self._map[self._offsets[line]:offset]
+        return line, len(prefix.decode(self.encoding, errors='replace').rstrip('\r'))
+
+    def line(self, line: int) -> str:
+        return self.lines(line, 1)[0]
+
+    def lines(self, first: int, count: int) -> t.List[str]:
+        last = min(first + count, self.lineCount())
+        if first >= last:
+            return ['']
+
+        start = self._offsets[first]
+        if last < self.lineCount():
+            end = self._offsets[last] - self._width
+        else:
+            #: The last indexed line ends wherever its newline is
+            end = self.__find(self._newline, start)
+            if end == -1:
+                end = self._size
+
+        text = self._map[start:end].decode(self.encoding, errors='replace')
+        return [line.rstrip('\r') for line in text.split('\n')]
+
+    def find(self, needle: str, start: int = 0) -> int:
+        """
+        Byte position of the next `needle` from `start`, or -1. The whole
+        file is searched, a match past `indexed` only gets a `position`
+        once the index reaches it.
+        """
+        if not needle:
+            return -1
+        return self.__find(needle.encode(self.encoding), start)
+
+    def text(self) -> str:
+        return ''.join(self.chunks())
+
+    def chunks(self, size: int = STREAM_CHUNK_SIZE) -> t.Iterator[str]:
+        """Streams the decoded text, line breaks turned into '\\n'."""
+        decoder = TextDecoder(self.encoding)
+        for start in range(self._offsets[0], self._size, size):
+            yield decoder.decode(self._map[start:start + size])
+        yield decoder.decode(b'', final=True)
+
+    def __aligned(self, position: int) -> bool:
+        return (position - self._offsets[0]) % self._width == 0
+
+    def __find(self, data: bytes, start: int) -> int:
+        found = self._map.find(data, start)
+        while found != -1 and not self.__aligned(found):
+            found = self._map.find(data, found + 1)
+        return found
+
+    def __size(self) -> int:
+        self._file.seek(0, 2)
+        size = self._file.tell()
+        self._file.seek(0)
+        return size
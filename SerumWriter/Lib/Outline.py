@@ -0,0 +1,174 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Headings of a document kept up to date from `DocumentDelta`s, see `DocumentOutline`.
+
+import bisect
+import typing as t
+
+from PyQt5.QtCore import (
+    QAbstractListModel,
+    QModelIndex,
+    Qt
+)
+from PyQt5.QtGui import (
+    QFont,
+    QTextDocument
+)
+from SerumWriter.Lib.Document import DocumentDelta
+from SerumWriter.Lib.Highlighter import reMkdHeaders
+
+#: Indentation of a heading per level below the first
+INDENT = '    '
+
+
+class Heading(t.NamedTuple):
+    level: int
+    text: str
+    #: Block number of the heading line
+    block: int
+
+
+class DocumentOutline(QAbstractListModel):
+    """
+    The Markdown headings of a document, one row each, in order.
+
+    Headings are kept sorted by block number, an edit only rescans the
+    blocks it touched and bisects to the rows they held. Rows of the
+    headings that changed are replaced, the block numbers of the ones
+    after an edit that added or removed lines are shifted. The heading
+    containing a block is found by bisecting too, see `indexAt`.
+    """
+    #: Level of the heading of a row
+    LevelRole = Qt.ItemDataRole.UserRole
+    #: Block number of the heading of a row
+    BlockRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, document: QTextDocument, parent=None):
+        super().__init__(parent)
+        self._document = document
+        self._blocks: t.List[int] = []
+        self._levels: t.List[int] = []
+        self._texts: t.List[str] = []
+        #: Blocks the document had after the last update
+        self._count = 0
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._blocks)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        row = index.row()
+        if not index.isValid() or row >= len(self._blocks):
+            return None
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return INDENT * (self._levels[row] - 1) + self._texts[row]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self._texts[row]
+        if role == Qt.ItemDataRole.FontRole and self._levels[row] == 1:
+            font = QFont()
+            font.setBold(True)
+            return font
+        if role == self.LevelRole:
+            return self._levels[row]
+        if role == self.BlockRole:
+            return self._blocks[row]
+        return None
+
+    def heading(self, row: int) -> Heading:
+        return Heading(self._levels[row], self._texts[row], self._blocks[row])
+
+    def headings(self) -> t.List[Heading]:
+        return [Heading(*values) for values in zip(self._levels, self._texts, self._blocks)]
+
+    def indexAt(self, block_number: int) -> int:
+        """Row of the heading whose section holds `block_number`, -1 before the first one."""
+        return bisect.bisect_right(self._blocks, block_number) - 1
+
+    def reset(self):
+        self.beginResetModel()
+        self._blocks, self._levels, self._texts = self.__scan(0, self._document.blockCount() - 1)
+        self._count = self._document.blockCount()
+        self.endResetModel()
+
+    def update(self, delta: DocumentDelta):
+        first, last = delta.first_block, delta.last_block
+        #: Blocks that existed before the edit in place of first..last
+        old_last = last + self._count - delta.block_count
+
+        if old_last < first - 1 or old_last >= self._count \
+            or delta.block_count != self._document.blockCount():
+            return self.reset()
+        self._count = delta.block_count
+
+        start = bisect.bisect_left(self._blocks, first)
+        end = bisect.bisect_right(self._blocks, old_last)
+        blocks, levels, texts = self.__scan(first, last)
+
+        #: Headings after the edit moved with the lines added or removed
+        shift = last - old_last
+        if shift:
+            self._blocks[end:] = [block + shift for block in self._blocks[end:]]
+
+        if end - start == len(blocks):
+            self._blocks[start:end] = blocks
+            changed = [
+                row for row, level, text in zip(range(start, end), levels, texts)
+                if self._levels[row] != level or self._texts[row] != text
+            ]
+            self._levels[start:end] = levels
+            self._texts[start:end] = texts
+            if changed:
+                self.dataChanged.emit(self.index(changed[0]), self.index(changed[-1]))
+            return
+
+        if end > start:
+            self.beginRemoveRows(QModelIndex(), start, end - 1)
+            del self._blocks[start:end]
+            del self._levels[start:end]
+            del self._texts[start:end]
+            self.endRemoveRows()
+        if blocks:
+            self.beginInsertRows(QModelIndex(), start, start + len(blocks) - 1)
+            self._blocks[start:start] = blocks
+            self._levels[start:start] = levels
+            self._texts[start:start] = texts
+            self.endInsertRows()
+
+    def __scan(self, first: int, last: int) -> t.Tuple[t.List[int], t.List[int], t.List[str]]:
+        blocks, levels, texts = [], [], []
+        block = self._document.findBlockByNumber(first)
+        number = first
+        while block.isValid() and number <= last:
+            text = block.text()
+            if '#' in text:
+                match = reMkdHeaders.match(text)
+                if match:
+                    blocks.append(number)
+                    levels.append(len(match.group('level')))
+                    #: The closing sequence of hashes is optional markup
+                    texts.append(match.group('text').strip().rstrip('#').rstrip() or match.group('text').strip())
+            block = block.next()
+            number += 1
+        return blocks, levels, texts
@@ -0,0 +1,315 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Piece table text storage for documents too big for `QTextDocument`.
+
+import re
+import typing as t
+from array import array
+from bisect import bisect_left
+
+#: Inserted text is appended to chunks of at most this size, so typing
+#: only ever copies a small chunk instead of a growing buffer
+ADD_CHUNK_SIZE = 4 * 1024
+#: Slice size used when streaming the document out
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+reNewline = re.compile('\n')
+
+
+class Piece:
+    """A span of one of the buffers. Pieces are never changed in place."""
+
+    __slots__ = (
+        'buffer',
+        'start',
+        'length',
+        'newlines'
+    )
+
+    def __init__(self, buffer: int, start: int, length: int, newlines: int):
+        self.buffer = buffer
+        self.start = start
+        self.length = length
+        self.newlines = newlines
+
+    @property
+    def end(self) -> int:
+        return self.start + self.length
+
+
+class PieceTable:
+    """
+    Text stored as a list of pieces pointing into the original text and
+    an append-only buffer of inserted text.
+
+    Edits split or trim the pieces around the edited range, they cost
+    O(pieces) and never copy the document. Each buffer keeps the offsets
+    of its newlines, so lines are found without scanning the text.
+    """
+
+    def __init__(self, text: str = ''):
+        #: buffers[0] is the original text, the rest is the add buffer
+        self._buffers: t.List[str] = [text]
+        self._breaks: t.List[array] = [self.__newlines(text)]
+        self._pieces: t.List[Piece] = []
+        self._length = len(text)
+        self._newlines = len(self._breaks[0])
+
+        if text:
+            self._pieces.append(Piece(0, 0, len(text), self._newlines))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def lineCount(self) -> int:
+        return self._newlines + 1
+
+    def pieceCount(self) -> int:
+        return len(self._pieces)
+
+    def insert(self, position: int, text: str):
+        if not text:
+            return
+
+        index, offset = self.__locate(position)
+        if offset == 0 and index > 0 and self.__extend(index - 1, text):
+            pass
+        else:
+            piece = self.__append(text)
+            if offset == 0:
+                self._pieces.insert(index, piece)
+            else:
+                old = self._pieces[index]
+                self._pieces[index:index + 1] = [
+                    self.__slice(old, 0, offset),
+                    piece,
+                    self.__slice(old, offset, old.length)
+                ]
+
+        self._length += len(text)
+        self._newlines += text.count('\n')
+
+    def remove(self, position: int, length: int):
+        length = min(length, self._length - position)
+        if length <= 0:
+            return
+
+        first, offset = self.__locate(position)
+        last, end_offset = self.__locate(position + length)
+
+        pieces = []
+        if offset:
+            pieces.append(self.__slice(self._pieces[first], 0, offset))
+
+        if end_offset:
+            piece = self._pieces[last]
+            pieces.append(self.__slice(piece, end_offset, piece.length))
+            last += 1
+
+        removed = self._pieces[first:last]
+        self._pieces[first:last] = pieces
+        self._length -= length
+        self._newlines -= (
+            sum(piece.newlines for piece in removed)
+            - sum(piece.newlines for piece in pieces)
+        )
+
+    def text(self, start: int = 0, end: int = None) -> str:
+        if end is None or end > self._length:
+            end = self._length
+        if start >= end:
+            return ''
+
+        parts = []
+        position = 0
+        for piece in self._pieces:
+            piece_end = position + piece.length
+            if piece_end > start:
+                a = max(start - position, 0)
+                b = min(end - position, piece.length)
+                parts.append(
+                    self._buffers[piece.buffer][piece.start + a:piece.start + b]
+                )
+                if piece_end >= end:
+                    break
+            position = piece_end
+
+        return ''.join(parts)
+
+    def lineStart(self, line: int) -> int:
+        """Position of the first character of `line`."""
+        if line <= 0:
+            return 0
+        if line > self._newlines:
+            return self._length
+
+        seen = 0
+        position = 0
+        for piece in self._pieces:
+            if seen + piece.newlines >= line:
+                breaks = self._breaks[piece.buffer]
+                index = bisect_left(breaks, piece.start) + (line - seen - 1)
+                return position + breaks[index] - piece.start + 1
+
+            seen += piece.newlines
+            position += piece.length
+
+        return self._length
+
+    def lineAt(self, position: int) -> int:
+        """Number of the line containing `position`."""
+        line = 0
+        for piece in self._pieces:
+            if position < piece.length:
+                breaks = self._breaks[piece.buffer]
+                return line + (
+                    bisect_left(breaks, piece.start + position)
+                    - bisect_left(breaks, piece.start)
+                )
+
+            line += piece.newlines
+            position -= piece.length
+
+        return line
+
+    def offset(self, line: int, column: int) -> int:
+        """Position of the character at `column` of `line`."""
+        return self.lineStart(line) + column
+
+    def position(self, offset: int) -> t.Tuple[int, int]:
+        """(line, column) of the character at `offset`."""
+        line = self.lineAt(offset)
+        return line, offset - self.lineStart(line)
+
+    def line(self, line: int) -> str:
+        return self.lines(line, 1)[0]
+
+    def lines(self, first: int, count: int) -> t.List[str]:
+        """The text of at most `count` lines starting at `first`."""
+        last = min(first + count, self.lineCount())
+        if first >= last:
+            return ['']
+
+        start = self.lineStart(first)
+        end = self.lineStart(last) - 1 if last < self.lineCount() else self._length
+        return self.text(start, end).split('\n')
+
+    def find(self, needle: str, start: int = 0) -> int:
+        """Position of the next `needle` from `start`, or -1."""
+        if not needle:
+            return -1
+
+        overlap = len(needle) - 1
+        position = start
+        while position < self._length:
+            chunk = self.text(position, position + STREAM_CHUNK_SIZE + overlap)
+            index = chunk.find(needle)
+            if index != -1:
+                return position + index
+            position += STREAM_CHUNK_SIZE
+
+        return -1
+
+    def search(self, needle: str, line: int, column: int) -> t.Optional[t.Tuple[int, int]]:
+        """(line, column) of the next `needle` from the given line and column."""
+        found = self.find(needle, self.offset(line, column))
+        if found == -1:
+            return None
+
+        return self.position(found)
+
+    def chunks(self, size: int = STREAM_CHUNK_SIZE) -> t.Iterator[str]:
+        """
+        Streams the text in slices of at most `size` characters. The
+        pieces are copied first, later edits don't affect the stream.
+        """
+        return self.__chunks(list(self._pieces), size)
+
+    def writeTo(self, stream: t.TextIO, size: int = STREAM_CHUNK_SIZE) -> int:
+        """Writes the text to `stream` without joining it in memory."""
+        written = 0
+        for chunk in self.chunks(size):
+            stream.write(chunk)
+            written += len(chunk)
+        return written
+
+    def __chunks(self, pieces: t.List[Piece], size: int) -> t.Iterator[str]:
+        for piece in pieces:
+            buffer = self._buffers[piece.buffer]
+            for start in range(piece.start, piece.end, size):
+                yield buffer[start:min(start + size, piece.end)]
+
+    def __locate(self, position: int) -> t.Tuple[int, int]:
+        """Index of the piece containing `position` and the offset in it."""
+        for index, piece in enumerate(self._pieces):
+            if position < piece.length:
+                return index, position
+            position -= piece.length
+
+        return len(self._pieces), 0
+
+    def __count(self, buffer: int, start: int, end: int) -> int:
+        breaks = self._breaks[buffer]
+        return bisect_left(breaks, end) - bisect_left(breaks, start)
+
+    def __slice(self, piece: Piece, start: int, end: int) -> Piece:
+        start += piece.start
+        end += piece.start
+        return Piece(piece.buffer, start, end - start, self.__count(piece.buffer, start, end))
+
+    def __append(self, text: str) -> Piece:
+        buffer = len(self._buffers) - 1
+        if buffer == 0 or len(self._buffers[buffer]) + len(text) > ADD_CHUNK_SIZE:
+            self._buffers.append('')
+            self._breaks.append(array('Q'))
+            buffer += 1
+
+        start = len(self._buffers[buffer])
+        self._buffers[buffer] += text
+        self._breaks[buffer].extend(
+            start + match.start() for match in reNewline.finditer(text)
+        )
+        return Piece(buffer, start, len(text), text.count('\n'))
+
+    def __extend(self, index: int, text: str) -> bool:
+        """Grows the piece at `index` when `text` directly follows it in the add buffer."""
+        piece = self._pieces[index]
+        buffer = len(self._buffers) - 1
+        if (
+            piece.buffer != buffer
+            or buffer == 0
+            or piece.end != len(self._buffers[buffer])
+            or piece.end + len(text) > ADD_CHUNK_SIZE
+        ):
+            return False
+
+        added = self.__append(text)
+        self._pieces[index] = Piece(
+            buffer,
+            piece.start,
+            piece.length + added.length,
+            piece.newlines + added.newlines
+        )
+        return True
+
+    @staticmethod
+    def __newlines(text: str) -> array:
+        return array('Q', (match.start() for match in reNewline.finditer(text)))
@@ -0,0 +1,551 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Markdown rendering for the preview, one top-level block at a time.
+
+import bisect
+import hashlib
+import re
+import typing as t
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+from PyQt5.QtCore import QCoreApplication, QThread
+from PyQt5.QtGui import QFont, QTextCursor, QTextDocument, QTextFormat
+
+from SerumWriter.Lib.Engines import RenderEngine, create_engine
+
+#: Named anchors leading every rendered block, followed by its number modulo
+#: ANCHOR_CYCLE. Qt compares a new anchor format against every other one, the
+#: names hash alike, so a few distinct names keep importing the HTML linear
+ANCHOR_PREFIX = 'srm-'
+ANCHOR_CYCLE = 64
+#: Rendered blocks kept by `BlockRenderer`
+CACHE_LIMIT = 4096
+#: Blocks rendered between checks for a newer render
+CHECK_INTERVAL = 64
+
+#: Raw HTML blocks end at their closing tag, blank lines in between or not
+HTML_BLOCK_TAGS = frozenset((
+    'address', 'article', 'aside', 'blockquote', 'details', 'dialog', 'dd',
+    'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hgroup', 'hr', 'li', 'main',
+    'nav', 'ol', 'p', 'pre', 'section', 'table', 'ul', 'script', 'style',
+    'iframe', 'math', 'canvas', 'noscript', 'video', 'audio', 'object'
+))
+
+#: Elements without a closing tag
+VOID_TAGS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr'
+))
+
+reFence = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+reListItem = re.compile(r'^ {0,3}(?:[*+-]|\d+\.)[ \t]')
+reQuote = re.compile(r'^ {0,3}>')
+reHtmlBlock = re.compile(r'^ {0,3}<(!--|[a-zA-Z][a-zA-Z0-9]*)')
+reDefinition = re.compile(r'^ {0,3}\[([^\]]+)\]:[ \t]*\S', re.M)
+reLabel = re.compile(r'\[([^\]]+)\]')
+#: Opening tags the rendered HTML of a block starts with
+reOpening = re.compile(r'^(?:<[^/!][^>]*>\s*)+')
+
+
+class TagBalance(HTMLParser):
+    """Tells whether HTML closes every element it opens, in order."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.open: t.List[str] = []
+        self.balanced = True
+
+    def handle_starttag(self, tag: str, attrs):
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_endtag(self, tag: str):
+        if tag in VOID_TAGS:
+            return
+        if not self.open or self.open.pop() != tag:
+            self.balanced = False
+
+
+def is_balanced(html: str) -> bool:
+    parser = TagBalance()
+    parser.feed(html)
+    parser.close()
+    return parser.balanced and not parser.open
+
+
+class Segment(t.NamedTuple):
+    #: Source lines first..last (inclusive), the blank ones after aren't part of it
+    first: int
+    last: int
+    text: str
+
+
+def split_blocks(text: str) -> t.List[Segment]:
+    """
+    Splits `text` where a blank line is followed by an unindented line
+    that starts a new top-level block. Fenced code, raw HTML blocks and
+    the items of a loose list or quote stay in one segment, every
+    segment renders the same alone as within the whole document.
+    """
+    lines = text.split('\n')
+    segments = []
+    start = None
+    #: Last non-blank line of the current segment
+    end = 0
+    blank = False
+    kind = None
+    #: Closing fence while in fenced code, closing tag while in raw HTML
+    fence: t.Pattern = None
+    closing: str = None
+
+    for number, line in enumerate(lines):
+        if fence is not None:
+            end = number
+            if fence.match(line):
+                fence = None
+            continue
+
+        if not line.strip():
+            blank = start is not None
+            continue
+
+        if start is None or (
+            blank and closing is None and line[0] not in ' \t'
+            and not (kind is reListItem and reListItem.match(line))
+            and not (kind is reQuote and reQuote.match(line))
+        ):
+            if start is not None:
+                segments.append(Segment(start, end, '\n'.join(lines[start:end + 1])))
+            start = number
+            kind = next((kind for kind in (reListItem, reQuote) if kind.match(line)), None)
+
+        rest = line
+        match = reHtmlBlock.match(line) if closing is None else None
+        if match and match.group(1) == '!--':
+            closing, rest = '-->', line[match.end():]
+        elif match and match.group(1).lower() in HTML_BLOCK_TAGS:
+            closing, rest = '</%s' % match.group(1).lower(), line[match.end():]
+
+        if closing is not None and closing in rest.lower():
+            closing = None
+
+        match = reFence.match(line)
+        if match:
+            marker = match.group(1)
+            fence = re.compile(r'^ {0,3}%s{%d,}[ \t]*$' % (re.escape(marker[0]), len(marker)))
+        end = number
+        blank = False
+
+    if start is not None:
+        segments.append(Segment(start, end, '\n'.join(lines[start:end + 1])))
+    return segments
+
+
+def reference_definitions(text: str) -> t.Dict[str, str]:
+    """The reference-link definition lines of `text` by lowercase label."""
+    definitions = {}
+    for match in reDefinition.finditer(text):
+        line_end = text.find('\n', match.end())
+        definitions.setdefault(
+            match.group(1).lower(),
+            text[match.start():line_end if line_end >= 0 else len(text)]
+        )
+    return definitions
+
+
+def with_references(segment: str, definitions: t.Dict[str, str]) -> str:
+    """`segment` followed by the definitions of the references it uses from elsewhere."""
+    if not definitions or '[' not in segment:
+        return segment
+
+    lines = []
+    for label in reLabel.findall(segment):
+        line = definitions.get(label.lower())
+        if line is not None and line not in lines and line not in segment:
+            lines.append(line)
+    return segment + '\n\n' + '\n'.join(lines) if lines else segment
+
+
+class Rendering:
+    """
+    Markdown rendered by `BlockRenderer`, the HTML of every top-level
+    block of the source kept apart, so the blocks that changed between
+    two renderings can be told apart and rendered alone.
+    """
+
+    __slots__ = ('segments', 'blocks', 'offsets', 'raw')
+
+    def __init__(
+        self,
+        segments: t.List[Segment],
+        blocks: t.List[str],
+        offsets: t.List[int],
+        raw: bool
+    ):
+        self.segments = segments
+        #: HTML of every segment, empty for those rendering to nothing
+        self.blocks = blocks
+        #: Where the anchor goes in the HTML of every segment, -1 for none
+        self.offsets = offsets
+        #: Holds raw HTML leaving tags open, Qt then parses past the block
+        self.raw = raw
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def html(self, start: int = 0, end: int = None) -> t.Tuple[str, t.List[int]]:
+        """
+        The HTML of segments `start` to `end` and the indices of those
+        whose HTML starts with an anchor, in order, see `SourceMap`.
+        """
+        parts, anchored = [], []
+        for index in range(start, len(self.segments) if end is None else end):
+            html, offset = self.blocks[index], self.offsets[index]
+            if offset >= 0:
+                anchor = '<a name="%s%d"></a>' % (ANCHOR_PREFIX, len(anchored) % ANCHOR_CYCLE)
+                html = html[:offset] + anchor + html[offset:]
+                anchored.append(index)
+            if html:
+                parts.append(html)
+        return '\n'.join(parts), anchored
+
+
+class BlockRenderer:
+    """
+    Renders Markdown one top-level block at a time, reference links
+    resolved against the whole document. The HTML of every block is
+    kept by the hash of its source, so rendering the document again
+    after an edit only converts the blocks that changed.
+    """
+
+    def __init__(self, engine: RenderEngine = None, limit: int = CACHE_LIMIT):
+        #: By default the one of the `render_engine` setting
+        self.engine = engine or create_engine()
+        #: Blocks kept besides those of the last document rendered
+        self._limit = limit
+        #: Digest of the block source -> (HTML, where its anchor goes or -1,
+        #: raw HTML leaving tags open)
+        self._cache: t.Dict[bytes, t.Tuple[str, int, bool]] = OrderedDict()
+
+    def __block(self, source: str) -> t.Tuple[str, int, bool]:
+        key = hashlib.blake2b(source.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        block = self._cache.get(key)
+        if block is not None:
+            self._cache.move_to_end(key)
+            return block
+
+        html = self.engine.convert(source)
+        match = reOpening.match(html)
+        raw = reHtmlBlock.match(source) is not None and not is_balanced(html)
+        block = self._cache[key] = (html, match.end() if match else -1, raw)
+        return block
+
+    def render(
+        self,
+        text: str,
+        interrupted: t.Callable[[], bool] = lambda: False
+    ) -> t.Optional[Rendering]:
+        """The rendering of `text`, None when interrupted."""
+        definitions = reference_definitions(text)
+        segments = split_blocks(text)
+        blocks, offsets = [], []
+        raw = False
+        for number, segment in enumerate(segments):
+            if number % CHECK_INTERVAL == 0 and interrupted():
+                return None
+            html, offset, unbalanced = self.__block(with_references(segment.text, definitions))
+            blocks.append(html)
+            offsets.append(offset)
+            raw = raw or unbalanced
+
+        #: The blocks just used are the newest, never evict those
+        keep = max(self._limit, len(segments))
+        while len(self._cache) > keep:
+            self._cache.popitem(last=False)
+        return Rendering(segments, blocks, offsets, raw)
+
+    def clear(self):
+        self._cache.clear()
+
+
+def render_blocks(text: str) -> t.Tuple[str, t.List[int]]:
+    """
+    The HTML of `text` and the first source line of every block whose
+    HTML starts with an anchor, rendered with a `BlockRenderer` of its own.
+    """
+    rendering = BlockRenderer().render(text)
+    html, anchored = rendering.html()
+    return html, [rendering.segments[index].first for index in anchored]
+
+
+class SourceMap:
+    """
+    Where the rendered blocks of the source start in the preview
+    document. `lines` holds the first source line of every block and
+    `positions` where its anchor ended up, both increasing, so mapping
+    either way is a bisect. `segments` holds the index of every block
+    in its `Rendering`.
+    """
+
+    __slots__ = ('lines', 'positions', 'segments')
+
+    def __init__(
+        self,
+        lines: t.List[int] = None,
+        positions: t.List[int] = None,
+        segments: t.List[int] = None
+    ):
+        self.lines = lines or []
+        self.positions = positions or []
+        self.segments = segments or []
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @classmethod
+    def scan(
+        cls,
+        document: QTextDocument,
+        rendering: Rendering,
+        anchored: t.List[int]
+    ) -> 'SourceMap':
+        """
+        The map of a document filled with HTML from `Rendering.html`,
+        `anchored` being the segment indices it returned with it.
+        """
+        lines, positions, segments = [], [], []
+        #: Number of the next anchor expected, Qt drops the ones it can't place
+        expected = 0
+        block = document.begin()
+        while block.isValid():
+            iterator = block.begin()
+            while not iterator.atEnd():
+                fragment = iterator.fragment()
+                names = fragment.charFormat().anchorNames()
+                for name in names:
+                    if not name.startswith(ANCHOR_PREFIX):
+                        continue
+                    number = expected + (int(name[len(ANCHOR_PREFIX):]) - expected) % ANCHOR_CYCLE
+                    if number >= len(anchored):
+                        return cls(lines, positions, segments)
+                    #: Blocks without text leave their anchor to the next one
+                    lines.append(rendering.segments[anchored[number]].first)
+                    positions.append(fragment.position())
+                    segments.append(anchored[number])
+                    expected = number + 1
+                iterator += 1
+            block = block.next()
+        return cls(lines, positions, segments)
+
+    def blockOfLine(self, line: float) -> int:
+        """Index of the rendered block holding source `line`, -1 before the first one."""
+        return bisect.bisect_right(self.lines, line) - 1
+
+    def blockAt(self, position: int) -> int:
+        """Index of the rendered block holding preview `position`, -1 before the first one."""
+        return bisect.bisect_right(self.positions, position) - 1
+
+
+def is_boundary(document: QTextDocument, position: int, previous: int = None) -> bool:
+    """
+    Whether the blocks from `position` on can be replaced apart from
+    those before: it starts a block of its own, after one with text that
+    neither is a rule nor in a table, as Qt would merge those across.
+    `previous` is the position of the block anchored before, if any.
+    """
+    block = document.findBlock(position)
+    before = block.previous()
+    if block.position() != position or not before.isValid() or before.length() <= 1:
+        return False
+    if previous is not None and document.findBlock(previous).blockNumber() >= block.blockNumber():
+        return False
+
+    for block in (before, block):
+        if block.blockFormat().hasProperty(QTextFormat.BlockTrailingHorizontalRulerWidth):
+            return False
+        if QTextCursor(block).currentTable() is not None:
+            return False
+    return True
+
+
+def patch_document(
+    document: QTextDocument,
+    source_map: SourceMap,
+    shown: Rendering,
+    rendering: Rendering
+) -> t.Optional[SourceMap]:
+    """
+    Turns `document`, showing `shown` as mapped by `source_map`, into
+    `rendering` by replacing only the blocks whose HTML changed, and
+    returns its map. Those are imported together with the block before
+    and after, Qt collapses margins and ends lists across, and only the
+    ones in between are copied over. None when that wouldn't give the
+    same document as importing `rendering` whole, `document` is then
+    left as it is.
+    """
+    old, new = shown.blocks, rendering.blocks
+    if shown.raw or rendering.raw:
+        return None
+
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    shift = len(new) - len(old)
+
+    positions, entries = source_map.positions, source_map.segments
+    if start == len(old) == len(new):
+        #: Same HTML, the source lines may still have moved
+        return SourceMap(
+            [rendering.segments[index].first for index in entries],
+            positions,
+            entries
+        )
+
+    #: Map entries the replaced blocks start at and the ones after start at
+    first = bisect.bisect_right(entries, start) - 1
+    while first > 0 and not is_boundary(document, positions[first], positions[first - 1]):
+        first -= 1
+    if first <= 0:
+        return None
+    last = bisect.bisect_left(entries, len(old) - end)
+    while last < len(entries) and not is_boundary(document, positions[last], positions[last - 1]):
+        last += 1
+
+    stop = (entries[last] if last < len(entries) else len(old)) + shift
+    following = (entries[last + 1] if last + 1 < len(entries) else len(old)) + shift
+    html, anchored = rendering.html(entries[first - 1], following if last < len(entries) else stop)
+    scratch = QTextDocument()
+    scratch.setDefaultFont(document.defaultFont())
+    scratch.setHtml(html)
+    patched = SourceMap.scan(scratch, rendering, anchored)
+    if not patched.segments or patched.segments[0] != entries[first - 1]:
+        return None
+
+    #: The block before ends where it does in the document
+    block = scratch.findBlock(patched.positions[0])
+    for _ in range(
+        document.findBlock(positions[first]).blockNumber()
+        - document.findBlock(positions[first - 1]).blockNumber()
+    ):
+        block = block.next()
+    if not block.isValid():
+        return None
+    begin = block.position()
+
+    if last < len(entries):
+        index = bisect.bisect_left(patched.segments, stop)
+        if index == len(patched) or patched.segments[index] != stop:
+            return None
+        finish = patched.positions[index] - 1
+        if not is_boundary(scratch, finish + 1) or begin > finish + 1:
+            return None
+        removed = positions[last] - 1 - positions[first]
+    else:
+        finish = scratch.characterCount() - 1
+        removed = document.characterCount() - 1 - positions[first]
+
+    source = QTextCursor(scratch)
+    source.setPosition(begin - 1)
+    source.setPosition(finish, QTextCursor.KeepAnchor)
+    cursor = QTextCursor(document)
+    cursor.setPosition(positions[first] - 1)
+    cursor.setPosition(positions[first] + removed, QTextCursor.KeepAnchor)
+    cursor.beginEditBlock()
+    if source.hasSelection():
+        cursor.insertFragment(source.selection())
+    else:
+        cursor.removeSelectedText()
+    cursor.endEditBlock()
+
+    #: Entries before are where they were, those of the copy are moved to
+    #: the document and those after by the difference in length
+    delta = finish - begin - removed
+    inside = [
+        index for index, segment in enumerate(patched.segments)
+        if entries[first] <= segment < stop and patched.positions[index] >= begin
+    ]
+    segments = entries[:first] + [patched.segments[index] for index in inside] \
+        + [segment + shift for segment in entries[last:]]
+    return SourceMap(
+        [rendering.segments[index].first for index in segments],
+        positions[:first] + [patched.positions[index] - begin + positions[first] for index in inside]
+            + [position + delta for position in positions[last:]],
+        segments
+    )
+
+
+class RenderWorker(QThread):
+    """
+    Renders the preview off the GUI thread. The Markdown is always
+    rendered here, the QTextDocument only when `build` is set, the GUI
+    thread otherwise patches the blocks that changed into the one shown.
+    """
+
+    def __init__(
+        self,
+        generation: int,
+        text: str,
+        renderer: BlockRenderer,
+        font: QFont,
+        build: bool,
+        parent=None
+    ):
+        super().__init__(parent)
+        self.generation = generation
+        self.text = text
+        self.renderer = renderer
+        self.font = font
+        self.build = build
+        self.rendering: Rendering = None
+        self.document: QTextDocument = None
+        self.sourceMap: SourceMap = None
+        #: Qt aborts when a running thread is destroyed
+        QCoreApplication.instance().aboutToQuit.connect(self.stop)
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+    def run(self):
+        rendering = self.renderer.render(self.text, self.isInterruptionRequested)
+        if rendering is None or not self.build:
+            self.rendering = rendering
+            return
+
+        html, anchored = rendering.html()
+        document = QTextDocument()
+        #: Patched in place later, there is nothing to undo
+        document.setUndoRedoEnabled(False)
+        document.setDefaultFont(self.font)
+        document.setHtml(html)
+        if self.isInterruptionRequested():
+            return
+
+        self.sourceMap = SourceMap.scan(document, rendering, anchored)
+        document.moveToThread(QCoreApplication.instance().thread())
+        self.document = document
+        self.rendering = rendering
@@ -0,0 +1,207 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Coalescing job scheduler for work triggered by typing.
+
+import time
+import typing as t
+from enum import IntEnum
+
+from PyQt5.QtCore import (
+    QObject,
+    QTimer,
+    QAbstractEventDispatcher
+)
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    #: Only runs when the event loop is idle (or when `max_latency` expires)
+    LOW = 2
+
+
+class Job:
+    __slots__ = (
+        'name',
+        'callback',
+        'priority',
+        'debounce',
+        'max_latency',
+        'timer',
+        'requested',
+        'queued'
+    )
+
+    def __init__(
+        self,
+        name: str,
+        callback: t.Callable[[], t.Any],
+        priority: Priority,
+        debounce: int,
+        max_latency: t.Optional[int],
+        timer: QTimer
+    ):
+        self.name = name
+        self.callback = callback
+        self.priority = priority
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.timer = timer
+        self.requested: t.Optional[float] = None
+        self.queued = False
+
+    @property
+    def pending(self) -> bool:
+        return self.requested is not None
+
+
+class Scheduler(QObject):
+    """
+    Collects jobs that react to the document changing (word count, status,
+    preview...) and runs each one at most once per burst of keystrokes.
+
+    A job waits `debounce` milliseconds after the last `schedule` call but
+    never longer than `max_latency` milliseconds after the first one.
+    `Priority.LOW` jobs are additionally held back until the event loop
+    has nothing else to process.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._jobs: t.Dict[str, Job] = {}
+
+        self._idle_timer = QTimer(self)
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.setInterval(0)
+        self._idle_timer.timeout.connect(self.__run_idle)
+
+        dispatcher = QAbstractEventDispatcher.instance()
+        if dispatcher is not None:
+            dispatcher.aboutToBlock.connect(self.__about_to_block)
+
+    @staticmethod
+    def __now() -> float:
+        return time.monotonic() * 1000
+
+    def register(
+        self,
+        name: str,
+        callback: t.Callable[[], t.Any],
+        priority: Priority = Priority.NORMAL,
+        debounce: int = 0,
+        max_latency: t.Optional[int] = None
+    ) -> Job:
+        if name in self._jobs:
+            self.unregister(name)
+
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        job = Job(name, callback, priority, debounce, max_latency, timer)
+        timer.timeout.connect(lambda: self.__timeout(job))
+        self._jobs[name] = job
+        return job
+
+    def unregister(self, name: str):
+        job = self._jobs.pop(name, None)
+        if job:
+            job.timer.stop()
+            job.timer.deleteLater()
+
+    def schedule(self, *names: str):
+        now = self.__now()
+        for name in names:
+            job = self._jobs.get(name)
+            if job is None:
+                continue
+
+            if job.requested is None:
+                job.requested = now
+
+            #: A new request restarts the quiet period, even for jobs
+            #: already waiting for the loop to become idle.
+            job.queued = False
+            delay = job.debounce
+            if job.max_latency is not None:
+                delay = min(delay, job.requested + job.max_latency - now)
+
+            job.timer.start(max(int(delay), 0))
+
+    def cancel(self, name: str):
+        job = self._jobs.get(name)
+        if job:
+            job.timer.stop()
+            job.queued = False
+            job.requested = None
+
+    def flush(self, name: str = None):
+        """Runs pending jobs right away."""
+        jobs = [self._jobs[name]] if name else self.__by_priority()
+        for job in jobs:
+            if job.pending:
+                self.__run(job)
+
+    def isPending(self, name: str) -> bool:
+        job = self._jobs.get(name)
+        return bool(job and job.pending)
+
+    def __by_priority(self) -> t.List[Job]:
+        return sorted(self._jobs.values(), key=lambda j: j.priority)
+
+    def __deadline_passed(self, job: Job) -> bool:
+        if job.max_latency is None:
+            return False
+        return self.__now() >= job.requested + job.max_latency
+
+    def __timeout(self, job: Job):
+        if not job.pending:
+            return
+
+        if job.priority >= Priority.LOW \
+            and not job.queued \
+            and not self.__deadline_passed(job):
+
+            job.queued = True
+            if job.max_latency is not None:
+                #: Force the job through if the loop never goes idle
+                job.timer.start(
+                    max(int(job.requested + job.max_latency - self.__now()), 0)
+                )
+            return
+
+        self.__run(job)
+
+    def __about_to_block(self):
+        if not self._idle_timer.isActive() \
+            and any(job.queued for job in self._jobs.values()):
+            self._idle_timer.start()
+
+    def __run_idle(self):
+        #: One job per idle turn so input events can cut in between
+        for job in self.__by_priority():
+            if job.queued:
+                self.__run(job)
+                break
+
+    def __run(self, job: Job):
+        job.timer.stop()
+        job.queued = False
+        job.requested = None
+        job.callback()
@@ -0,0 +1,532 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Incremental search over a document, see `SearchEngine`.
+
+import bisect
+import re
+import time
+import typing as t
+
+from PyQt5.QtCore import (
+    QCoreApplication,
+    QObject,
+    QThread,
+    QTimer,
+    pyqtSignal as Signal
+)
+
+try:
+    #: Matches without holding the GIL and can be stopped inside a match.
+    #: Patterns are only searched with it, one catastrophic `re` match
+    #: holds the GIL and freezes the editor until it is done.
+    import regex
+except ImportError:
+    regex = None
+
+#: Longer documents are scanned on a worker thread
+SEARCH_THREAD_THRESHOLD = 256 * 1024
+
+#: Candidates narrowed down on the GUI thread at most
+NARROW_LIMIT = 50000
+
+#: Occurrences kept at most, the count then reads "m+"
+MATCH_LIMIT = 1000000
+
+#: Pause after an edit before the document is searched again (ms)
+RESCAN_DELAY = 300
+
+#: A regular expression search gives up after this long (s)
+SEARCH_TIMEOUT = 10.0
+
+#: Regular expression matches are streamed back this many at a time
+BATCH_SIZE = 5000
+
+reAstral = re.compile('[\U00010000-\U0010ffff]')
+
+PatternError = re.error if regex is None else (re.error, regex.error)
+
+
+def patterns_supported() -> bool:
+    """Whether regular expression queries can be searched, see `compile_pattern`."""
+    return regex is not None
+
+
+def compile_query(query: str) -> t.Pattern:
+    """Every position `query` starts at, overlapping ones included, ignoring case."""
+    return re.compile('(?=%s)' % re.escape(query), re.IGNORECASE)
+
+
+def compile_pattern(query: str) -> t.Pattern:
+    """
+    A regular expression query, ignoring case, `^` and `$` match at every
+    line. Raises `PatternError`, needs `regex` (see `patterns_supported`).
+    """
+    return regex.compile(query, regex.IGNORECASE | regex.MULTILINE | regex.VERSION0)
+
+
+def find_all(
+    query: str,
+    text: str,
+    candidates: t.Sequence[int] = None,
+    interrupted: t.Callable[[], bool] = lambda: False
+) -> t.Tuple[t.Optional[t.List[int]], bool]:
+    """
+    The code point offsets `query` occurs at in `text` and whether there
+    were more than `MATCH_LIMIT`. With `candidates`, the occurrences of a
+    prefix of `query`, only those are tried. None when interrupted.
+    """
+    pattern = compile_query(query)
+    points = []
+    if candidates is None:
+        for match in pattern.finditer(text):
+            points.append(match.start())
+            if len(points) % 4096 == 0 and interrupted():
+                return None, False
+            if len(points) >= MATCH_LIMIT:
+                return points, True
+    else:
+        match = pattern.match
+        for i, point in enumerate(candidates):
+            if match(text, point):
+                points.append(point)
+            if i % 4096 == 0 and interrupted():
+                return None, False
+
+    return points, False
+
+
+def find_pattern(pattern: t.Pattern, text: str, deadline: float) -> t.Iterator[t.Match]:
+    """
+    The matches of a `compile_pattern` pattern. Raises `TimeoutError`
+    once the `time.monotonic` `deadline` passed, also in the middle of a
+    match that backtracks catastrophically.
+    """
+    matches = pattern.finditer(
+        text,
+        concurrent=True,
+        timeout=max(deadline - time.monotonic(), 0.001)
+    )
+    for i, match in enumerate(matches):
+        if i % 256 == 0 and time.monotonic() > deadline:
+            raise TimeoutError()
+        yield match
+
+
+def spans(points: t.Sequence[int], length: int) -> t.Tuple[t.List[int], t.List[int]]:
+    """Start and end of the matches at `points` that don't overlap, first come first served."""
+    starts, ends = [], []
+    end = -1
+    for point in points:
+        if point >= end:
+            end = point + length
+            starts.append(point)
+            ends.append(end)
+    return starts, ends
+
+
+def astral_points(text: str) -> t.List[int]:
+    """Offsets of the characters taking two UTF-16 units, see `SearchEngine.position`."""
+    return [match.start() for match in reAstral.finditer(text)]
+
+
+class SearchWorker(QThread):
+    """
+    Runs a search off the GUI thread. A plain query is searched with
+    `find_all` in one go, the matches of a `pattern` are streamed back
+    with `found` as they come in.
+    """
+    #: starts, ends of more matches
+    found = Signal(object, object)
+
+    def __init__(
+        self,
+        generation: int,
+        query: str,
+        text: str,
+        candidates: t.Sequence[int] = None,
+        pattern: t.Pattern = None,
+        parent=None
+    ):
+        super().__init__(parent)
+        self.generation = generation
+        self.query = query
+        self.text = text
+        self.candidates = candidates
+        self.pattern = pattern
+        self.points: t.List[int] = None
+        self.truncated = False
+        self.starts: t.List[int] = []
+        self.ends: t.List[int] = []
+        self.astral: t.List[int] = None
+        self.error: str = None
+        #: Ran to the end, or to the timeout, without being interrupted
+        self.complete = False
+        #: Qt aborts when a running thread is destroyed
+        QCoreApplication.instance().aboutToQuit.connect(self.stop)
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+    def run(self):
+        if self.candidates is None:
+            self.astral = astral_points(self.text)
+
+        if self.pattern is not None:
+            self.__find_pattern()
+            return
+
+        points, truncated = find_all(
+            self.query,
+            self.text,
+            self.candidates,
+            self.isInterruptionRequested
+        )
+        if points is None:
+            return
+
+        self.starts, self.ends = spans(points, len(self.query))
+        self.points, self.truncated = points, truncated
+        self.complete = True
+
+    def __find_pattern(self):
+        starts, ends = [], []
+        count = 0
+        try:
+            for match in find_pattern(self.pattern, self.text, time.monotonic() + SEARCH_TIMEOUT):
+                starts.append(match.start())
+                ends.append(match.end())
+                if len(starts) < BATCH_SIZE:
+                    continue
+
+                if self.isInterruptionRequested():
+                    return
+                count += len(starts)
+                self.found.emit(starts, ends)
+                starts, ends = [], []
+                if count >= MATCH_LIMIT:
+                    self.truncated = True
+                    break
+        except TimeoutError:
+            self.error = 'Timed out'
+
+        if self.isInterruptionRequested():
+            return
+        self.found.emit(starts, ends)
+        self.complete = True
+
+
+class SearchEngine(QObject):
+    """
+    Finds every occurrence of a query in a document and keeps them, so
+    stepping through the matches and counting them costs nothing.
+
+    While the query only grows, the occurrences of the previous query are
+    all that is tried again, every keystroke narrows the last result
+    instead of scanning the document. Long documents are scanned on a
+    `SearchWorker`, `changed` tells when the matches are in.
+
+    With `setRegex` the query is a regular expression. It is always
+    matched on a worker, can be cancelled, gives up after
+    `SEARCH_TIMEOUT` and its matches stream in while it runs.
+
+    An edit makes the matches stale, see `invalidate`, the document is
+    searched again after a pause in typing.
+    """
+    changed = Signal()
+
+    def __init__(self, text: t.Callable[[], str], parent=None):
+        super().__init__(parent)
+        #: Returns the current text of the document
+        self._source = text
+        self._query = ''
+        self._regex = False
+        self._pattern: t.Pattern = None
+        self._error: str = None
+        #: Text the occurrences were found in, None once it was edited
+        self._text: t.Optional[str] = None
+        #: Every occurrence of `_found`, the query last searched to the end
+        self._points: t.Optional[t.List[int]] = None
+        self._found = ''
+        self._truncated = False
+        #: Matches in code points, only converted to document positions
+        #: when they are asked for
+        self._starts: t.List[int] = []
+        self._ends: t.List[int] = []
+        #: Where the characters taking two UTF-16 units are, in code
+        #: points and in units
+        self._astral: t.List[int] = []
+        self._astral_units: t.List[int] = []
+        self._current = -1
+        self._generation = 0
+        self._worker: SearchWorker = None
+
+        self._rescan = QTimer(self)
+        self._rescan.setSingleShot(True)
+        self._rescan.setInterval(RESCAN_DELAY)
+        self._rescan.timeout.connect(lambda: self.search(self._query))
+
+    def setSource(self, text: t.Callable[[], str]):
+        self._source = text
+        self.invalidate()
+
+    def query(self) -> str:
+        return self._query
+
+    def isRegex(self) -> bool:
+        return self._regex
+
+    def setRegex(self, v: bool):
+        if v == self._regex:
+            return
+
+        self._regex = v
+        self._points = None
+        self.search(self._query)
+
+    def error(self) -> t.Optional[str]:
+        """Why the matches are missing or incomplete, e.g. an invalid pattern."""
+        return self._error
+
+    def isBusy(self) -> bool:
+        return self._worker is not None or self._rescan.isActive()
+
+    def count(self) -> int:
+        return len(self._starts)
+
+    def isTruncated(self) -> bool:
+        return self._truncated
+
+    def current(self) -> int:
+        """Index of the current match, -1 when there is none."""
+        return self._current
+
+    def match(self, index: int = None) -> t.Optional[t.Tuple[int, int]]:
+        """
+        Start and end of the match at `index`, the current one by default,
+        as document positions.
+        """
+        if index is None:
+            index = self._current
+        if not 0 <= index < len(self._starts):
+            return None
+        return self.position(self._starts[index]), self.position(self._ends[index])
+
+    def replacement(self, index: int, template: str) -> str:
+        """
+        What the match at `index` is replaced with. Group references in
+        the `template` of a regular expression are expanded.
+        """
+        if not self._regex or self._text is None:
+            return template
+
+        match = self._pattern.match(self._text, self._starts[index])
+        return template if match is None else match.expand(template)
+
+    def position(self, point: int) -> int:
+        """The `QTextDocument` position (UTF-16 units) of a code point offset."""
+        return point + bisect.bisect_left(self._astral, point)
+
+    def point(self, position: int) -> int:
+        """The code point offset of a `QTextDocument` position."""
+        return position - bisect.bisect_left(self._astral_units, position)
+
+    def select(self, position: int) -> int:
+        """Makes the first match at or after `position` current, wrapping around."""
+        if not self._starts:
+            self._current = -1
+        else:
+            index = bisect.bisect_left(self._starts, self.point(position))
+            self._current = index % len(self._starts)
+        return self._current
+
+    def next(self) -> int:
+        if self._starts:
+            self._current = (self._current + 1) % len(self._starts)
+        return self._current
+
+    def previous(self) -> int:
+        if self._starts:
+            self._current = (self._current - 1) % len(self._starts)
+        return self._current
+
+    def visible(self, start: int, end: int) -> range:
+        """Indices of the matches overlapping the positions `start` to `end`."""
+        return range(
+            bisect.bisect_right(self._ends, self.point(start)),
+            bisect.bisect_left(self._starts, self.point(end))
+        )
+
+    def search(self, query: str):
+        self._rescan.stop()
+        self._generation += 1
+        self.__stop_worker()
+
+        candidates = None
+        if self._text is not None and self._points is not None and not self._truncated \
+            and self._found and query.startswith(self._found) and not self._regex:
+
+            #: Only the occurrences of the shorter query can still match
+            candidates = self._points
+        else:
+            self._text = self._source() if query else None
+
+        self._query = query
+        if not query:
+            self.__apply('', None, False, [], [])
+            return
+
+        text = self._text
+        if self._regex:
+            if not patterns_supported():
+                self.__apply('', None, False, [], [], error='Needs the regex module')
+                return
+
+            try:
+                self._pattern = compile_pattern(query)
+            except PatternError:
+                self.__apply('', None, False, [], [], error='Invalid pattern')
+                return
+
+            #: Matches stream in from the worker, busy from here on
+            self.__start_worker(SearchWorker(
+                self._generation,
+                query,
+                text,
+                pattern=self._pattern,
+                parent=self
+            ))
+            self.__apply('', None, False, [], [])
+            return
+
+        if len(text) <= SEARCH_THREAD_THRESHOLD \
+            or (candidates is not None and len(candidates) <= NARROW_LIMIT):
+
+            points, truncated = find_all(query, text, candidates)
+            self.__apply(
+                query,
+                points,
+                truncated,
+                *spans(points, len(query)),
+                astral=astral_points(text) if candidates is None else None
+            )
+            return
+
+        self.__start_worker(SearchWorker(self._generation, query, text, candidates, parent=self))
+
+    def cancel(self):
+        """Stops a running search, the matches found so far are kept."""
+        self._rescan.stop()
+        if self._worker is None:
+            return
+
+        self.__stop_worker()
+        self._error = 'Cancelled'
+        self.changed.emit()
+
+    def invalidate(self):
+        """The document changed, the matches are dropped until it is searched again."""
+        self._text = None
+        self._points = None
+        if not self._query:
+            return
+
+        self.__stop_worker()
+        self._rescan.start()
+        if self._starts:
+            self.__apply('', None, False, [], [])
+
+    def clear(self):
+        self._rescan.stop()
+        self.search('')
+
+    def __start_worker(self, worker: SearchWorker):
+        self._worker = worker
+        worker.found.connect(lambda starts, ends: self.__found(worker, starts, ends))
+        worker.finished.connect(lambda: self.__finished(worker))
+        worker.start()
+
+    def __stop_worker(self):
+        if self._worker is not None:
+            #: It finishes in the background, its result is ignored
+            self._worker.requestInterruption()
+            self._worker = None
+
+    def __found(self, worker: SearchWorker, starts: t.List[int], ends: t.List[int]):
+        if worker is not self._worker:
+            return
+
+        if worker.astral is not None and self._astral is not worker.astral:
+            self.__set_astral(worker.astral)
+        self._starts.extend(starts)
+        self._ends.extend(ends)
+        if self._current < 0 and self._starts:
+            self._current = 0
+        self.changed.emit()
+
+    def __finished(self, worker: SearchWorker):
+        worker.deleteLater()
+        if worker is not self._worker or worker.generation != self._generation:
+            return
+
+        self._worker = None
+        if not worker.complete:
+            return
+
+        if worker.pattern is not None:
+            #: The matches are in already
+            self._truncated, self._error = worker.truncated, worker.error
+            self.changed.emit()
+            return
+
+        self.__apply(
+            worker.query,
+            worker.points,
+            worker.truncated,
+            worker.starts,
+            worker.ends,
+            astral=worker.astral
+        )
+
+    def __set_astral(self, astral: t.List[int]):
+        self._astral = astral
+        self._astral_units = [point + i for i, point in enumerate(astral)]
+
+    def __apply(
+        self,
+        query: str,
+        points: t.Optional[t.List[int]],
+        truncated: bool,
+        starts: t.List[int],
+        ends: t.List[int],
+        astral: t.List[int] = None,
+        error: str = None
+    ):
+        """`astral` is None when the text is still the one searched last."""
+        current = self.match()
+        self._found, self._points, self._truncated = query, points, truncated
+        self._starts, self._ends = starts, ends
+        self._error = error
+        if astral is not None:
+            self.__set_astral(astral)
+        #: Stay on the match that was current, or the next one
+        self.select(current[0] if current else 0)
+        self.changed.emit()
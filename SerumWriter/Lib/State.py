@@ -0,0 +1,212 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Per-file editor state, kept between sessions to reopen documents instantly.
+
+import hashlib
+import os
+import pathlib
+import struct
+import tempfile
+import typing as t
+import zlib
+
+from PyQt5.QtCore import (
+    QByteArray,
+    QDataStream,
+    QIODevice
+)
+from PyQt5.QtGui import QTextCharFormat
+
+STATE_DIR = pathlib.Path().home() / '.serum' / 'State'
+
+#: State files kept, the least recently written go first
+STATE_LIMIT = 256
+
+#: Documents with more blocks don't keep their highlighting
+STATE_BLOCK_LIMIT = 200000
+
+MAGIC = b'SRMS'
+VERSION = 1
+HEADER = struct.Struct('<4sB')
+#: block key, number of format ranges
+BLOCK = struct.Struct('<8sH')
+#: start, length, format index
+RANGE = struct.Struct('<IIH')
+
+#: Formatted spans of one block, flattened (start, length, format index) triples
+Ranges = t.Tuple[int, ...]
+
+
+def create_state_folder():
+    if not STATE_DIR.exists():
+        os.makedirs(STATE_DIR.absolute())
+    elif STATE_DIR.is_file():
+        os.remove(STATE_DIR.absolute())
+        os.mkdir(STATE_DIR.absolute())
+
+    return STATE_DIR.absolute()
+
+
+def state_file(path: str) -> pathlib.Path:
+    """Where the state of the document at `path` lives."""
+    key = hashlib.sha1(os.path.realpath(path).encode('utf-8')).hexdigest()[:16]
+    return STATE_DIR / ('%s.state' % key)
+
+
+def block_key(text: str) -> bytes:
+    """Identifies a block by its content, wherever it moved to."""
+    return hashlib.blake2b(
+        text.encode('utf-8', 'surrogatepass'),
+        digest_size=8
+    ).digest()
+
+
+class EditorState:
+    """
+    What a document needs to come back the way it was left: the cursor,
+    the viewport and its highlighting. The formats of every block are
+    kept by `block_key`, so blocks still holding the same text are
+    formatted from here instead of being highlighted again, no matter
+    what was edited around them.
+
+    `signature` describes what the highlighting depended on besides the
+    text (document type, spell checking), see `SyntaxHighlighter.restore`.
+    """
+
+    __slots__ = (
+        'position',
+        'anchor',
+        'scroll',
+        'docType',
+        'signature',
+        'formats',
+        'blocks'
+    )
+
+    def __init__(self):
+        self.position = 0
+        self.anchor = 0
+        self.scroll = 0
+        self.docType = ''
+        self.signature = ''
+        self.formats: t.List[QTextCharFormat] = []
+        self.blocks: t.Dict[bytes, Ranges] = {}
+
+    @classmethod
+    def load(cls, path: str) -> t.Optional['EditorState']:
+        """The state last saved for `path`, None if there is none or it can't be read."""
+        try:
+            with open(state_file(path), 'rb') as f:
+                data = f.read()
+            magic, version = HEADER.unpack_from(data)
+            body = QByteArray(zlib.decompress(data[HEADER.size:]))
+        except (OSError, struct.error, zlib.error):
+            return None
+
+        if magic != MAGIC or version != VERSION:
+            return None
+
+        state = cls()
+        stream = QDataStream(body, QIODevice.OpenModeFlag.ReadOnly)
+        state.position = stream.readInt64()
+        state.anchor = stream.readInt64()
+        state.scroll = stream.readInt32()
+        state.docType = stream.readQString()
+        state.signature = stream.readQString()
+        for _ in range(stream.readUInt16()):
+            charFormat = QTextCharFormat()
+            stream >> charFormat
+            state.formats.append(charFormat)
+        blocks = stream.readBytes() or b''
+        if stream.status() != QDataStream.Status.Ok:
+            return None
+
+        try:
+            state.blocks = dict(cls.__read_blocks(blocks, len(state.formats)))
+        except struct.error:
+            state.blocks = {}
+        return state
+
+    @staticmethod
+    def __read_blocks(data: bytes, formats: int) -> t.Iterator[t.Tuple[bytes, Ranges]]:
+        offset = 0
+        while offset < len(data):
+            key, count = BLOCK.unpack_from(data, offset)
+            offset += BLOCK.size
+            ranges = []
+            for _ in range(count):
+                start, length, index = RANGE.unpack_from(data, offset)
+                if index >= formats:
+                    raise struct.error('unknown format %d' % index)
+                ranges += (start, length, index)
+                offset += RANGE.size
+            yield key, tuple(ranges)
+
+    def save(self, path: str):
+        """Writes the state of `path`, replacing the previous one."""
+        blocks = bytearray()
+        for key, ranges in self.blocks.items():
+            blocks += BLOCK.pack(key, len(ranges) // 3)
+            for i in range(0, len(ranges), 3):
+                blocks += RANGE.pack(*ranges[i:i + 3])
+
+        body = QByteArray()
+        stream = QDataStream(body, QIODevice.OpenModeFlag.WriteOnly)
+        stream.writeInt64(self.position)
+        stream.writeInt64(self.anchor)
+        stream.writeInt32(self.scroll)
+        stream.writeQString(self.docType or '')
+        stream.writeQString(self.signature or '')
+        stream.writeUInt16(len(self.formats))
+        for charFormat in self.formats:
+            stream << charFormat
+        stream.writeBytes(bytes(blocks))
+
+        create_state_folder()
+        fd, temp = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=STATE_DIR)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION))
+                f.write(zlib.compress(bytes(body), 1))
+            os.replace(temp, state_file(path))
+        except OSError as e:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            print(e)
+            return
+
+        prune()
+
+
+def prune(limit: int = STATE_LIMIT):
+    """Drops the least recently written states beyond `limit`."""
+    try:
+        files = [entry for entry in os.scandir(STATE_DIR) if entry.name.endswith('.state')]
+        if len(files) <= limit:
+            return
+
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - limit]:
+            os.remove(entry.path)
+    except OSError as e:
+        print(e)
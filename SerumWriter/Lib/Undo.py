@@ -0,0 +1,423 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Undo history with a memory budget, used in place of Qt's undo stack.
+
+import sys
+import time
+import typing as t
+import zlib
+from collections import deque
+
+from PyQt5.QtCore import (
+    QObject,
+    pyqtSignal as Signal
+)
+from PyQt5.QtGui import (
+    QTextCursor,
+    QTextDocument
+)
+from SerumWriter.Lib.Document import DocumentDelta
+
+#: Keystrokes closer than this (ms) undo together
+TYPING_WINDOW = 1000
+
+#: Text longer than this is kept compressed
+COMPRESS_SIZE = 4 * 1024
+
+#: Default memory budget of a history, in bytes
+UNDO_BUDGET = 32 * 1024 * 1024
+
+#: What an `Edit` costs besides its text
+EDIT_OVERHEAD = 160
+
+
+def pack(text: str) -> t.Union[str, bytes]:
+    if len(text) > COMPRESS_SIZE:
+        return zlib.compress(text.encode('utf-8', 'surrogatepass'), 1)
+    return text
+
+
+def unpack(data: t.Union[str, bytes]) -> str:
+    if isinstance(data, bytes):
+        return zlib.decompress(data).decode('utf-8', 'surrogatepass')
+    return data
+
+
+def utf16_length(text: str) -> int:
+    """Length of `text` in `QTextDocument` positions."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le', 'surrogatepass')) // 2
+
+
+class Edit:
+    """
+    One undo step, `removed` was replaced with `inserted` at `position`.
+    Lengths are in positions of the document, which are not always
+    characters (`QTextDocument` counts UTF-16 units).
+    """
+
+    __slots__ = (
+        'position',
+        'removed_length',
+        'inserted_length',
+        'time',
+        '_removed',
+        '_inserted'
+    )
+
+    def __init__(
+        self,
+        position: int,
+        removed: str,
+        inserted: str,
+        removed_length: int,
+        inserted_length: int
+    ):
+        self.position = position
+        self.removed_length = removed_length
+        self.inserted_length = inserted_length
+        self.time = time.monotonic() * 1000
+        self._removed = pack(removed)
+        self._inserted = pack(inserted)
+
+    @property
+    def removed(self) -> str:
+        return unpack(self._removed)
+
+    @property
+    def inserted(self) -> str:
+        return unpack(self._inserted)
+
+    def size(self) -> int:
+        return EDIT_OVERHEAD + sys.getsizeof(self._removed) + sys.getsizeof(self._inserted)
+
+    def type(self, text: str, length: int):
+        self._inserted = pack(self.inserted + text)
+        self.inserted_length += length
+        self.time = time.monotonic() * 1000
+
+    def erase(self, position: int, text: str, length: int):
+        if position < self.position:
+            self._removed = pack(text + self.removed)
+            self.position = position
+        else:
+            self._removed = pack(self.removed + text)
+        self.removed_length += length
+        self.time = time.monotonic() * 1000
+
+    def __repr__(self) -> str:
+        return '<Edit pos=%d -%d +%d>' % (
+            self.position,
+            self.removed_length,
+            self.inserted_length
+        )
+
+
+class UndoHistory(QObject):
+    """
+    Undo and redo stacks that stay within a memory budget.
+
+    Keystrokes typed or erased in a row are merged into one step until a
+    word ends, the cursor jumps or `TYPING_WINDOW` passes. Large texts are
+    stored compressed. When the history grows past `budget` bytes its
+    oldest steps are dropped.
+    """
+    changed = Signal()
+
+    def __init__(self, budget: int = UNDO_BUDGET, parent=None):
+        super().__init__(parent)
+        self._undo: t.Deque[Edit] = deque()
+        self._redo: t.List[Edit] = []
+        self._size = 0
+        self._budget = budget
+        self._evicted = 0
+        #: The next edit starts a new step
+        self._sealed = True
+
+    def budget(self) -> int:
+        return self._budget
+
+    def setBudget(self, budget: int):
+        self._budget = budget
+        self.__evict()
+        self.changed.emit()
+
+    def memoryUsage(self) -> int:
+        return self._size
+
+    def undoCount(self) -> int:
+        return len(self._undo)
+
+    def redoCount(self) -> int:
+        return len(self._redo)
+
+    def evictedCount(self) -> int:
+        """Steps dropped to stay within the budget."""
+        return self._evicted
+
+    def canUndo(self) -> bool:
+        return bool(self._undo)
+
+    def canRedo(self) -> bool:
+        return bool(self._redo)
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._size = 0
+        self._evicted = 0
+        self._sealed = True
+        self.changed.emit()
+
+    def seal(self):
+        """Stops the last step from growing, e.g. after a save."""
+        self._sealed = True
+
+    def follow(self, position: int):
+        """Call when the cursor moves, a jump away from the last step seals it."""
+        if self._undo:
+            last = self._undo[-1]
+            if position != last.position + last.inserted_length:
+                self._sealed = True
+
+    def record(
+        self,
+        position: int,
+        removed: str,
+        inserted: str,
+        removed_length: int = None,
+        inserted_length: int = None
+    ):
+        if removed_length is None:
+            removed_length = len(removed)
+        if inserted_length is None:
+            inserted_length = len(inserted)
+
+        for edit in self._redo:
+            self._size -= edit.size()
+        self._redo.clear()
+
+        last = self._undo[-1] if self._undo and not self._sealed else None
+        if last is not None and self.__merge(last, position, removed, inserted, removed_length, inserted_length):
+            self._sealed = False
+        else:
+            edit = Edit(position, removed, inserted, removed_length, inserted_length)
+            self._undo.append(edit)
+            self._size += edit.size()
+            #: Pastes and replacements are steps of their own
+            self._sealed = not self.__is_keystroke(removed, inserted)
+
+        self.__evict()
+        self.changed.emit()
+
+    def takeUndo(self) -> t.Optional[Edit]:
+        """Pops the step to revert, the caller puts `removed` back."""
+        if not self._undo:
+            return None
+
+        edit = self._undo.pop()
+        self._redo.append(edit)
+        self._sealed = True
+        self.changed.emit()
+        return edit
+
+    def takeRedo(self) -> t.Optional[Edit]:
+        """Pops the step to apply again, the caller puts `inserted` back."""
+        if not self._redo:
+            return None
+
+        edit = self._redo.pop()
+        self._undo.append(edit)
+        self._sealed = True
+        self.changed.emit()
+        return edit
+
+    @staticmethod
+    def __is_keystroke(removed: str, inserted: str) -> bool:
+        if inserted:
+            return len(inserted) == 1 and inserted != '\n'
+        return len(removed) == 1 and removed != '\n'
+
+    def __merge(
+        self,
+        last: Edit,
+        position: int,
+        removed: str,
+        inserted: str,
+        removed_length: int,
+        inserted_length: int
+    ) -> bool:
+        if time.monotonic() * 1000 - last.time > TYPING_WINDOW:
+            return False
+        if not self.__is_keystroke(removed, inserted):
+            return False
+
+        size = last.size()
+        if inserted and not removed:
+            if position != last.position + last.inserted_length:
+                return False
+            typed = last.inserted
+            #: A new word starts a new step
+            if typed and typed[-1].isspace() and not inserted.isspace():
+                return False
+            last.type(inserted, inserted_length)
+
+        elif removed and not inserted and not last.inserted_length:
+            #: Backspace erases towards the step, delete away from it
+            if position + removed_length != last.position and position != last.position:
+                return False
+            last.erase(position, removed, removed_length)
+
+        else:
+            return False
+
+        self._size += last.size() - size
+        return True
+
+    def __evict(self):
+        while self._size > self._budget and self._undo:
+            self._size -= self._undo.popleft().size()
+            self._evicted += 1
+
+        while self._size > self._budget and self._redo:
+            self._size -= self._redo.pop(0).size()
+            self._evicted += 1
+
+
+class DocumentHistory(UndoHistory):
+    """
+    `UndoHistory` of a `QTextDocument`, with the document's own undo stack
+    turned off.
+
+    `QTextDocument.contentsChange` only tells how much text an edit
+    removed, so the text an edit may remove is copied before it happens:
+    `snapshot` the blocks around the cursor or selection whenever it moves
+    and the range of any other edit before making it. After an edit the
+    blocks around it are copied again. An edit outside of the copy can't
+    be reverted, the history is cleared. Feed it every `DocumentDelta`
+    through `update`.
+    """
+
+    def __init__(self, document: QTextDocument, budget: int = UNDO_BUDGET, parent=None):
+        super().__init__(budget, parent)
+        self._document = document
+        #: Position of the first copied block and the text of the copy
+        self._snapshot: t.Tuple[int, str] = None
+        self._applying = False
+        document.setUndoRedoEnabled(False)
+
+    def reset(self):
+        """Forgets the history, e.g. after loading."""
+        self._snapshot = None
+        self.clear()
+
+    def snapshot(self, start: int, end: int):
+        """Copies the blocks from `start` to `end` and the ones next to them."""
+        document = self._document
+        block = document.findBlock(start)
+        if block.previous().isValid():
+            block = block.previous()
+        last = document.findBlock(end)
+        if last.next().isValid():
+            last = last.next()
+
+        position = block.position()
+        if block == last:
+            self._snapshot = (position, block.text())
+            return
+
+        cursor = QTextCursor(block)
+        cursor.setPosition(last.position() + last.length() - 1, QTextCursor.MoveMode.KeepAnchor)
+        self._snapshot = (position, cursor.selectedText().replace('\u2029', '\n'))
+
+    def update(self, delta: DocumentDelta):
+        removed = self.__removed(delta)
+        end = min(delta.end, self._document.characterCount() - 1)
+        self.snapshot(end, end)
+
+        if self._applying or not (delta.removed or delta.added):
+            return
+        if removed is None:
+            #: Nothing before this edit can be reverted anymore
+            self.clear()
+            return
+
+        document = self._document
+        inserted = delta.text(document)
+        if inserted == removed:
+            #: Only the formatting changed
+            return
+
+        self.record(
+            delta.position,
+            removed,
+            inserted,
+            utf16_length(removed),
+            utf16_length(inserted)
+        )
+
+    def __removed(self, delta: DocumentDelta) -> t.Optional[str]:
+        """The text `delta` removed, `None` when it was not copied."""
+        if not delta.removed:
+            return ''
+        if self._snapshot is None:
+            return None
+
+        start, text = self._snapshot
+        offset = delta.position - start
+        if text.isascii():
+            if offset < 0 or offset + delta.removed > len(text):
+                return None
+            return text[offset:offset + delta.removed]
+
+        units = text.encode('utf-16-le', 'surrogatepass')
+        if offset < 0 or (offset + delta.removed) * 2 > len(units):
+            return None
+        return units[offset * 2:(offset + delta.removed) * 2].decode('utf-16-le', 'surrogatepass')
+
+    def undo(self) -> t.Optional[int]:
+        """Reverts the last step, returns where the cursor should go."""
+        edit = self.takeUndo()
+        if edit is None:
+            return None
+
+        removed = edit.removed
+        self.__apply(edit.position, edit.inserted_length, removed)
+        return edit.position + edit.removed_length
+
+    def redo(self) -> t.Optional[int]:
+        edit = self.takeRedo()
+        if edit is None:
+            return None
+
+        self.__apply(edit.position, edit.removed_length, edit.inserted)
+        return edit.position + edit.inserted_length
+
+    def __apply(self, position: int, length: int, text: str):
+        cursor = QTextCursor(self._document)
+        cursor.setPosition(position)
+        cursor.setPosition(position + length, QTextCursor.MoveMode.KeepAnchor)
+        self._applying = True
+        try:
+            cursor.insertText(text)
+        finally:
+            self._applying = False
@@ -0,0 +1,546 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Full-text index of a folder of notes, kept on disk between sessions.
+
+import array
+import hashlib
+import itertools
+import operator
+import os
+import pathlib
+import struct
+import tempfile
+import typing as t
+import zlib
+
+from PyQt5.QtCore import (
+    QCoreApplication,
+    QObject,
+    QThread,
+    pyqtSignal as Signal
+)
+from SerumWriter.Lib.Files import read_text
+
+INDEX_DIR = pathlib.Path().home() / '.serum' / 'Index'
+
+#: Files indexed, anything else in the folder is left alone
+NOTE_SUFFIXES = ('.md', '.markdown', '.txt', '.snote')
+
+#: Notes indexed at most, a folder holding more is only partly searched
+NOTE_LIMIT = 20000
+
+#: Bigger files are documents rather than notes and aren't indexed
+NOTE_SIZE_LIMIT = 8 * 1024 * 1024
+
+#: Results returned for a query at most
+RESULT_LIMIT = 200
+
+MAGIC = b'SRMI'
+VERSION = 1
+HEADER = struct.Struct('<4sB')
+COUNT = struct.Struct('<I')
+#: file id, mtime in ns, size, path length, term count
+FILE = struct.Struct('<IqQHI')
+#: term length, postings length
+TERM = struct.Struct('<HI')
+
+#: A phrase of a query, the position of every term within it
+Phrase = t.List[t.Tuple[int, str]]
+
+
+class Hit(t.NamedTuple):
+    path: str
+    #: Occurrences of the query in the note
+    count: int
+
+
+def create_index_folder():
+    if not INDEX_DIR.exists():
+        os.makedirs(INDEX_DIR.absolute())
+    elif INDEX_DIR.is_file():
+        os.remove(INDEX_DIR.absolute())
+        os.mkdir(INDEX_DIR.absolute())
+
+    return INDEX_DIR.absolute()
+
+
+def index_file(root: str) -> pathlib.Path:
+    """Where the index of the folder `root` lives."""
+    key = hashlib.sha1(os.path.realpath(root).encode('utf-8', 'surrogateescape')).hexdigest()[:16]
+    return INDEX_DIR / ('%s.index' % key)
+
+
+def tokenize(text: str) -> t.List[t.Tuple[int, str]]:
+    """
+    The words of `text` as `word_count` counts them, lowercased. Every
+    one comes with its position among the whitespace separated tokens,
+    the words of a phrase are neighbours.
+    """
+    return [
+        (position, token.lower())
+        for position, token in enumerate(text.split())
+        if token.isalpha()
+    ]
+
+
+def parse_query(query: str) -> t.List[Phrase]:
+    """The words of `query` on their own and its "quoted phrases"."""
+    phrases = []
+    for index, part in enumerate(query.split('"')):
+        terms = tokenize(part)
+        if index % 2 and terms:
+            start = terms[0][0]
+            phrases.append([(position - start, term) for position, term in terms])
+        elif not index % 2:
+            phrases.extend([(0, term)] for _, term in terms)
+    return phrases
+
+
+class NoteEntry:
+    __slots__ = ('id', 'mtime', 'size', 'terms')
+
+    def __init__(self, id: int, mtime: int, size: int, terms: array.array):
+        self.id = id
+        self.mtime = mtime
+        self.size = size
+        #: Ids of the terms it holds, its postings are found through them
+        self.terms = terms
+
+
+class WorkspaceIndex:
+    """
+    Inverted index of the notes under `root`.
+
+    Every term has one postings array of (file id, count, positions)
+    runs, the positions delta encoded. Every note keeps the ids of its
+    terms so that only their postings are rewritten when it changes,
+    notes are read again only when their mtime or size changed.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.truncated = False
+        self._files: t.Dict[str, NoteEntry] = {}
+        self._paths: t.Dict[int, str] = {}
+        self._next_id = 0
+        self._terms: t.Dict[str, int] = {}
+        self._postings: t.List[array.array] = []
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    @classmethod
+    def load(cls, root: str) -> 'WorkspaceIndex':
+        """The index of `root` saved last time, an empty one without a usable one."""
+        index = cls(root)
+        try:
+            with open(index_file(root), 'rb') as f:
+                data = f.read()
+            index.__read(data)
+        except (OSError, ValueError, EOFError, struct.error, zlib.error, UnicodeDecodeError):
+            return cls(root)
+        return index
+
+    def __read(self, data: bytes):
+        magic, version = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not an index')
+
+        body = memoryview(zlib.decompress(data[HEADER.size:]))
+        offset = 0
+
+        def take(length: int) -> memoryview:
+            nonlocal offset
+            if offset + length > len(body):
+                raise EOFError()
+            offset += length
+            return body[offset - length:offset]
+
+        def ids(count: int) -> array.array:
+            values = array.array('I')
+            values.frombytes(take(count * values.itemsize))
+            return values
+
+        length, = COUNT.unpack(take(COUNT.size))
+        if bytes(take(length)).decode('utf-8', 'surrogateescape') != os.path.realpath(self.root):
+            raise ValueError('Index of another folder')
+
+        self._next_id, files = struct.unpack('<II', take(8))
+        for _ in range(files):
+            file_id, mtime, size, length, terms = FILE.unpack(take(FILE.size))
+            relpath = bytes(take(length)).decode('utf-8', 'surrogateescape')
+            self._files[relpath] = NoteEntry(file_id, mtime, size, ids(terms))
+            self._paths[file_id] = relpath
+
+        terms, = COUNT.unpack(take(COUNT.size))
+        for term_id in range(terms):
+            length, postings = TERM.unpack(take(TERM.size))
+            self._terms[bytes(take(length)).decode('utf-8', 'surrogatepass')] = term_id
+            self._postings.append(ids(postings))
+
+    def save(self):
+        """Writes the index, replacing the one saved before."""
+        root = os.path.realpath(self.root).encode('utf-8', 'surrogateescape')
+        body = bytearray(COUNT.pack(len(root)) + root)
+        body += struct.pack('<II', self._next_id, len(self._files))
+        for relpath, entry in self._files.items():
+            name = relpath.encode('utf-8', 'surrogateescape')
+            body += FILE.pack(entry.id, entry.mtime, entry.size, len(name), len(entry.terms))
+            body += name
+            body += entry.terms.tobytes()
+
+        body += COUNT.pack(len(self._terms))
+        #: Ids were handed out in insertion order
+        for term, postings in zip(self._terms, self._postings):
+            word = term.encode('utf-8', 'surrogatepass')
+            body += TERM.pack(len(word), len(postings))
+            body += word
+            body += postings.tobytes()
+
+        create_index_folder()
+        fd, temp = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=INDEX_DIR)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION))
+                f.write(zlib.compress(bytes(body), 1))
+            os.replace(temp, index_file(self.root))
+        except OSError as e:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            print(e)
+
+    def scan(
+        self,
+        interrupted: t.Callable[[], bool] = lambda: False
+    ) -> t.Tuple[t.List[t.Tuple[str, int, int]], t.List[str]]:
+        """
+        The notes added or changed since the last update, with their
+        mtime and size, and the ones gone since.
+        """
+        changed, seen = [], set()
+        self.truncated = False
+        for folder, folders, files in os.walk(self.root):
+            if interrupted():
+                return [], []
+
+            #: Hidden folders hold tools and history, not notes
+            folders[:] = sorted(name for name in folders if not name.startswith('.'))
+            for name in sorted(files):
+                if not name.lower().endswith(NOTE_SUFFIXES):
+                    continue
+                if len(seen) >= NOTE_LIMIT:
+                    self.truncated = True
+                    break
+
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.st_size > NOTE_SIZE_LIMIT:
+                    continue
+
+                relpath = os.path.relpath(path, self.root)
+                seen.add(relpath)
+                entry = self._files.get(relpath)
+                if entry is None or entry.mtime != stat.st_mtime_ns or entry.size != stat.st_size:
+                    changed.append((relpath, stat.st_mtime_ns, stat.st_size))
+
+            if self.truncated:
+                break
+
+        return changed, [relpath for relpath in self._files if relpath not in seen]
+
+    def update(
+        self,
+        interrupted: t.Callable[[], bool] = lambda: False,
+        progress: t.Callable[[int], None] = None
+    ) -> bool:
+        """
+        Brings the index up to date with the folder, returns whether it
+        changed. Interrupted, the notes read so far are indexed.
+        """
+        changed, removed = self.scan(interrupted)
+        if not changed and not removed:
+            return False
+
+        #: Notes whose runs go, and the terms they had runs in
+        dropped, affected = set(), set()
+        runs: t.Dict[int, t.List[int]] = {}
+        percent = -1
+        for done, (relpath, mtime, size) in enumerate(changed):
+            if interrupted():
+                break
+            if progress is not None and done * 100 // len(changed) != percent:
+                percent = done * 100 // len(changed)
+                progress(percent)
+
+            try:
+                text = read_text(os.path.join(self.root, relpath), NOTE_SIZE_LIMIT + 1)
+            except OSError:
+                removed.append(relpath)
+                continue
+
+            entry = self._files.get(relpath)
+            if entry is None:
+                entry = NoteEntry(self._next_id, mtime, size, None)
+                self._next_id += 1
+                self._files[relpath] = entry
+                self._paths[entry.id] = relpath
+            else:
+                dropped.add(entry.id)
+                affected.update(entry.terms)
+                entry.mtime, entry.size = mtime, size
+
+            positions: t.Dict[str, t.List[int]] = {}
+            for position, term in tokenize(text):
+                points = positions.get(term)
+                if points is None:
+                    positions[term] = [position]
+                else:
+                    points.append(position)
+
+            entry.terms = array.array('I')
+            for term, points in positions.items():
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    term_id = self._terms[term] = len(self._postings)
+                    self._postings.append(array.array('I'))
+                entry.terms.append(term_id)
+
+                run = runs.get(term_id)
+                if run is None:
+                    run = runs[term_id] = []
+                run += (entry.id, len(points), points[0])
+                run += map(operator.sub, points[1:], points)
+
+        for relpath in removed:
+            entry = self._files.pop(relpath, None)
+            if entry is not None:
+                del self._paths[entry.id]
+                dropped.add(entry.id)
+                affected.update(entry.terms)
+
+        for term_id in affected:
+            postings = self._postings[term_id]
+            kept = array.array('I')
+            for file_id, start, end in self.__runs(postings):
+                if file_id not in dropped:
+                    kept.extend(postings[start - 2:end])
+            self._postings[term_id] = kept
+
+        for term_id, run in runs.items():
+            self._postings[term_id].fromlist(run)
+
+        if sum(1 for postings in self._postings if not postings) * 4 > len(self._postings):
+            self.__compact()
+        return True
+
+    def __compact(self):
+        """Drops the terms no note has any more, renumbering the others."""
+        ids, terms, postings = {}, {}, []
+        for term, term_id in self._terms.items():
+            if self._postings[term_id]:
+                ids[term_id] = terms[term] = len(postings)
+                postings.append(self._postings[term_id])
+
+        for entry in self._files.values():
+            entry.terms = array.array('I', (ids[term_id] for term_id in entry.terms))
+        self._terms, self._postings = terms, postings
+
+    @staticmethod
+    def __runs(postings: array.array) -> t.Iterator[t.Tuple[int, int, int]]:
+        """(file id, start, end) of every run, start and end bound its positions."""
+        index, length = 0, len(postings)
+        while index < length:
+            start = index + 2
+            end = start + postings[index + 1]
+            yield postings[index], start, end
+            index = end
+
+    def __counts(self, term_id: int) -> t.Dict[int, int]:
+        return {file_id: end - start for file_id, start, end in self.__runs(self._postings[term_id])}
+
+    def __positions(self, term_id: int, files: t.Set[int]) -> t.Dict[int, t.Set[int]]:
+        postings = self._postings[term_id]
+        return {
+            file_id: set(itertools.accumulate(postings[start:end]))
+            for file_id, start, end in self.__runs(postings)
+            if file_id in files
+        }
+
+    def __phrase_counts(self, phrase: Phrase) -> t.Dict[int, int]:
+        """Occurrences of `phrase` in every note holding it."""
+        ids = [self._terms.get(term) for _, term in phrase]
+        if None in ids:
+            return {}
+        counts = self.__counts(ids[0])
+        if len(phrase) == 1:
+            return counts
+
+        files = set(counts)
+        for term_id in ids[1:]:
+            files.intersection_update(self.__counts(term_id))
+
+        #: Where the phrase could start in every note, narrowed word by word
+        starts = self.__positions(ids[0], files)
+        for (offset, _), term_id in zip(phrase[1:], ids[1:]):
+            for file_id, points in self.__positions(term_id, set(starts)).items():
+                found = starts[file_id].intersection(point - offset for point in points)
+                if found:
+                    starts[file_id] = found
+                else:
+                    del starts[file_id]
+        return {file_id: len(points) for file_id, points in starts.items()}
+
+    def __frequency(self, phrase: Phrase) -> int:
+        return min(len(self._postings[self._terms[term]]) if term in self._terms else 0 for _, term in phrase)
+
+    def search(self, query: str, limit: int = RESULT_LIMIT) -> t.List[Hit]:
+        """
+        The notes holding every word and "quoted phrase" of `query`,
+        those with the most occurrences first.
+        """
+        scores = None
+        #: The rarest first, the notes left only get fewer
+        for phrase in sorted(parse_query(query), key=self.__frequency):
+            counts = self.__phrase_counts(phrase)
+            if scores is None:
+                scores = counts
+            else:
+                scores = {file_id: scores[file_id] + count for file_id, count in counts.items() if file_id in scores}
+            if not scores:
+                return []
+
+        if scores is None:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self._paths[item[0]]))
+        return [Hit(os.path.join(self.root, self._paths[file_id]), count) for file_id, count in ranked[:limit]]
+
+
+class IndexWorker(QThread):
+    """Loads the index of `root`, brings it up to date and saves it."""
+    progress = Signal(int)
+
+    def __init__(self, root: str, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.index: WorkspaceIndex = None
+        self.changed = False
+        #: Qt aborts when a running thread is destroyed
+        QCoreApplication.instance().aboutToQuit.connect(self.stop)
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+    def run(self):
+        index = WorkspaceIndex.load(self.root)
+        self.changed = index.update(self.isInterruptionRequested, self.progress.emit)
+        if self.changed:
+            #: Even a partial update saves rereading those notes
+            index.save()
+        self.index = index
+
+
+class Workspace(QObject):
+    """
+    The folder of notes searched from the sidebar. Its index is updated
+    on a worker thread, queries are answered from the last complete one
+    without reading any note.
+    """
+    progress = Signal(int)
+    #: The index changed, so may the results
+    updated = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._root: str = None
+        self._index: WorkspaceIndex = None
+        self._worker: IndexWorker = None
+        #: Refreshed again once the running update is done
+        self._pending = False
+
+    def root(self) -> t.Optional[str]:
+        return self._root
+
+    def setRoot(self, root: t.Optional[str]):
+        """Searches the notes under `root` from now on, they're indexed on the next `refresh`."""
+        root = os.path.realpath(root) if root else None
+        if root == self._root:
+            return
+
+        self._root = root
+        self._index = None
+        if self._worker is not None:
+            #: It finishes in the background, its result is ignored
+            self._worker.requestInterruption()
+            self._worker = None
+        self._pending = False
+        self.updated.emit()
+
+    def refresh(self):
+        """Picks up the notes changed on disk since the last update."""
+        if self._root is None:
+            return
+        if self._worker is not None:
+            self._pending = True
+            return
+
+        self._pending = False
+        worker = self._worker = IndexWorker(self._root, self)
+        worker.progress.connect(lambda percent: self.__progress(worker, percent))
+        worker.finished.connect(lambda: self.__finished(worker))
+        worker.start()
+
+    def isIndexing(self) -> bool:
+        return self._worker is not None
+
+    def isTruncated(self) -> bool:
+        return self._index is not None and self._index.truncated
+
+    def count(self) -> int:
+        """Notes in the index."""
+        return len(self._index) if self._index is not None else 0
+
+    def search(self, query: str, limit: int = RESULT_LIMIT) -> t.List[Hit]:
+        if self._index is None:
+            return []
+        return self._index.search(query, limit)
+
+    def __progress(self, worker: IndexWorker, percent: int):
+        if worker is self._worker:
+            self.progress.emit(percent)
+
+    def __finished(self, worker: IndexWorker):
+        worker.deleteLater()
+        if worker is not self._worker:
+            return
+
+        self._worker = None
+        first = self._index is None
+        if worker.index is not None and (first or worker.changed):
+            self._index = worker.index
+            self.updated.emit()
+        if self._pending:
+            self.refresh()
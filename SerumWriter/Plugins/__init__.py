@@ -28,6 +28,12 @@ class EditorPlugin(IPlugin):
     def run(self):
         raise NotImplementedError()
 
+    def document_changed(self, delta):
+        #: Called with a `DocumentDelta` after every edit. Use
+        #: `delta.text(self.editor.document())` to read the inserted text
+        #: instead of copying the whole document.
+        pass
+
 class MainPlugin(IPlugin):
     window = None
     def init(self, window):
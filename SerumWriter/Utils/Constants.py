@@ -1,2 +1,10 @@
 
-LIB_KEY = 'sidlibv1.0'
\ No newline at end of file
+LIB_KEY = 'sidlibv1.0'
+
+#: Files at least this big are opened with the `LargeEditor` backend
+LARGE_FILE_THRESHOLD = 2 * 1024 * 1024
+#: Files at least this big are opened with the piece table `HugeEditor`,
+#: a `QTextDocument` takes about 20 times the size of its file
+HUGE_FILE_THRESHOLD = 8 * 1024 * 1024
+#: Files at least this big are memory mapped and shown read-only
+MAPPED_FILE_THRESHOLD = 256 * 1024 * 1024
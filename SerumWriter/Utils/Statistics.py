@@ -0,0 +1,347 @@
+# Copyright (c) 2022 Serum
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+#: Document statistics kept up to date from `DocumentDelta`s
+
+import re
+import typing as t
+
+from PyQt5.QtCore import (
+    QObject,
+    QTimer,
+    pyqtSignal as Signal
+)
+from PyQt5.QtGui import (
+    QTextBlock,
+    QTextCursor,
+    QTextDocument
+)
+from SerumWriter.Lib.Document import (
+    BlockData,
+    DocumentDelta
+)
+from SerumWriter.Lib.Highlighter import reMkdHeaders
+from SerumWriter.Utils import word_count
+
+if t.TYPE_CHECKING:
+    from SerumWriter.Components.LineView import LineCursor
+
+reSentenceEnd = re.compile(r'[.!?]+(?=\s|$)')
+
+
+class Stats(t.NamedTuple):
+    words: int = 0
+    chars: int = 0
+    sentences: int = 0
+
+    def __add__(self, other: 'Stats') -> 'Stats':
+        return Stats(
+            self.words + other.words,
+            self.chars + other.chars,
+            self.sentences + other.sentences
+        )
+
+    def __sub__(self, other: 'Stats') -> 'Stats':
+        return Stats(
+            self.words - other.words,
+            self.chars - other.chars,
+            self.sentences - other.sentences
+        )
+
+
+def text_stats(text: str) -> Stats:
+    return Stats(
+        word_count(text),
+        len(text) - text.count('\n'),
+        len(reSentenceEnd.findall(text))
+    )
+
+
+class FenwickTree:
+    """Binary indexed tree giving O(log n) prefix sums over a list of counts."""
+
+    __slots__ = ('_tree',)
+
+    def __init__(self, values: t.Sequence[int] = ()):
+        tree = list(values)
+        size = len(tree)
+        for i in range(size):
+            j = i | (i + 1)
+            if j < size:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def __len__(self) -> int:
+        return len(self._tree)
+
+    def add(self, index: int, value: int):
+        tree = self._tree
+        size = len(tree)
+        while index < size:
+            tree[index] += value
+            index |= index + 1
+
+    def prefix(self, end: int) -> int:
+        """Sum of the values in [0, end)."""
+        tree = self._tree
+        total = 0
+        end = min(end, len(tree))
+        while end > 0:
+            total += tree[end - 1]
+            end &= end - 1
+        return total
+
+    def sum(self, start: int, end: int) -> int:
+        """Sum of the values in [start, end)."""
+        if end <= start:
+            return 0
+        return self.prefix(end) - self.prefix(start)
+
+    def find(self, k: int) -> int:
+        """
+        Index of the `k`-th unit (1-based) when the values are counts,
+        e.g. the block number of the k-th heading. Returns `len(self)`
+        when there are fewer than `k` units.
+        """
+        tree = self._tree
+        size = len(tree)
+        position = 0
+        step = 1 << size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= size and tree[nxt - 1] < k:
+                position = nxt
+                k -= tree[nxt - 1]
+            step >>= 1
+        return position
+
+
+class DocumentStatistics(QObject):
+    """
+    Word, character and sentence counts for the editor document.
+
+    Every block keeps its own counts in `BlockData` and an edit only
+    recounts the blocks it touched. Document totals are kept as running
+    sums, range queries (selection, heading sections) go through Fenwick
+    trees keyed by block number. Inserting or removing blocks shifts the
+    keys, so the trees are then rebuilt lazily on the next range query.
+    """
+    changed = Signal(int)
+
+    def __init__(self, document: QTextDocument, parent=None):
+        super().__init__(parent)
+        self._document = document
+        self._blocks: t.List[Stats] = []
+        self._headings: t.List[int] = []
+        self._totals = Stats()
+        self._trees: t.Optional[t.Tuple[FenwickTree, ...]] = None
+        self.reset()
+
+    def total(self) -> int:
+        return self._totals.words
+
+    def totals(self) -> Stats:
+        return self._totals
+
+    def reset(self):
+        blocks = []
+        headings = []
+        block = self._document.firstBlock()
+        while block.isValid():
+            stats, heading = self.__count(block)
+            blocks.append(stats)
+            headings.append(heading)
+            block = block.next()
+
+        self._blocks = blocks
+        self._headings = headings
+        self._totals = sum(blocks, Stats())
+        self._trees = None
+        self.changed.emit(self._totals.words)
+
+    def update(self, delta: DocumentDelta):
+        first, last = delta.first_block, delta.last_block
+        #: Blocks that existed before the edit in place of first..last
+        old_last = last + len(self._blocks) - delta.block_count
+
+        if old_last < first - 1 or old_last >= len(self._blocks):
+            return self.reset()
+
+        new, headings = [], []
+        for number in range(first, last + 1):
+            stats, heading = self.__count(self._document.findBlockByNumber(number))
+            new.append(stats)
+            headings.append(heading)
+
+        old = self._blocks[first:old_last + 1]
+        self._blocks[first:old_last + 1] = new
+        self._headings[first:old_last + 1] = headings
+
+        if len(self._blocks) != delta.block_count:
+            return self.reset()
+
+        if self._trees is not None:
+            if len(old) == len(new):
+                words, chars, sentences, heads = self._trees
+                for offset, (before, after) in enumerate(zip(old, new)):
+                    number = first + offset
+                    words.add(number, after.words - before.words)
+                    chars.add(number, after.chars - before.chars)
+                    sentences.add(number, after.sentences - before.sentences)
+                    heads.add(number, bool(headings[offset]) - heads.sum(number, number + 1))
+            else:
+                self._trees = None
+
+        previous = self._totals
+        self._totals = sum(new, previous - sum(old, Stats()))
+        if self._totals.words != previous.words:
+            self.changed.emit(self._totals.words)
+
+    def blockRange(self, first: int, last: int) -> Stats:
+        """Counts of the blocks first..last (inclusive) in O(log n)."""
+        words, chars, sentences, _ = self.__trees()
+        return Stats(
+            words.sum(first, last + 1),
+            chars.sum(first, last + 1),
+            sentences.sum(first, last + 1)
+        )
+
+    def selection(self, cursor: QTextCursor) -> Stats:
+        if not cursor.hasSelection():
+            return Stats()
+
+        start = self._document.findBlock(cursor.selectionStart())
+        end = self._document.findBlock(cursor.selectionEnd())
+        start_offset = cursor.selectionStart() - start.position()
+        end_offset = cursor.selectionEnd() - end.position()
+
+        if start.blockNumber() == end.blockNumber():
+            return text_stats(start.text()[start_offset:end_offset])
+
+        #: Only the partially selected blocks on both ends are rescanned
+        stats = text_stats(start.text()[start_offset:])
+        stats += text_stats(end.text()[:end_offset])
+        if end.blockNumber() - start.blockNumber() > 1:
+            stats += self.blockRange(start.blockNumber() + 1, end.blockNumber() - 1)
+        return stats
+
+    def section(self, block_number: int) -> t.Tuple[int, int]:
+        """
+        First and last block of the heading section containing
+        `block_number`. Text before the first heading is its own section.
+        """
+        headings = self.__trees()[3]
+        k = headings.prefix(block_number + 1)
+        first = headings.find(k) if k else 0
+        last = headings.find(k + 1) - 1
+        return first, min(last, len(self._blocks) - 1)
+
+    def sectionStats(self, block_number: int) -> Stats:
+        return self.blockRange(*self.section(block_number))
+
+    def __trees(self) -> t.Tuple[FenwickTree, ...]:
+        if self._trees is None:
+            self._trees = (
+                FenwickTree([s.words for s in self._blocks]),
+                FenwickTree([s.chars for s in self._blocks]),
+                FenwickTree([s.sentences for s in self._blocks]),
+                FenwickTree([1 if h else 0 for h in self._headings])
+            )
+        return self._trees
+
+    @staticmethod
+    def __count(block: QTextBlock) -> t.Tuple[Stats, int]:
+        text = block.text()
+        data = BlockData.of(block)
+        data.words, data.chars, data.sentences = stats = text_stats(text)
+
+        match = reMkdHeaders.match(text)
+        data.heading = len(match.group('level')) if match else 0
+        return stats, data.heading
+
+
+class LineStatistics(QObject):
+    """
+    Document totals for `HugeEditor`, whose documents are too big to keep
+    counts per block. The text is counted once in the background, edits
+    then adjust the totals by the lines they replaced.
+    """
+    changed = Signal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._totals = Stats()
+        self._chunks: t.Optional[t.Iterator[str]] = None
+        self._rest = ''
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self.__count_chunk)
+
+    def total(self) -> int:
+        return self._totals.words
+
+    def totals(self) -> Stats:
+        return self._totals
+
+    def isCounting(self) -> bool:
+        return self._chunks is not None
+
+    def reset(self, chunks: t.Iterable[str] = ()):
+        """
+        Starts counting `chunks`, a snapshot of the document. Edits made
+        while counting are applied on top of the snapshot counts.
+        """
+        self._totals = Stats()
+        self._chunks = iter(chunks)
+        self._rest = ''
+        self._timer.start()
+
+    def replace(self, first: int, old: str, new: str):
+        """Connected to `LineView.linesChanged`."""
+        previous = self._totals
+        self._totals = previous - text_stats(old) + text_stats(new)
+        if self._totals.words != previous.words:
+            self.changed.emit(self._totals.words)
+
+    def selection(self, cursor: 'LineCursor') -> Stats:
+        if not cursor.hasSelection():
+            return Stats()
+        return text_stats(cursor.selectedText())
+
+    def sectionStats(self, block_number: int) -> Stats:
+        #: Huge documents aren't indexed by heading, they are one section
+        return self._totals
+
+    def __count_chunk(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._timer.stop()
+            self._totals += text_stats(self._rest)
+            self._chunks = None
+            self._rest = ''
+            self.changed.emit(self._totals.words)
+            return
+
+        #: Only whole lines are counted so words are never split
+        chunk = self._rest + chunk
+        cut = chunk.rfind('\n') + 1
+        self._rest = chunk[cut:]
+        self._totals += text_stats(chunk[:cut])
@@ -23,14 +23,17 @@ from SerumWriter.Components.Statusbar import Statusbar
 from SerumWriter.Globals import (
     palette,
     app,
+    scheduler_ctx,
     __version__
 )
 import os
+import pathlib
 from PyQt5.QtWidgets import (
     QDesktopWidget,
     QMenu,
     QWidget,
     QHBoxLayout,
+    QVBoxLayout,
     QShortcut,
     QLabel,
     QGraphicsOpacityEffect,
@@ -38,9 +41,11 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtGui import (
     QKeySequence,
-    QIcon
+    QIcon,
+    QTextCursor
 )
 from PyQt5.QtCore import (
+    QEvent,
     QPropertyAnimation,
     pyqtSignal
 )
@@ -49,15 +54,31 @@ from SerumWriter.Components.Dialog import (
     Preference
 )
 from SerumWriter.Components.Editor import (
-    Editor, 
+    EditorMixin,
     Preview,
-    Find
+    Find,
+    editor_class
 )
+from SerumWriter.Components.TabView import (
+    TabState,
+    TabView
+)
+from SerumWriter.Components.Outline import OutlinePanel
+from SerumWriter.Components.Sidebar import Sidebar
+from SerumWriter.Components.WorkspaceSearch import WorkspaceSearch
+from SerumWriter.Lib.Workspace import (
+    Workspace,
+    parse_query
+)
+from SerumWriter.Lib.Journal import Journal
 from SerumWriter.Components.Splashscreen import res
 from SerumWriter.Lib.Builder import PDFBuilder
 from SerumWriter.Lib.Highlighter import SpellCheckWrapper
 from SerumWriter.Lib.Modern import load_stylesheet
-from SerumWriter.Utils import word_count
+from SerumWriter.Lib.Scheduler import (
+    Scheduler,
+    Priority
+)
 import SerumWriter.Properties as Properties
 
 import typing as t
@@ -69,9 +90,15 @@ if t.TYPE_CHECKING:
     from PyQt5.QtCore import (
         QPoint
     )
+    from SerumWriter.Lib.Document import DocumentDelta
+    from SerumWriter.Utils.Statistics import Stats
 
 import webbrowser
 
+#: Shown instead of the live preview of a file too large for `EditorMixin`,
+#: its whole text would be joined on every edit
+PREVIEW_OFF = '*The preview is off for files this large.*'
+
 class Menu(QMenu):
     _position: 'QPoint' = None
     def __init__(self, title: str, parent=None):
@@ -83,10 +110,19 @@ class Menu(QMenu):
 
 class Main(FramelessWindow):
     __word_count = None
+    __selection_stats: 'Stats' = None
     __status_label = None
     changed_style = pyqtSignal()
     template_name: str = 'Serum Writer'
     export_dialog = None
+    #: The tab whose document is in the editor
+    __active: TabState = None
+    #: The tab waiting for its document to load to restore its cursor
+    __pending: TabState = None
+    #: A workspace search result being opened, its path and the words to find
+    __result: t.Tuple[str, str] = None
+    #: Set while one view follows the other, it doesn't lead back
+    __syncing = False
     _spell_check = Properties.Settings().spell_check
 
     def __init__(self):
@@ -95,6 +131,11 @@ class Main(FramelessWindow):
         self.properties = Properties.Settings()
         self._titlebar = self.titlebar()
 
+        self.scheduler = Scheduler(self)
+        if scheduler_ctx.top:
+            scheduler_ctx.pop()
+        scheduler_ctx.push(self.scheduler)
+
         if self.properties.height and self.properties.width:
             self.setMinimumSize(
                 self.properties.width,
@@ -210,19 +251,79 @@ class Main(FramelessWindow):
         self._titlebar.showSettingsButton()
 
         
-        self.editor = Editor(self, spell_checking=self._spell_check)
+        self.editor = editor_class(self.properties.filename)(
+            self,
+            spell_checking=self._spell_check
+        )
         self.preview = Preview()
-        if self.editor.toPlainText() != '':
-            self.__word_count = word_count(self.editor.toPlainText())
-            self.preview.setMarkdownOnMargin(self.editor.toPlainText())
+        if not self.editor.isEmpty():
+            self.__word_count = self.editor.statistics.total()
+            if self.properties.preview:
+                self.__render_preview()
+        self.preview.scrolled.connect(self.__sync_editor)
+        #: A document built anew starts over from the top, realign after any
+        self.preview.rendered.connect(self.__sync_preview)
         
 
         
-        self.editor.textChangedEvent.connect(self.typing_event)
-        self.editor._show_status.connect(self.show_status)
-
+        #: Everything downstream of a keystroke goes through the scheduler
+        self.scheduler.register(
+            'titlebar',
+            lambda: self._titlebar.animation(animOut=True),
+            Priority.HIGH
+        )
+        self.scheduler.register(
+            'wordcount',
+            self.__update_word_count,
+            Priority.NORMAL,
+            debounce=150,
+            max_latency=500
+        )
+        self.scheduler.register(
+            'preview',
+            self.__update_preview,
+            Priority.LOW,
+            debounce=300,
+            max_latency=1500
+        )
+        self.scheduler.register(
+            'history',
+            self.__update_history,
+            Priority.LOW,
+            debounce=500,
+            max_latency=2000
+        )
+        self.scheduler.register(
+            'tabs',
+            self.__update_tab,
+            Priority.NORMAL,
+            debounce=150,
+            max_latency=500
+        )
+        self.__bind_editor()
+
+        #: Tabs only keep a record of their documents, the editor is shared
+        self.tabs = TabView(self)
+        self.__init_tabs()
+
+        self._vlayout = QVBoxLayout()
+        self._vlayout.setContentsMargins(0,0,0,0)
+        self._vlayout.setSpacing(0)
+        self._vlayout.addWidget(self.tabs)
+        self._vlayout.addWidget(self.editor)
+
+        #: The folder of the open note, or the `workspace` setting
+        self.workspace = Workspace(self)
+        self.workspace_search = WorkspaceSearch(self.workspace)
+        self.workspace_search.openRequested.connect(self.__open_result)
+        self.outline_panel = OutlinePanel(self.editor)
+        self.sidebar = Sidebar(self)
+        self.sidebar.addPanel('search', self.workspace_search)
+        self.sidebar.addPanel('outline', self.outline_panel)
+
+        self._hlayout.addWidget(self.sidebar)
         self._hlayout.addSpacing(40)
-        self._hlayout.addWidget(self.editor)
+        self._hlayout.addLayout(self._vlayout)
         
         if not self.properties.preview: self.preview.hide()
         self._hlayout.addWidget(self.preview)
@@ -236,9 +337,9 @@ class Main(FramelessWindow):
 
         
         #: Menu signals
-        self.new_file.triggered.connect(self.editor.new)
+        self.new_file.triggered.connect(self.new_tab)
         self.open_file.triggered.connect(self._open_file)
-        self.close_file.triggered.connect(self.editor.close_file)
+        self.close_file.triggered.connect(lambda: self.close_tab())
         self.save_file.triggered.connect(self._save_file)
         self.save_file_as.triggered.connect(self.save_as)
         
@@ -248,6 +349,9 @@ class Main(FramelessWindow):
         self.menu_exit.triggered.connect(self.close)
 
         #: Edit Signals
+        self.undo_edit.triggered.connect(lambda: self.editor.undo())
+        self.redo_edit.triggered.connect(lambda: self.editor.redo())
+
         self.insert_header_1.triggered.connect(lambda: self.editor.insertHeader(1))
         self.insert_header_2.triggered.connect(lambda: self.editor.insertHeader(2))
         self.insert_header_3.triggered.connect(lambda: self.editor.insertHeader(3))
@@ -255,14 +359,14 @@ class Main(FramelessWindow):
         self.insert_header_5.triggered.connect(lambda: self.editor.insertHeader(5))
         self.insert_header_6.triggered.connect(lambda: self.editor.insertHeader(6))
         
-        self.insert_bold.triggered.connect(self.editor.insertBold)
-        self.insert_italic.triggered.connect(self.editor.insertItalic)
+        self.insert_bold.triggered.connect(lambda: self.editor.insertBold())
+        self.insert_italic.triggered.connect(lambda: self.editor.insertItalic())
 
-        self.insert_code_block.triggered.connect(self.editor.insertCodeBlock)
-        self.insert_block_quote.triggered.connect(self.editor.insertQuoteBlock)
+        self.insert_code_block.triggered.connect(lambda: self.editor.insertCodeBlock())
+        self.insert_block_quote.triggered.connect(lambda: self.editor.insertQuoteBlock())
 
-        self.insert_image.triggered.connect(self.editor.insertImage)
-        self.insert_link.triggered.connect(self.editor.insertLink)
+        self.insert_image.triggered.connect(lambda: self.editor.insertImage())
+        self.insert_link.triggered.connect(lambda: self.editor.insertLink())
 
         #: View
         self.preview_menu.triggered.connect(self.__preview_show)
@@ -290,8 +394,63 @@ class Main(FramelessWindow):
         self.__status_bar()
         self.__update_statusbar()
 
+    def __bind_editor(self):
+        self.editor.documentDelta.connect(self.typing_event)
+        self.editor.selectionChanged.connect(
+            lambda: self.scheduler.schedule('wordcount')
+        )
+        self.editor._show_status.connect(self.show_status)
+        self.editor.backendRequested.connect(self.__switch_backend)
+        self.editor.loadProgress.connect(self.__load_progress)
+        self.editor.statistics.changed.connect(
+            lambda: self.scheduler.schedule('wordcount')
+        )
+        self.editor.history.changed.connect(
+            lambda: self.scheduler.schedule('history')
+        )
+        self.editor.saver.saved.connect(
+            lambda *_: self.scheduler.schedule('tabs')
+        )
+        self.editor.saver.saved.connect(self.__refresh_workspace)
+        self.editor.documentLoaded.connect(self.__document_loaded)
+        self.editor.documentLoaded.connect(self.__show_result)
+        self.editor.verticalScrollBar().valueChanged.connect(self.__sync_preview)
+        self.editor.fileNameChanged.connect(self.__file_name_changed)
+
+    def __switch_backend(self, file: str):
+        #: Large files are edited with another widget, rebuild the editor
+        #: in place and open the file in the new one. It mustn't open the
+        #: file of the `filename` setting, that is still the outgoing one.
+        old = self.editor
+        self.editor = editor_class(file)(
+            self,
+            spell_checking=self._spell_check,
+            restore=False
+        )
+        self._hlayout.replaceWidget(old, self.editor)
+        self.__bind_editor()
+        self.editor.run_plugins(run=False)
+        self._find.editor = self.editor
+        self.outline_panel.editor = self.editor
+
+        #: Its reader and writer threads must be done before it is deleted
+        old.shutdown()
+        for widget in (old, old.continue_dialog, old.exit_dialog):
+            widget.hide()
+            widget.deleteLater()
+
+        if file:
+            self.editor._open(file)
+        self.editor.updateProperties()
+        self.editor.setFocus()
+        self.scheduler.schedule('wordcount', 'preview')
+
     def add_spell_checking(self):
-        
+        if self.editor.highlighter is None:
+            #: The editor backend doesn't highlight, remember the choice only
+            self.properties.spell_check = self.spell_checking.isChecked()
+            return
+
         if self.spell_checking.isChecked():
             self.editor.highlighter.speller = SpellCheckWrapper(
                 self.editor.get_words(),
@@ -335,7 +494,7 @@ class Main(FramelessWindow):
             .activated.connect(self.__preview_show)
 
         QShortcut(QKeySequence('Ctrl+N'), self)\
-            .activated.connect(self.editor.new)
+            .activated.connect(self.new_tab)
 
         QShortcut(QKeySequence('Ctrl+O'), self)\
             .activated.connect(self._open_file)
@@ -347,7 +506,7 @@ class Main(FramelessWindow):
             .activated.connect(self.save_as)
 
         QShortcut(QKeySequence('Ctrl+Shift+O'), self)\
-            .activated.connect(self.editor.close_file)
+            .activated.connect(lambda: self.close_tab())
 
         #: Edit
         QShortcut(QKeySequence('Ctrl+Shift+1'), self)\
@@ -369,26 +528,32 @@ class Main(FramelessWindow):
             .activated.connect(lambda: self.editor.insertHeader(6))
 
         QShortcut(QKeySequence('Ctrl+B'), self)\
-            .activated.connect(self.editor.insertBold)
+            .activated.connect(lambda: self.editor.insertBold())
 
         QShortcut(QKeySequence('Ctrl+Shift+I'), self)\
-            .activated.connect(self.editor.insertItalic)
+            .activated.connect(lambda: self.editor.insertItalic())
         
         QShortcut(QKeySequence('Ctrl+I'), self)\
-            .activated.connect(self.editor.insertImage)
+            .activated.connect(lambda: self.editor.insertImage())
 
         QShortcut(QKeySequence('Ctrl+Shift+H'), self)\
-            .activated.connect(self.editor.insertLink)
+            .activated.connect(lambda: self.editor.insertLink())
     
         QShortcut(QKeySequence('Ctrl+Shift+L'), self)\
-            .activated.connect(self.editor.insertList)
+            .activated.connect(lambda: self.editor.insertList())
         
         QShortcut(QKeySequence('Ctrl+Shift+Q'), self)\
-            .activated.connect(self.editor.insertQuoteBlock)
+            .activated.connect(lambda: self.editor.insertQuoteBlock())
 
         QShortcut(QKeySequence('Ctrl+F'), self)\
             .activated.connect(self.show_find)
 
+        QShortcut(QKeySequence('Ctrl+Shift+F'), self)\
+            .activated.connect(self.show_workspace_search)
+
+        QShortcut(QKeySequence('Ctrl+Shift+T'), self)\
+            .activated.connect(self.show_outline)
+
         QShortcut(QKeySequence('Ctrl+Shift+B'), self)\
             .activated.connect(self._export_pdf)
 
@@ -401,13 +566,259 @@ class Main(FramelessWindow):
         
         self._find.setFocus()
 
+    def show_workspace_search(self):
+        self.sidebar.toggle('search')
+        if self.sidebar.isHidden():
+            self.editor.setFocus()
+
+    def show_outline(self):
+        self.sidebar.toggle('outline')
+        if self.sidebar.isHidden():
+            self.editor.setFocus()
+
+    def __refresh_workspace(self, *_):
+        #: Only kept up to date while it is searched
+        if self.workspace_search.isVisible():
+            self.workspace.refresh()
+
+    def __update_workspace(self):
+        root = self.properties.workspace
+        if not root and self.editor.fileName():
+            root = os.path.dirname(self.editor.fileName())
+        if root:
+            self.workspace.setRoot(root)
+            self.__refresh_workspace()
+
+    def __open_result(self, path: str, query: str):
+        phrases = parse_query(query)
+        self.__result = path, ' '.join(term for _, term in phrases[0]) if phrases else ''
+        index = self.tabs.indexOf(path)
+        if index >= 0 and index == self.tabs.currentIndex() and self.__pending is None:
+            self.__show_result()
+        else:
+            self.open_tab(path)
+
+    def __show_result(self):
+        """Finds the words of the result being opened once its note is loaded."""
+        if self.__result is None:
+            return
+        path, words = self.__result
+        if self.tabs.indexOf(path) != self.tabs.currentIndex():
+            return
+
+        self.__result = None
+        if words:
+            if self._find.isHidden():
+                self._find.show()
+            if self._find.find_edit.text() == words:
+                self._find.textChanged()
+            else:
+                self._find.find_edit.setText(words)
+            self._find.find_edit.setFocus()
+
     def _save_file(self):
         self.editor.save()
         
 
     
     def _open_file(self):
-        self.editor.open()
+        files = QFileDialog.getOpenFileNames(
+            self,
+            'Open File',
+            os.getcwd(),
+            'Markdown (*.md);;Text (*.txt);;Serum Notes (*.snote);;All Files (*)'
+        )[0]
+
+        #: Only the last one is loaded, the others wait for their tab
+        for file in files:
+            self.open_tab(file, activate=file == files[-1])
+
+    def __init_tabs(self):
+        current = self.editor.fileName()
+        self.tabs.blockSignals(True)
+        for path in self.properties.value('tabs', [], type=list):
+            if pathlib.Path(path).is_file():
+                self.tabs.addDocument(path)
+
+        index = self.tabs.indexOf(current) if current else -1
+        if index < 0:
+            index = self.tabs.addDocument(current)
+            #: The document the editor started with keeps the journal it recovered from
+            self.tabs.state(index).key = self.editor.journal.key()
+        self.tabs.setCurrentIndex(index)
+        self.tabs.blockSignals(False)
+
+        self.__active = self.tabs.state(index)
+        self.tabs.currentChanged.connect(self.__tab_changed)
+        self.tabs.tabCloseRequested.connect(self.close_tab)
+        self.tabs.tabMoved.connect(lambda *_: self.__save_tabs())
+
+    def new_tab(self):
+        self.tabs.setCurrentIndex(self.tabs.addDocument(index=self.tabs.currentIndex() + 1))
+        self.__save_tabs()
+
+    def open_tab(self, path: str, activate: bool = True):
+        index = self.tabs.indexOf(path)
+        state = self.tabs.state()
+        if index < 0 and state is self.__active and state.isEmpty() \
+            and self.editor.isEmpty() and activate:
+
+            #: A blank untitled tab is reused
+            self.tabs.setPath(self.tabs.currentIndex(), path)
+            self.__activate(state)
+            self.__save_tabs()
+            return
+
+        if index < 0:
+            index = self.tabs.addDocument(path, self.tabs.currentIndex() + 1)
+        if activate:
+            self.tabs.setCurrentIndex(index)
+        self.__save_tabs()
+
+    def close_tab(self, index: int = None):
+        if index is None:
+            index = self.tabs.currentIndex()
+        state = self.tabs.state(index)
+        if state is None:
+            return
+
+        if state is self.__active:
+            dirty = self.editor.isDirty(exact=True)
+        else:
+            dirty = state.dirty
+
+        if dirty:
+            #: Removing it may switch backends and so editors, not while
+            #: the dialog of this one is still open
+            confirmed = []
+            confirm = lambda: confirmed.append(True)
+            dialog = self.editor.continue_dialog
+            dialog.yesSignal.connect(confirm)
+            dialog.exec_()
+            dialog.yesSignal.disconnect(confirm)
+            if not confirmed:
+                return
+
+        self.__remove_tab(state)
+
+    def __remove_tab(self, state: TabState):
+        index = self.tabs.indexOfState(state)
+        if index < 0:
+            return
+
+        #: Its unsaved edits are dropped with it
+        if state is self.__active:
+            self.editor.saveState()
+            self.editor.journal.discard()
+            self.__active = None
+        elif state.dirty:
+            Journal.remove(state.path, state.key)
+
+        if self.tabs.count() == 1:
+            self.tabs.blockSignals(True)
+            self.tabs.removeTab(index)
+            index = self.tabs.addDocument()
+            self.tabs.blockSignals(False)
+            self.__activate(self.tabs.state(index))
+        else:
+            self.tabs.removeTab(index)
+        self.__save_tabs()
+
+    def __tab_changed(self, index: int):
+        state = self.tabs.state(index)
+        if state is None or state is self.__active:
+            return
+
+        self.__stash()
+        self.__activate(state)
+
+    def __stash(self):
+        """Records what the outgoing tab needs to come back, its document is let go."""
+        state = self.__active
+        if state is None:
+            return
+
+        self.editor.saver.flush()
+        self.editor.saveState()
+        cursor = self.editor.textCursor()
+        state.position = cursor.position()
+        if cursor.position() == cursor.selectionEnd():
+            state.anchor = cursor.selectionStart()
+        else:
+            state.anchor = cursor.selectionEnd()
+        state.scroll = self.editor.verticalScrollBar().value()
+        state.text = None
+
+        dirty = self.editor.isDirty(exact=True)
+        if dirty and self.editor.journal.isActive():
+            #: The journal keeps the unsaved edits until the tab is back
+            self.editor.journal.close()
+        elif dirty:
+            state.text = self.editor.toPlainText()
+        self.tabs.setDirty(self.tabs.indexOfState(state), dirty)
+
+    def __activate(self, state: TabState):
+        self.__active = state
+        self.__pending = state
+        if state.path:
+            #: Loading replays the journal of a tab left with unsaved edits
+            self.editor._open(state.path)
+        else:
+            if type(self.editor) is not editor_class():
+                self.__switch_backend(None)
+            self.editor.journal.setKey(state.key)
+            self.editor.setFileName(None)
+            self.editor.clear()
+            text = state.text
+            if text is None and state.dirty:
+                text = Journal.replay(None, key=state.key)
+            if text is not None:
+                self.editor.setPlainText(text)
+            self.show_status(state.name)
+            self.__document_loaded()
+
+        self.editor.updateProperties()
+        self.editor.setFocus()
+
+    def __document_loaded(self):
+        self.scheduler.schedule('wordcount', 'preview', 'tabs')
+        self.__update_workspace()
+        state, self.__pending = self.__pending, None
+        if state is None or state is not self.__active:
+            return
+
+        if state.path and state.text is not None:
+            #: Edits kept without a journal go back on top of the file
+            self.editor.selectAll()
+            self.editor.insertPlainText(state.text)
+        state.text = None
+        if state.position is None:
+            return
+
+        if isinstance(self.editor, EditorMixin):
+            length = self.editor.document().characterCount() - 1
+        else:
+            length = len(self.editor.source())
+
+        cursor = self.editor.textCursor()
+        cursor.setPosition(min(state.anchor, length))
+        cursor.setPosition(min(state.position, length), QTextCursor.MoveMode.KeepAnchor)
+        self.editor.setTextCursor(cursor)
+        self.editor.verticalScrollBar().setValue(state.scroll)
+
+    def __file_name_changed(self, path: str):
+        index = self.tabs.indexOfState(self.__active)
+        if index >= 0 and self.__active.path != path:
+            self.tabs.setPath(index, path)
+            self.__save_tabs()
+
+    def __update_tab(self):
+        index = self.tabs.indexOfState(self.__active)
+        if index >= 0:
+            self.tabs.setDirty(index, self.editor.isDirty())
+
+    def __save_tabs(self):
+        self.properties.setValue('tabs', self.tabs.paths())
    
         
         
@@ -438,12 +849,29 @@ class Main(FramelessWindow):
         self.properties.height = self.height()
         self.properties.width = self.width()
 
-        text = self.editor.toPlainText()
-        
-        if self.editor._current_text != text and text != '':
+        self.__save_tabs()
+
+        #: A save still in flight decides whether anything is left unsaved
+        self.editor.saver.flush()
+        self.editor.saveState()
+        dirty = [
+            state for state in self.tabs.states()
+            if state is not self.__active and state.dirty
+        ]
+
+        def discard():
+            #: Leaving without saving drops the edits for good
+            self.editor.journal.discard()
+            for state in dirty:
+                Journal.remove(state.path, state.key)
+
+        if self.editor.isDirty(exact=True) or dirty:
+            self.editor.exit_dialog.yesSignal.connect(discard)
             self.editor.exit_dialog.yesSignal.connect(e.accept)
             self.editor.exit_dialog.cancelSignal.connect(e.ignore)
             self.editor.exit_dialog.exec_()
+        else:
+            self.editor.journal.discard()
         
 
     
@@ -512,6 +940,11 @@ class Main(FramelessWindow):
         self.__status_label = name
         self.__update_statusbar()
 
+    def __load_progress(self, percent: int):
+        #: The editor reports the file name again once loading is done
+        if percent < 100:
+            self.status_label.setText('Loading\u2026 %d%%' % percent)
+
     def fade(self, widget):
         self.effect = QGraphicsOpacityEffect()
         widget.setGraphicsEffect(self.effect)
@@ -539,6 +972,8 @@ class Main(FramelessWindow):
         #: status bar in the main window
         self.wordcount_label = QLabel()
         self.wordcount_label.setText('0 Word')
+        #: The tooltip is only counted when it is about to show
+        self.wordcount_label.installEventFilter(self)
         
         self.status_label = QLabel()
         self.status_label.setObjectName('statusLabel')
@@ -546,7 +981,12 @@ class Main(FramelessWindow):
         if self.editor.fileName(name=True):
             self.status_label.setText(self.editor.fileName(name=True))
 
+        #: Memory held by the undo history
+        self.history_label = QLabel()
+        self.history_label.setObjectName('historyLabel')
+
         self.status_bar.addWidget(self.wordcount_label)
+        self.status_bar.addWidget(self.history_label)
         self.status_bar.addWidget(self.status_label)
 
     def __preview_show(self):
@@ -554,6 +994,8 @@ class Main(FramelessWindow):
         if self.preview.isHidden():
             self.preview_menu.setChecked(True)
             self.preview.show()
+            #: The preview is not rendered while hidden, catch it up first
+            self.__render_preview()
             self.properties.preview = True
 
         else:
@@ -565,7 +1007,12 @@ class Main(FramelessWindow):
        
     def __update_statusbar(self):
 
-        if self.__word_count == 0:
+        if self.__selection_stats and self.__selection_stats.chars:
+            self.wordcount_label.setText('{} of {} Words'.format(
+                self.__selection_stats.words,
+                self.__word_count
+            ))
+        elif self.__word_count == 0:
             self.wordcount_label.setText('0 Word')
         elif self.__word_count:
             self.wordcount_label.setText('{} Words'.format(self.__word_count))
@@ -576,10 +1023,94 @@ class Main(FramelessWindow):
                 self.unfade(self.status_label)
             self.status_label.setText(self.__status_label)
 
-    def typing_event(self, text: str):
-        self.__word_count = word_count(text)
-        
+    def __update_word_count(self):
+        statistics = self.editor.statistics
+        cursor = self.editor.textCursor()
+        self.__word_count = statistics.total()
+        self.__selection_stats = statistics.selection(cursor)
         self.__update_statusbar()
-        self.preview.setMarkdownOnMargin(text)
-        self._titlebar.animation(animOut=True)
+
+    def eventFilter(self, watched, event: QEvent) -> bool:
+        if event.type() == QEvent.Type.ToolTip and watched is self.wordcount_label:
+            self.__update_word_count_tip()
+        return super().eventFilter(watched, event)
+
+    def __update_word_count_tip(self):
+        #: Counting a section may rebuild the index of the statistics, an
+        #: edit that added or removed lines leaves it to the next query
+        statistics = self.editor.statistics
+        stats = self.__selection_stats
+        if stats is not None and stats.chars:
+            title = 'Selection'
+        else:
+            stats, title = statistics.sectionStats(self.editor.textCursor().blockNumber()), 'Section'
+
+        totals = statistics.totals()
+        self.wordcount_label.setToolTip(
+            '{title}: {words} Words, {chars} Characters, {sentences} Sentences\n'
+            'Document: {total_words} Words, {total_chars} Characters, {total_sentences} Sentences'.format(
+                title=title,
+                words=stats.words,
+                chars=stats.chars,
+                sentences=stats.sentences,
+                total_words=totals.words,
+                total_chars=totals.chars,
+                total_sentences=totals.sentences
+            )
+        )
+
+    def __update_history(self):
+        history = self.editor.history
+        mb = 1024 * 1024
+        if history.memoryUsage() < mb:
+            self.history_label.setText('Undo {:.0f} KB'.format(history.memoryUsage() / 1024))
+        else:
+            self.history_label.setText('Undo {:.1f} MB'.format(history.memoryUsage() / mb))
+        self.history_label.setToolTip(
+            '{undo} steps to undo, {redo} to redo, {evicted} dropped\n'
+            '{used:.1f} MB of {budget:.0f} MB'.format(
+                undo=history.undoCount(),
+                redo=history.redoCount(),
+                evicted=history.evictedCount(),
+                used=history.memoryUsage() / mb,
+                budget=history.budget() / mb
+            )
+        )
+
+    def __update_preview(self):
+        if not self.preview.isHidden():
+            self.__render_preview()
+
+    def __render_preview(self):
+        if not isinstance(self.editor, EditorMixin):
+            self.preview.setMarkdownOnMargin(PREVIEW_OFF)
+            return
+
+        self.preview.setMarkdownOnMargin(self.editor.toPlainText())
+
+    def __sync_preview(self):
+        if self.__syncing or self.preview.isHidden():
+            return
+
+        self.__syncing = True
+        try:
+            self.preview.scrollToLine(self.editor.firstVisibleLine(), self.editor.lineCount())
+        finally:
+            self.__syncing = False
+
+    def __sync_editor(self):
+        if self.__syncing or self.preview.isHidden():
+            return
+
+        self.__syncing = True
+        try:
+            self.editor.scrollToLine(self.preview.firstVisibleLine(self.editor.lineCount()))
+        finally:
+            self.__syncing = False
+
+    def typing_event(self, delta: 'DocumentDelta'):
+        self.scheduler.schedule('titlebar', 'wordcount', 'tabs')
+        #: The notice shown for larger files doesn't change as they do
+        if isinstance(self.editor, EditorMixin):
+            self.scheduler.schedule('preview')
         